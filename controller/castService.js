@@ -2,24 +2,43 @@
 
 const Bonjour = require('bonjour');
 const fs = require('fs');
+const path = require('path');
 const { Client, DefaultMediaReceiver } = require('castv2-client');
 
 const CACHE_PATH = '/data/cast_devices.json';
+const CACHE_TTL_MS = parseInt(process.env.CAST_CACHE_TTL_MS || String(24 * 3600 * 1000), 10);
+const PERSIST_DEBOUNCE_MS = parseInt(process.env.CAST_PERSIST_DEBOUNCE_MS || '2000', 10);
+const PERSIST_MAX_DELAY_MS = 10000;  // a discovery storm can't postpone the write forever
+const SWEEP_INTERVAL_MS = 60000;     // re-query mDNS and expire stale entries
+// A lastSeen bump alone is written only once it has moved this fraction of
+// the TTL since the copy on disk; expiry never needs finer resolution.
+const SEEN_PERSIST_FRACTION = 0.1;
 
 class CastService {
   constructor() {
-    this.devices = new Map();   // uid → { host, port }
+    this.devices = new Map();   // uid → { host, port, name, model, lastSeen, ttl }
     this.clients = new Map();   // uid → castv2-client instance
     this.bonjour = Bonjour();
+    this.persistTimer = null;
+    this.dirtySince = null;
+    this.writing = null;        // in-flight write promise
+    this.savedSeen = new Map(); // uid → lastSeen as last written to disk
   }
 
   async init() {
-    // 1. Load persisted device cache
+    // 1. Load persisted device cache, dropping entries past their TTL
     try {
       const data = fs.readFileSync(CACHE_PATH, 'utf8');
       const obj = JSON.parse(data);
+      const fileTime = fs.statSync(CACHE_PATH).mtimeMs;
+      const now = Date.now();
       for (const uid in obj) {
-        this.devices.set(uid, obj[uid]);
+        // Entries written before lastSeen existed count as seen when the file was.
+        const entry = Object.assign({ lastSeen: fileTime, ttl: CACHE_TTL_MS }, obj[uid]);
+        if (entry.lastSeen + entry.ttl > now) {
+          this.devices.set(uid, entry);
+          this.savedSeen.set(uid, entry.lastSeen);
+        }
       }
       console.log('[CastService] Loaded cache with', this.devices.size, 'devices');
     } catch {
@@ -30,20 +49,118 @@ class CastService {
     this.browser = this.bonjour.find({ type: 'googlecast' });
     this.browser.on('up', service => this._addOrUpdate(service));
     this.browser.on('down', service => this._remove(service));
+    this.sweepTimer = setInterval(() => this._sweep(), SWEEP_INTERVAL_MS);
+    this.sweepTimer.unref();
   }
 
+  // Coalesce cache writes: wait for PERSIST_DEBOUNCE_MS of quiet, but never
+  // longer than PERSIST_MAX_DELAY_MS after the first change.
   _persist() {
-    const obj = Object.fromEntries(this.devices);
-    fs.writeFileSync(CACHE_PATH, JSON.stringify(obj, null, 2));
+    const now = Date.now();
+    if (this.dirtySince === null) this.dirtySince = now;
+    clearTimeout(this.persistTimer);
+    const delay = Math.max(0, Math.min(PERSIST_DEBOUNCE_MS, this.dirtySince + PERSIST_MAX_DELAY_MS - now));
+    this.persistTimer = setTimeout(() => this.flush(), delay);
+  }
+
+  // Write the cache now (temp file + fsync + rename, off the event loop).
+  async flush() {
+    clearTimeout(this.persistTimer);
+    this.persistTimer = null;
+    while (this.writing) await this.writing;
+    if (this.dirtySince === null) return;
+    this.dirtySince = null;
+    const body = JSON.stringify(Object.fromEntries(this.devices), null, 2);
+    this.savedSeen = new Map(Array.from(this.devices, ([uid, entry]) => [uid, entry.lastSeen]));
+    const tmp = path.join(path.dirname(CACHE_PATH), `.${path.basename(CACHE_PATH)}.${process.pid}.tmp`);
+    this.writing = (async () => {
+      const fh = await fs.promises.open(tmp, 'w');
+      try {
+        await fh.writeFile(body);
+        await fh.sync();
+      } finally {
+        await fh.close();
+      }
+      await fs.promises.rename(tmp, CACHE_PATH);
+      // Make the rename itself durable.
+      const dir = await fs.promises.open(path.dirname(CACHE_PATH), 'r');
+      try {
+        await dir.sync();
+      } finally {
+        await dir.close();
+      }
+    })().catch(err => {
+      console.error('[CastService] Failed to write cache:', err.message);
+      fs.promises.unlink(tmp).catch(() => {});
+      this._persist();
+    }).finally(() => {
+      this.writing = null;
+    });
+    await this.writing;
+  }
+
+  _touch(uid) {
+    const entry = this.devices.get(uid);
+    if (entry) {
+      entry.lastSeen = Date.now();
+      if (this._seenMoved(uid)) this._persist();
+    }
+  }
+
+  // Has uid's lastSeen drifted far enough from the copy on disk to rewrite it?
+  _seenMoved(uid) {
+    const entry = this.devices.get(uid);
+    const saved = this.savedSeen.get(uid);
+    return saved === undefined || entry.lastSeen - saved >= (entry.ttl || CACHE_TTL_MS) * SEEN_PERSIST_FRACTION;
+  }
+
+  _isFresh(entry, now = Date.now()) {
+    return entry.lastSeen + (entry.ttl || CACHE_TTL_MS) > now;
+  }
+
+  _sweep() {
+    // Services bonjour still holds are alive; refresh them in memory and
+    // re-query. Only expiries and large lastSeen moves reach the disk.
+    let moved = false;
+    for (const service of (this.browser && this.browser.services) || []) {
+      if (service.txt && this.devices.has(service.txt.id)) {
+        this.devices.get(service.txt.id).lastSeen = Date.now();
+        moved = moved || this._seenMoved(service.txt.id);
+      }
+    }
+    if (this.browser) this.browser.update();
+    const now = Date.now();
+    let expired = 0;
+    for (const [uid, entry] of this.devices) {
+      if (!this._isFresh(entry, now) && !this.clients.has(uid)) {
+        this.devices.delete(uid);
+        expired++;
+      }
+    }
+    if (expired) console.log(`[CastService] Expired ${expired} stale devices`);
+    if (expired || moved) this._persist();
   }
 
   _addOrUpdate(service) {
     const uid = service.txt.id;
     const host = service.addresses[0];
     const port = service.port;
-    this.devices.set(uid, { host, port });
-    this._persist();
-    console.log(`[CastService] Discovered ${service.name} (${uid}) at ${host}:${port}`);
+    const prev = this.devices.get(uid);
+    const entry = {
+      host,
+      port,
+      name: service.txt.fn || (prev && prev.name) || service.name,
+      model: service.txt.md || (prev && prev.model) || null,
+      lastSeen: Date.now(),
+      ttl: CACHE_TTL_MS
+    };
+    this.devices.set(uid, entry);
+    // mDNS re-announces the same record constantly; write only real changes.
+    const changed = !prev || ['host', 'port', 'name', 'model', 'ttl'].some(k => prev[k] !== entry[k]);
+    if (changed || this._seenMoved(uid)) this._persist();
+    if (!prev || prev.host !== host || prev.port !== port) {
+      console.log(`[CastService] Discovered ${service.name} (${uid}) at ${host}:${port}`);
+    }
   }
 
   _remove(service) {
@@ -55,7 +172,8 @@ class CastService {
   }
 
   listDevices() {
-    return Array.from(this.devices.keys());
+    const now = Date.now();
+    return Array.from(this.devices.keys()).filter(uid => this._isFresh(this.devices.get(uid), now));
   }
 
   async _getClient(uid) {
@@ -85,6 +203,7 @@ class CastService {
     });
 
     this.clients.set(uid, client);
+    this._touch(uid);
     return client;
   }
 
@@ -0,0 +1,219 @@
+// File: commandScheduler.js
+
+const DEFAULT_DEADLINE_MS = parseInt(process.env.COMMAND_DEADLINE_MS || '10000', 10);
+const DEFAULT_TIMEOUT_MS = parseInt(process.env.COMMAND_TIMEOUT_MS || '15000', 10);
+const MAX_PARALLEL = parseInt(process.env.COMMAND_MAX_PARALLEL || '16', 10);
+// After a timeout the executor is aborted; the target stays busy until it
+// actually settles, but no longer than this (a hung cast call must not
+// block the target forever).
+const SETTLE_GRACE_MS = parseInt(process.env.COMMAND_SETTLE_GRACE_MS || '30000', 10);
+
+// Commands where only the latest queued value matters. Commands sharing a
+// group replace each other while still waiting (last volume/seek wins).
+const COALESCE_GROUPS = {
+  'cast:setVolume': 'volume',
+  'cast:seek': 'seek',
+  'cast:mute': 'mute',
+  'cast:unmute': 'mute',
+  'cast:play': 'playback',
+  'cast:pause': 'playback'
+};
+
+// Lower runs first. Power/stop must not wait behind a backlog of status polls.
+const PRIORITY_URGENT = 0;
+const PRIORITY_NORMAL = 1;
+const PRIORITY_LOW = 2;
+
+function priorityOf(type) {
+  if (/^cast:(stop|disconnect)$/.test(type) || /power|standby|wake/i.test(type)) return PRIORITY_URGENT;
+  if (/^cast:(getStatus|ping|discoverCapabilities|listDevices)$/.test(type)) return PRIORITY_LOW;
+  return PRIORITY_NORMAL;
+}
+
+function targetOf(msg) {
+  if (msg.type.startsWith('cast:')) return `cast:${msg.targetDeviceId}`;
+  return `local:${msg.targetDeviceId || msg.type}`;
+}
+
+class CommandScheduler {
+  constructor() {
+    this.queues = new Map();   // target → { items, running, stats }
+    this.executor = null;      // async (msg, signal) => ack payload
+    this.active = 0;
+    this.waitingTargets = [];
+    this.seq = 0;
+    this.totals = { submitted: 0, executed: 0, coalesced: 0, expired: 0, timedOut: 0 };
+  }
+
+  setExecutor(fn) {
+    this.executor = fn;
+  }
+
+  // Queue a device-command message; resolves with the payload to ack.
+  submit(msg) {
+    this.totals.submitted++;
+    const target = targetOf(msg);
+    const now = Date.now();
+    const item = {
+      seq: this.seq++,
+      msg,
+      priority: msg.priority !== undefined ? msg.priority : priorityOf(msg.type),
+      group: COALESCE_GROUPS[msg.type],
+      enqueuedAt: now,
+      deadline: now + (msg.deadlineMs || DEFAULT_DEADLINE_MS)
+    };
+    const promise = new Promise(resolve => { item.resolve = resolve; });
+    const q = this._queue(target);
+
+    const idx = item.group ? q.items.findIndex(i => i.group === item.group) : -1;
+    if (idx >= 0) {
+      // Take over the superseded command's slot so the newest value runs as
+      // early as the oldest one would have.
+      const old = q.items[idx];
+      item.seq = old.seq;
+      item.enqueuedAt = old.enqueuedAt;
+      q.items[idx] = item;
+      q.stats.coalesced++;
+      this.totals.coalesced++;
+      old.resolve({ status: 'ok', result: 'superseded', superseded: true });
+    } else {
+      q.items.push(item);
+    }
+    this._schedule(target);
+    return promise;
+  }
+
+  metrics() {
+    const targets = {};
+    for (const [target, q] of this.queues) {
+      targets[target] = {
+        depth: q.items.length,
+        running: q.running,
+        executed: q.stats.executed,
+        coalesced: q.stats.coalesced,
+        expired: q.stats.expired,
+        avgWaitMs: q.stats.executed ? Math.round(q.stats.waitTotalMs / q.stats.executed) : 0,
+        maxWaitMs: q.stats.waitMaxMs,
+        avgRunMs: q.stats.executed ? Math.round(q.stats.runTotalMs / q.stats.executed) : 0
+      };
+    }
+    return {
+      active: this.active,
+      waitingTargets: this.waitingTargets.length,
+      totals: this.totals,
+      targets
+    };
+  }
+
+  _queue(target) {
+    let q = this.queues.get(target);
+    if (!q) {
+      q = {
+        target,
+        items: [],
+        running: false,
+        stats: { executed: 0, coalesced: 0, expired: 0, waitTotalMs: 0, waitMaxMs: 0, runTotalMs: 0 }
+      };
+      this.queues.set(target, q);
+    }
+    return q;
+  }
+
+  _schedule(target) {
+    const q = this.queues.get(target);
+    if (q.running || !q.items.length) return;
+    if (this.active >= MAX_PARALLEL) {
+      if (!this.waitingTargets.includes(target)) this.waitingTargets.push(target);
+      return;
+    }
+    this._run(q);
+  }
+
+  // Items are in arrival order. A more urgent command may only overtake
+  // low-priority queries; controls for one target run in the order sent, so
+  // a later stop never lands before an earlier load/play/seek.
+  _next(q) {
+    let best = 0;
+    for (let i = 1; i < q.items.length; i++) {
+      if (q.items[i - 1].priority < PRIORITY_LOW) break;
+      if (q.items[i].priority < q.items[best].priority) best = i;
+    }
+    return q.items.splice(best, 1)[0];
+  }
+
+  async _run(q) {
+    q.running = true;
+    this.active++;
+    this.waitingTargets = this.waitingTargets.filter(t => t !== q.target);
+    try {
+      while (q.items.length) {
+        const item = this._next(q);
+        const started = Date.now();
+        if (started > item.deadline) {
+          q.stats.expired++;
+          this.totals.expired++;
+          item.resolve({ status: 'error', error: `deadline exceeded after ${started - item.enqueuedAt}ms in queue` });
+          continue;
+        }
+        const waitMs = started - item.enqueuedAt;
+        let payload;
+        let timer;
+        let timedOut = false;
+        const controller = new AbortController();
+        const running = Promise.resolve().then(() => this.executor(item.msg, controller.signal));
+        try {
+          const timeout = new Promise((_, reject) => {
+            timer = setTimeout(() => reject(new Error('command timed out')), item.msg.timeoutMs || DEFAULT_TIMEOUT_MS);
+          });
+          payload = await Promise.race([running, timeout]);
+        } catch (err) {
+          payload = { status: 'error', error: err.message };
+          if (err.message === 'command timed out') {
+            timedOut = true;
+            this.totals.timedOut++;
+            controller.abort();
+            // Answer the caller now, but keep the target serialized until the
+            // aborted command is really gone.
+            item.resolve(Object.assign({}, payload, { waitMs, runMs: Date.now() - started }));
+            await this._settle(q, running);
+          }
+        } finally {
+          clearTimeout(timer);
+        }
+        // Already answered; a timed-out command doesn't count as executed.
+        if (timedOut) continue;
+        const runMs = Date.now() - started;
+        q.stats.executed++;
+        q.stats.waitTotalMs += waitMs;
+        q.stats.waitMaxMs = Math.max(q.stats.waitMaxMs, waitMs);
+        q.stats.runTotalMs += runMs;
+        this.totals.executed++;
+        item.resolve(Object.assign({}, payload, { waitMs, runMs }));
+      }
+    } finally {
+      q.running = false;
+      this.active--;
+      // Entries can be stale (target already ran or drained); don't let one
+      // consume the freed slot.
+      while (this.waitingTargets.length) {
+        const next = this.queues.get(this.waitingTargets.shift());
+        if (next && !next.running && next.items.length) {
+          this._schedule(next.target);
+          break;
+        }
+      }
+    }
+  }
+
+  async _settle(q, running) {
+    let timer;
+    const grace = new Promise(resolve => { timer = setTimeout(() => resolve('grace'), SETTLE_GRACE_MS); });
+    const outcome = await Promise.race([running.then(() => 'settled', () => 'settled'), grace]);
+    clearTimeout(timer);
+    if (outcome === 'grace') {
+      console.warn(`⚠️ ${q.target}: timed-out command still running after ${SETTLE_GRACE_MS}ms; releasing target`);
+    }
+  }
+}
+
+module.exports = new CommandScheduler();
@@ -9,6 +9,7 @@ const { spawn } = require('child_process');
 const fs = require('fs');
 
 const castService = require('./castService');
+const scheduler = require('./commandScheduler');
 
 const app = express();
 
@@ -32,6 +33,20 @@ app.get('/', (req, res) => {
   return res.send('<h1>Device Connected ✅</h1>');
 });
 
+app.get('/scheduler/metrics', (req, res) => {
+  res.json(scheduler.metrics());
+});
+
+scheduler.setExecutor(executeCommand);
+
+// Write any debounced cast-cache changes before the container stops
+for (const signal of ['SIGTERM', 'SIGINT']) {
+  process.on(signal, async () => {
+    await castService.flush();
+    process.exit(0);
+  });
+}
+
 app.listen(PORT, async () => {
   // Initialize Cast discovery & clients
   await castService.init();
@@ -161,37 +176,47 @@ function startSocketIO() {
 
   socket.on('device-command', async (msg, ack) => {
     console.log('⮞ Received device-command:', msg);
-    const { type, targetDeviceId, args = [] } = msg;
+    // Serialized per target, parallel across targets, superseded
+    // volume/seek commands coalesced (see commandScheduler.js)
+    const reply = await scheduler.submit(msg);
+    if (typeof ack === 'function') ack(reply);
+  });
+}
 
-    if (type.startsWith('cast:')) {
-      // Handle Cast commands via our CastService
-      const action = type.split(':')[1];
-      try {
-        const result = await castService[action](targetDeviceId, ...args);
-        return ack({ status: 'ok', result });
-      } catch (err) {
-        return ack({ status: 'error', error: err.message });
-      }
-    }
+// Execute one device-command; called by the scheduler
+// (signal aborts local processes when the scheduler times the command out)
+async function executeCommand(msg, signal) {
+  const { type, targetDeviceId, args = [] } = msg;
 
-    // Fallback: spawn a local process for other commands
+  if (type.startsWith('cast:')) {
+    // Handle Cast commands via our CastService
+    const action = type.split(':')[1];
     try {
-      const output = await runLocal(type, args);
-      return ack({ status: 'ok', stdout: output });
+      const result = await castService[action](targetDeviceId, ...args);
+      return { status: 'ok', result };
     } catch (err) {
-      return ack({ status: 'error', error: err.message });
+      return { status: 'error', error: err.message };
     }
-  });
+  }
+
+  // Fallback: spawn a local process for other commands
+  try {
+    const output = await runLocal(type, args, signal);
+    return { status: 'ok', stdout: output };
+  } catch (err) {
+    return { status: 'error', error: err.message };
+  }
 }
 
 // Helper: spawn a local binary with arguments
-function runLocal(binary, args) {
+function runLocal(binary, args, signal) {
   return new Promise((resolve, reject) => {
     console.log(`💻 Spawning ${binary} ${args.join(' ')}`);
-    const proc = spawn(binary, args);
+    const proc = spawn(binary, args, { signal });
     let out = '', err = '';
     proc.stdout.on('data', b => out += b.toString());
     proc.stderr.on('data', b => err += b.toString());
+    proc.on('error', reject);
     proc.on('exit', code =>
       code === 0 ? resolve(out) : reject(new Error(err.trim() || `Exit ${code}`))
     );
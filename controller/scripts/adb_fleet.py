@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import random
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import inventory
+from adb_session import ADB_BIN, AdbError, adb_connect_server, adb_request, _recv_exact
+
+#─── Constants ────────────────────────────────────────────────────────────────
+CONNECT_TIMEOUT = 5.0       # host:connect plus reaching the `device` state
+BACKOFF_BASE    = 1.0
+BACKOFF_CAP     = 60.0
+CONNECT_WORKERS = 32
+TRACK_RETRY     = 2.0       # seconds between attempts to re-open the device tracker
+STABLE_AFTER    = 30.0      # a transport up this long resets the backoff when it drops
+
+#─── Server Queries ───────────────────────────────────────────────────────────
+def _read_string(sock):
+    length = int(_recv_exact(sock, 4), 16)
+    return _recv_exact(sock, length).decode("utf-8", "replace")
+
+
+def ensure_server():
+    """Start the local adb server if nothing is listening on 5037."""
+    try:
+        adb_connect_server(2).close()
+    except OSError:
+        subprocess.run([ADB_BIN, "start-server"], capture_output=True, timeout=15)
+
+
+def adb_query(payload, timeout=CONNECT_TIMEOUT):
+    """Send a host: request and return its length-prefixed reply."""
+    sock = adb_connect_server(timeout)
+    try:
+        adb_request(sock, payload)
+        return _read_string(sock)
+    finally:
+        sock.close()
+
+
+def host_connect(serial, timeout=CONNECT_TIMEOUT):
+    """Ask the adb server to open a TCP transport to serial ('ip:port')."""
+    reply = adb_query(f"host:connect:{serial}", timeout)
+    if not reply.startswith(("connected", "already connected")):
+        raise AdbError(reply.strip() or "connect failed")
+    return reply.strip()
+
+
+def host_disconnect(serial, timeout=CONNECT_TIMEOUT):
+    try:
+        return adb_query(f"host:disconnect:{serial}", timeout).strip()
+    except (AdbError, OSError) as e:
+        return str(e)
+
+
+def parse_device_list(text):
+    """'serial\\tstate\\n…' → {serial: state}."""
+    states = {}
+    for line in text.splitlines():
+        serial, sep, state = line.partition("\t")
+        if sep:
+            states[serial.strip()] = state.split()[0] if state.split() else ""
+    return states
+
+#─── Fleet Manager ────────────────────────────────────────────────────────────
+class Target:
+    """Connection bookkeeping for one ADB serial."""
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.state = "disconnected"     # adb state, or disconnected/connecting
+        self.since = time.time()
+        self.failures = 0
+        self.reconnects = 0
+        self.next_attempt = 0.0
+        self.last_error = None
+        self.ever_connected = False
+
+    def as_dict(self):
+        return {
+            "serial": self.serial,
+            "state": self.state,
+            "since": round(self.since, 3),
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+            "next_attempt_in": (round(max(0.0, self.next_attempt - time.monotonic()), 1)
+                                if self.state != "device" and self.next_attempt != float("inf") else None),
+            "last_error": self.last_error,
+        }
+
+
+class FleetManager:
+    """
+    Keeps a set of ADB-over-TCP targets attached to the local adb server.
+    Transport health comes from one `host:track-devices` stream (the server
+    pushes the full list on every change), so nothing is polled; targets
+    that drop or never attach are reconnected concurrently with jittered
+    exponential backoff.
+    """
+
+    def __init__(self, serials, timeout=CONNECT_TIMEOUT, workers=CONNECT_WORKERS):
+        self.timeout = timeout
+        self.targets = {s: Target(s) for s in serials}
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(self.targets))))
+        self._stop = threading.Event()
+        self._tracking = threading.Event()
+        self._track_sock = None
+        self._threads = []
+
+    #── Tracking ──
+    def _apply(self, states):
+        now = time.time()
+        with self._cond:
+            for serial, t in self.targets.items():
+                new = states.get(serial)
+                if new is None:
+                    if t.state == "connecting":
+                        continue
+                    new = "disconnected"
+                if new != t.state:
+                    logging.info("%s: %s -> %s", serial, t.state, new)
+                    if t.state == "device" and new != "device":
+                        # Reconnect at once after a long session; back off if it keeps flapping.
+                        if now - t.since >= STABLE_AFTER:
+                            t.failures = 0
+                        t.next_attempt = time.monotonic() + (self._backoff(t.failures) if t.failures else 0.0)
+                        t.failures += 1
+                    t.state, t.since = new, now
+                    if new == "device":
+                        if t.ever_connected:
+                            t.reconnects += 1
+                        t.last_error, t.ever_connected = None, True
+            self._cond.notify_all()
+
+    def _track_loop(self):
+        while not self._stop.is_set():
+            try:
+                sock = adb_connect_server(self.timeout)
+                adb_request(sock, "host:track-devices")
+                sock.settimeout(None)
+                self._track_sock = sock
+                self._tracking.set()
+                while not self._stop.is_set():
+                    self._apply(parse_device_list(_read_string(sock)))
+            except (AdbError, OSError) as e:
+                if self._stop.is_set():
+                    break
+                logging.warning("Device tracker lost (%s); retrying", e)
+                ensure_server()
+                self._stop.wait(TRACK_RETRY)
+            finally:
+                self._tracking.clear()
+                if self._track_sock:
+                    self._track_sock.close()
+                    self._track_sock = None
+
+    #── Connecting ──
+    def _backoff(self, failures):
+        delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** max(0, failures - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _connect(self, t):
+        """Connect one target and wait for the tracker to report `device`."""
+        serial = t.serial
+        try:
+            if t.state not in ("disconnected", "connecting"):
+                # A lingering offline/unauthorized transport blocks a fresh connect.
+                host_disconnect(serial, self.timeout)
+            host_connect(serial, self.timeout)
+            with self._cond:
+                ok = self._cond.wait_for(lambda: t.state in ("device", "unauthorized") or self._stop.is_set(),
+                                         self.timeout)
+                if not ok:
+                    raise AdbError(f"transport stayed {t.state}")
+                if t.state == "unauthorized":
+                    raise AdbError("unauthorized (accept the RSA key on the device)")
+        except (AdbError, OSError) as e:
+            with self._cond:
+                t.failures += 1
+                t.last_error = str(e)
+                t.next_attempt = time.monotonic() + self._backoff(t.failures)
+                if t.state == "connecting":
+                    t.state = "disconnected"
+            logging.warning("%s: connect failed (%s); retry in %.1fs", serial, e, t.next_attempt - time.monotonic())
+            return False
+        return True
+
+    def _due(self):
+        now = time.monotonic()
+        due = []
+        with self._cond:
+            for t in self.targets.values():
+                if t.state not in ("device", "connecting") and t.next_attempt <= now:
+                    if t.state == "disconnected":
+                        t.state = "connecting"
+                    # Hold the slot until the attempt finishes.
+                    t.next_attempt = float("inf")
+                    due.append(t)
+        return due
+
+    def _supervise(self):
+        while not self._stop.is_set():
+            if self._tracking.is_set():
+                for t in self._due():
+                    try:
+                        self._executor.submit(self._connect, t)
+                    except RuntimeError:    # executor shut down by stop()
+                        return
+            with self._cond:
+                self._cond.wait(0.5)
+
+    #── Public ──
+    def start(self):
+        ensure_server()
+        for target in (self._track_loop, self._supervise):
+            th = threading.Thread(target=target, daemon=True)
+            th.start()
+            self._threads.append(th)
+        return self
+
+    def wait_ready(self, timeout=None):
+        """Block until every target is in the `device` state; returns True if so."""
+        with self._cond:
+            return self._cond.wait_for(lambda: all(t.state == "device" for t in self.targets.values()),
+                                       timeout)
+
+    def status(self):
+        with self._cond:
+            return [t.as_dict() for t in self.targets.values()]
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._track_sock:
+            try:
+                self._track_sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._executor.shutdown(wait=False)
+
+
+def connect_all(serials, timeout=CONNECT_TIMEOUT):
+    """
+    Connect every serial concurrently and return their status once all are
+    in `device` or the first round of attempts is over.
+    """
+    fleet = FleetManager(serials, timeout).start()
+    try:
+        deadline = time.monotonic() + timeout * 2 + 1
+        with fleet._cond:
+            fleet._cond.wait_for(lambda: all(t.state == "device" or t.failures for t in fleet.targets.values()),
+                                 max(0.0, deadline - time.monotonic()))
+        return fleet.status()
+    finally:
+        fleet.stop()
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    parser = argparse.ArgumentParser(description="Connect and supervise ADB-over-TCP devices")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name, help_text in (("connect", "Connect all targets once and report"),
+                            ("watch", "Keep targets connected, printing status periodically")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("serials", nargs="*", help="ip:port targets (default: ADB devices in the inventory)")
+        p.add_argument("--timeout", type=float, default=CONNECT_TIMEOUT)
+    sub.choices["watch"].add_argument("--interval", type=float, default=30, help="Status print interval")
+    disc_p = sub.add_parser("disconnect", help="Drop transports")
+    disc_p.add_argument("serials", nargs="+")
+    args = parser.parse_args()
+
+    if args.cmd == "disconnect":
+        print(json.dumps({s: host_disconnect(s) for s in args.serials}, indent=2))
+        sys.exit(0)
+
+    serials = args.serials or inventory.adb_serials()
+    if not serials:
+        print(json.dumps({"error": "no ADB targets"}))
+        sys.exit(1)
+    if args.cmd == "connect":
+        status = connect_all(serials, args.timeout)
+        print(json.dumps(status, indent=2))
+        sys.exit(0 if all(s["state"] == "device" for s in status) else 1)
+
+    fleet = FleetManager(serials, args.timeout).start()
+    try:
+        while True:
+            time.sleep(args.interval)
+            print(json.dumps(fleet.status()), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.stop()
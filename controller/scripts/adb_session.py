@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import re
+import uuid
+import time
+import socket
+import queue
+import logging
+import threading
+import subprocess
+
+#─── Constants ────────────────────────────────────────────────────────────────
+ADB_BIN         = "adb"
+ADB_SERVER      = ("127.0.0.1", 5037)
+COMMAND_TIMEOUT = 10       # seconds before a wedged shell is restarted
+
+_shells = {}
+_shells_lock = threading.Lock()
+
+#─── Persistent Shell ─────────────────────────────────────────────────────────
+class AdbShell:
+    """
+    One long-lived `adb -s SERIAL shell` process. Commands are written to its
+    stdin and delimited by a per-session marker, so each call costs a write and
+    a read on an open transport instead of a new adb client + shell handshake.
+    """
+
+    def __init__(self, serial, adb=ADB_BIN):
+        self.serial = serial
+        self.adb = adb
+        self.proc = None
+        self.marker = f"__SS_{uuid.uuid4().hex[:12]}__"
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            [self.adb, "-s", self.serial, "shell"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            bufsize=0,
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._reader, args=(self.proc, self._lines),
+                         name=f"adb-shell-{self.serial}", daemon=True).start()
+        logging.debug("Opened persistent shell on %s", self.serial)
+
+    def _reader(self, proc, lines):
+        for raw in iter(proc.stdout.readline, b""):
+            lines.put(raw.decode("utf-8", "replace").rstrip("\r\n"))
+        lines.put(None)
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def run(self, command, timeout=COMMAND_TIMEOUT):
+        """
+        Run one shell command. Returns (returncode, output, latency_ms).
+        The session is restarted transparently if it died or timed out.
+        """
+        with self._lock:
+            if not self.alive:
+                self.start()
+            start = time.monotonic()
+            try:
+                self.proc.stdin.write(f"{{ {command}\n}} 2>&1 </dev/null; echo \"{self.marker} $?\"\n".encode())
+                self.proc.stdin.flush()
+            except (BrokenPipeError, OSError):
+                self.close_locked()
+                raise ConnectionError(f"adb shell to {self.serial} is gone")
+            out = []
+            deadline = start + timeout
+            while True:
+                try:
+                    line = self._lines.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self.close_locked()
+                    raise TimeoutError(f"{command!r} on {self.serial} timed out after {timeout}s")
+                if line is None:
+                    self.close_locked()
+                    raise ConnectionError(f"adb shell to {self.serial} closed: {' '.join(out)[-200:]}")
+                # Output without a trailing newline shares its last line with the marker.
+                head, sep, tail = line.partition(self.marker)
+                if sep:
+                    if head:
+                        out.append(head)
+                    return int(tail.split()[0]), "\n".join(out), (time.monotonic() - start) * 1000
+                out.append(line)
+
+    def close_locked(self):
+        if self.proc is not None:
+            try:
+                self.proc.kill()
+            except OSError:
+                pass
+            self.proc = None
+
+    def close(self):
+        with self._lock:
+            self.close_locked()
+
+
+def get_shell(serial):
+    """Return the shared persistent shell for serial, creating it on first use."""
+    with _shells_lock:
+        shell = _shells.get(serial)
+        if shell is None:
+            shell = _shells[serial] = AdbShell(serial)
+        return shell
+
+
+def safe_serial(serial):
+    """Return serial made safe for use as a file or directory name."""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", serial)
+
+
+def close_all():
+    with _shells_lock:
+        for shell in _shells.values():
+            shell.close()
+        _shells.clear()
+
+
+#─── ADB Server Protocol ──────────────────────────────────────────────────────
+class AdbError(Exception):
+    pass
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise AdbError("adb server closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+
+def adb_request(sock, payload):
+    """Send one smart-socket request and raise AdbError on FAIL."""
+    data = payload.encode() if isinstance(payload, str) else payload
+    sock.sendall(b"%04x" % len(data) + data)
+    status = _recv_exact(sock, 4)
+    if status != b"OKAY":
+        length = int(_recv_exact(sock, 4), 16)
+        raise AdbError(_recv_exact(sock, length).decode("utf-8", "replace"))
+
+
+def adb_connect_server(timeout=COMMAND_TIMEOUT):
+    """Open a socket to the local adb server (which owns the device transports)."""
+    sock = socket.create_connection(ADB_SERVER, timeout=timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def adb_open_service(serial, service, timeout=COMMAND_TIMEOUT):
+    """
+    Open `service` (e.g. "exec:screencap", "shell:logcat") on serial through
+    the adb server's existing transport, without spawning an adb client.
+    Returns the connected socket.
+    """
+    sock = adb_connect_server(timeout)
+    try:
+        adb_request(sock, f"host:transport:{serial}")
+        adb_request(sock, service)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def adb_exec_out(serial, command, timeout=COMMAND_TIMEOUT):
+    """Run command with a raw (no pty) stdout stream and return its bytes."""
+    sock = adb_open_service(serial, f"exec:{command}", timeout)
+    chunks = []
+    try:
+        while True:
+            chunk = sock.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    return b"".join(chunks)
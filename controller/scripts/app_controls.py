@@ -1,93 +1,237 @@
 #!/usr/bin/env python3
 import os
-import socket
-import subprocess
-import logging
-import time
-import configparser
+import re
+import sys
 import json
-from concurrent.futures import ThreadPoolExecutor
-import tkinter as tk
-from tkinter import messagebox, ttk
+import time
+import logging
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from adb_session import get_shell, safe_serial
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+#─── Constants ────────────────────────────────────────────────────────────────
+APP_INDEX_DIR = "/data/app_index"
+MAX_WORKERS   = 16          # devices handled in parallel by the CLI
+
+LAUNCHER_CATEGORIES = [
+    "android.intent.category.LEANBACK_LAUNCHER",
+    "android.intent.category.LAUNCHER",
+]
+
+
+class AppControlError(Exception):
+    pass
+
+
+def _sh(serial, command):
+    """Run a command on the device's persistent shell; return (rc, output)."""
+    rc, out, _ = get_shell(serial).run(command)
+    return rc, out
+
+#─── Device Queries ───────────────────────────────────────────────────────────
+def list_packages(serial, third_party=False):
+    """Return {package: versionCode or None} for installed packages."""
+    flags = "--show-versioncode" + (" -3" if third_party else "")
+    rc, out = _sh(serial, f"pm list packages {flags}")
+    if rc != 0 or "Unknown option" in out:
+        rc, out = _sh(serial, "pm list packages" + (" -3" if third_party else ""))
+    packages = {}
+    for line in out.splitlines():
+        m = re.match(r"package:(\S+)(?:\s+versionCode:(\d+))?", line.strip())
+        if m:
+            packages[m.group(1)] = int(m.group(2)) if m.group(2) else None
+    return packages
+
+
+def package_version(serial, package):
+    """Return the installed versionCode of one package, or None if absent."""
+    _, out = _sh(serial, f"dumpsys package {package} | grep -m1 versionCode")
+    m = re.search(r"versionCode=(\d+)", out)
+    return int(m.group(1)) if m else None
+
+
+def foreground_app(serial):
+    """Return {'package', 'activity'} of the resumed activity, or None."""
+    _, out = _sh(serial, "dumpsys activity activities | grep -E 'mResumedActivity|topResumedActivity' | head -n 1")
+    m = re.search(r"\s([\w.]+)/([\w.$]+)", out)
+    if not m:
+        _, out = _sh(serial, "dumpsys window | grep -E 'mCurrentFocus|mFocusedApp' | head -n 1")
+        m = re.search(r"\s([\w.]+)/([\w.$]+)", out)
+    if not m:
+        return None
+    activity = m.group(2)
+    if activity.startswith("."):
+        activity = m.group(1) + activity
+    return {"package": m.group(1), "activity": activity}
+
 
-# ----------------- Pure, CLI‐Ready Functions -----------------
-
-def quick_scan_results():
-    """Return list of dicts for each alive IP in local /24 subnet."""
-    local_ip = get_local_ip()
-    subnet = ".".join(local_ip.split(".")[:3])
-    ips = [f"{subnet}.{i}" for i in range(1, 255)]
-    active = []
-    with ThreadPoolExecutor(max_workers=50) as executor:
-        results = list(executor.map(ping_ip, ips))
-    for ip, alive in zip(ips, results):
-        if alive:
-            active.append(ip)
-
-    output = []
-    for ip in active:
-        output.append({
-            "ip": ip,
-            "ssdp": check_ssdp(ip),
-            "mdns": check_mdns(ip),
-            "adb": check_adb_port(ip)
-        })
-    return output
-
-
-def deep_scan_results():
-    """Sequential scan: equivalent to quick_scan_results."""
-    # For simplicity, reuse quick version (sequential fallback could be implemented if needed)
-    return quick_scan_results()
-
-
-# ----------------- Existing UI‐Bound Functions -----------------
-
-def get_local_ip():
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        logging.info(f"Local IP determined: {local_ip}")
-        return local_ip
-    except Exception as e:
-        logging.error(f"Error getting local IP: {e}")
-        return "127.0.0.1"
-    finally:
-        s.close()
-
-# ... (rest of existing functions unchanged) ...
-
-def check_ssdp(ip):
-    cmd = 'echo -e "M-SEARCH * HTTP/1.1\\r\\nHOST: 239.255.255.250:1900\\r\\nMAN: \"ssdp:discover\"\\r\\nMX: 1\\r\\nST: ssdp:all\\r\\n\\r\\n" | nc -u -w1 ' + ip + ' 1900'
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=1)
-        return "LOCATION:" in result.stdout
-    except Exception:
-        return False
-
-# [Include all other existing functions exactly as before]
-# ping_ip, check_mdns, check_port, check_adb_port,
-# save_adb_devices, update_adb_dropdown, quick_scan_active_ips,
-# scan_network_for_adb, deep_scan, connect_to_adb,
-# check_adb_on_selected_ip, scan_service, custom_search
-
-# ----------------- CLI Entry Point -----------------
+def resolve_launcher(serial, package):
+    """Return the 'pkg/.Activity' component that launches package, or None."""
+    for category in LAUNCHER_CATEGORIES:
+        _, out = _sh(serial, f"cmd package resolve-activity --brief -a android.intent.action.MAIN "
+                             f"-c {category} {package} | tail -n 1")
+        comp = out.strip()
+        if "/" in comp and not comp.startswith("No activity"):
+            return comp
+    return None
 
+#─── Package → Activity Index ─────────────────────────────────────────────────
+class AppIndex:
+    """
+    Per-device cache of package → {version, activity}, persisted under
+    /data/app_index. Activities are resolved lazily and dropped when the
+    package's versionCode changes, so a warm launch is a single `am start -n`.
+    """
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.path = os.path.join(APP_INDEX_DIR, f"{safe_serial(serial)}.json")
+        self.packages = {}
+        self.updated = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.packages = data.get("packages", {})
+            self.updated = data.get("updated")
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        os.makedirs(APP_INDEX_DIR, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"serial": self.serial, "updated": self.updated, "packages": self.packages}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def refresh(self):
+        """Re-list packages; invalidate resolved activities whose version changed."""
+        installed = list_packages(self.serial)
+        with self._lock:
+            fresh = {}
+            for pkg, version in installed.items():
+                entry = self.packages.get(pkg, {})
+                if entry.get("version") == version and version is not None:
+                    fresh[pkg] = entry
+                else:
+                    fresh[pkg] = {"version": version, "activity": None}
+            self.packages = fresh
+            self.updated = time.time()
+            self._save()
+        return self.packages
+
+    def activity(self, package):
+        with self._lock:
+            entry = self.packages.get(package)
+            if entry and entry.get("activity"):
+                return entry["activity"]
+        comp = resolve_launcher(self.serial, package)
+        if comp is None:
+            return None
+        with self._lock:
+            entry = self.packages.setdefault(package, {"version": None, "activity": None})
+            entry["activity"] = comp
+            if entry.get("version") is None:
+                entry["version"] = package_version(self.serial, package)
+            self._save()
+        return comp
+
+    def invalidate(self, package):
+        with self._lock:
+            if self.packages.pop(package, None) is not None:
+                self._save()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(serial):
+    with _indexes_lock:
+        if serial not in _indexes:
+            _indexes[serial] = AppIndex(serial)
+        return _indexes[serial]
+
+#─── App Control ──────────────────────────────────────────────────────────────
+def launch_app(serial, package):
+    """Launch package's launcher activity; returns {'component', 'elapsed_ms'}."""
+    start = time.monotonic()
+    index = get_index(serial)
+    for attempt in (1, 2):
+        comp = index.activity(package)
+        if comp is None:
+            raise AppControlError(f"{package} has no launcher activity on {serial}")
+        _, out = _sh(serial, f"am start -n {comp}")
+        if "Error" not in out:
+            return {"serial": serial, "component": comp, "elapsed_ms": round((time.monotonic() - start) * 1000, 1)}
+        logging.info("%s: cached activity %s is stale, re-resolving", serial, comp)
+        index.invalidate(package)
+    raise AppControlError(f"Could not start {package} on {serial}: {out.strip()}")
+
+
+def stop_app(serial, package):
+    rc, out = _sh(serial, f"am force-stop {package}")
+    if rc != 0:
+        raise AppControlError(out.strip() or f"force-stop failed on {serial}")
+    return {"serial": serial, "stopped": package}
+
+
+def clear_app(serial, package):
+    rc, out = _sh(serial, f"pm clear {package}")
+    if rc != 0 or "Success" not in out:
+        raise AppControlError(out.strip() or f"pm clear failed on {serial}")
+    return {"serial": serial, "cleared": package}
+
+
+def run_on_devices(serials, func, *args):
+    """Run func(serial, *args) on every device in parallel; returns {serial: result}."""
+    def call(serial):
+        try:
+            return serial, func(serial, *args)
+        except Exception as e:
+            return serial, {"error": str(e)}
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(serials))) as executor:
+        return dict(executor.map(call, serials))
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Network-scan utilities: quick or deep scan")
-    parser.add_argument("mode", choices=["quick","deep"], help="Which scan to run")
-    parser.add_argument("--json", action="store_true", help="Output in JSON format")
+    parser = argparse.ArgumentParser(description="App inventory and launch control over ADB")
+    parser.add_argument("devices", nargs="+", help="ADB targets; commands run on all of them in parallel")
+    parser.add_argument("--cmd", required=True,
+                        choices=["list", "refresh", "foreground", "resolve", "launch", "stop", "clear"])
+    parser.add_argument("--package", help="Package name for resolve/launch/stop/clear")
+    parser.add_argument("--third-party", action="store_true", help="list: only third-party packages")
     args = parser.parse_args()
 
-    if args.mode == "quick":
-        result = quick_scan_results()
-    else:
-        result = deep_scan_results()
+    if args.cmd in ("resolve", "launch", "stop", "clear") and not args.package:
+        parser.error(f"--package is required for {args.cmd}")
 
-    if args.json:
-        print(json.dumps(result, indent=2))
+    if args.cmd == "list":
+        results = run_on_devices(args.devices, list_packages, args.third_party)
+    elif args.cmd == "refresh":
+        results = run_on_devices(args.devices, lambda s: get_index(s).refresh())
+    elif args.cmd == "foreground":
+        results = run_on_devices(args.devices, foreground_app)
+    elif args.cmd == "resolve":
+        results = run_on_devices(args.devices, lambda s, p: get_index(s).activity(p), args.package)
+    elif args.cmd == "launch":
+        results = run_on_devices(args.devices, launch_app, args.package)
+    elif args.cmd == "stop":
+        results = run_on_devices(args.devices, stop_app, args.package)
     else:
-        for entry in result:
-            print(f"{entry['ip']}\tSSDP={entry['ssdp']}\tmDNS={entry['mdns']}\tADB={entry['adb']}")
+        results = run_on_devices(args.devices, clear_app, args.package)
+
+    print(json.dumps(results, indent=2))
+    failed = any(isinstance(r, dict) and "error" in r for r in results.values())
+    sys.exit(1 if failed else 0)
@@ -4,10 +4,16 @@ import logging
 import argparse
 import json
 import time
+import asyncio
 
 import pychromecast
 from pychromecast.discovery import discover_listed_chromecasts
 
+import castv2
+from net_timeouts import get_controller
+from media_origin import localize_url
+from cast_playlist import expand_sources, play_playlist, REPEAT_MODES, PRELOAD_TIME, QUEUE_WINDOW
+
 #─── Logging ──────────────────────────────────────────────────────────────────
 logging.basicConfig(
     level=logging.INFO,
@@ -17,7 +23,7 @@ logging.basicConfig(
 
 #─── Constants ────────────────────────────────────────────────────────────────
 DISCOVER_TIMEOUT = 5       # seconds to wait for discovery
-CONNECT_TIMEOUT  = 5       # seconds for Chromecast.connect()
+CONNECT_TIMEOUT  = 5       # upper bound; per-host deadlines come from net_timeouts
 RETRY_DELAY      = 2       # retry delay for discovery
 
 #─── Discovery & Connection Helpers ──────────────────────────────────────────
@@ -49,17 +55,72 @@ def connect_to(device_info):
     """
     Given a ChromecastInfo (with .host/.port), open a socket,
     wait for status, and return a live Chromecast client.
+    Each attempt's deadline adapts to the host's measured RTT.
     """
     logging.info("Connecting to %r...", device_info.friendly_name)
-    cc = pychromecast.Chromecast(
-        host=device_info.host,
-        port=device_info.port,
-        timeout=CONNECT_TIMEOUT
-    )
-    cc.wait(timeout=CONNECT_TIMEOUT)
+
+    def attempt(timeout):
+        try:
+            cc = pychromecast.Chromecast(
+                host=device_info.host,
+                port=device_info.port,
+                timeout=timeout
+            )
+            cc.wait(timeout=timeout)
+        except Exception as e:
+            logging.warning("Connect attempt (%.1fs) failed: %s", timeout, e)
+            return None
+        if cc.status is None:
+            cc.disconnect()
+            return None
+        return cc
+
+    cc = get_controller().run(device_info.host, "cast", attempt)
+    if cc is None:
+        logging.error("Timed out connecting to %r", device_info.friendly_name)
+        sys.exit(1)
     logging.info("Connected to %r", device_info.friendly_name)
     return cc
 
+def resolve_target(name):
+    """(host, port) for name: cast cache / inventory first, discovery as a fallback."""
+    target = castv2.resolve(name)
+    if target is None:
+        d = find_device(name)
+        target = (d.host, d.port)
+    return target
+
+async def run_media_command(args, targets):
+    """Run one media/volume command on every (host, port, name) target over a shared Cast v2 pool."""
+    pool = castv2.CastPool()
+    url = None
+    if args.cmd == 'load':
+        url = localize_url(args.url) if args.local else args.url
+        logging.info("Loading media '%s' (type=%s)", url, args.type)
+
+    async def one(host, port, name):
+        conn = await pool.get(host, port, name)
+        if args.cmd == 'load':
+            return await conn.load(url, args.type)
+        if args.cmd in ('play', 'pause', 'stop'):
+            return await getattr(conn, args.cmd)()
+        if args.cmd == 'seek':
+            return await conn.seek(args.seconds)
+        if args.cmd == 'vol':
+            return await conn.set_volume(args.level)
+        return await conn.set_muted(not args.unmute)
+
+    try:
+        results = await asyncio.gather(*(one(*t) for t in targets), return_exceptions=True)
+    finally:
+        await pool.close()
+    failed = 0
+    for (_, _, name), result in zip(targets, results):
+        if isinstance(result, Exception):
+            logging.error("Error running %s on %r: %s", args.cmd, name, result)
+            failed += 1
+    return failed
+
 #─── Main CLI ─────────────────────────────────────────────────────────────────
 def main():
     p = argparse.ArgumentParser(description="Chromecast control CLI")
@@ -74,28 +135,45 @@ def main():
 
     # load media
     load_p = sub.add_parser('load', help="Load media URL")
-    load_p.add_argument('-s', '--source', required=True, help="Friendly name of target device")
+    load_p.add_argument('-s', '--source', required=True, action='append',
+                        help="Friendly name of target device (repeat for several)")
     load_p.add_argument('url', help="Media URL to load")
     load_p.add_argument('--type', default='video/mp4', help="Content type")
+    load_p.add_argument('--local', action='store_true', help="Serve through the local media origin cache")
+
+    # playlist
+    pl_p = sub.add_parser('playlist', help="Play URLs / M3U files as a gapless Cast queue")
+    pl_p.add_argument('-s', '--source', required=True, help="Friendly name of target device")
+    pl_p.add_argument('entries', nargs='+', help="Media URLs and/or playlist files")
+    pl_p.add_argument('--type', default='video/mp4', help="Content type when it can't be guessed")
+    pl_p.add_argument('--repeat', choices=sorted(REPEAT_MODES), default='off', help="Repeat mode")
+    pl_p.add_argument('--preload', type=float, default=PRELOAD_TIME,
+                      help="Seconds before an item ends to start buffering the next")
+    pl_p.add_argument('--window', type=int, default=QUEUE_WINDOW,
+                      help="Items kept queued on the receiver; longer lists are fed as they play")
+    pl_p.add_argument('--detach', action='store_true',
+                      help="Exit once the queue is loaded (only when it fits in --window)")
+    pl_p.add_argument('--duration', type=float, help="Stop watching after N seconds")
+    pl_p.add_argument('--local', action='store_true', help="Serve through the local media origin cache")
 
     # simple media commands
     for cmd in ('play','pause','stop'):
         c = sub.add_parser(cmd, help=f"{cmd.capitalize()} media")
-        c.add_argument('-s','--source',required=True,help="Friendly name of target device")
+        c.add_argument('-s','--source',required=True,action='append',help="Friendly name of target device (repeatable)")
 
     # seek
     seek_p = sub.add_parser('seek', help="Seek to position (seconds)")
-    seek_p.add_argument('-s','--source',required=True,help="Friendly name of target device")
+    seek_p.add_argument('-s','--source',required=True,action='append',help="Friendly name of target device (repeatable)")
     seek_p.add_argument('seconds',type=float,help="Seconds to seek to")
 
     # volume
     vol_p = sub.add_parser('vol', help="Set volume level (0.0–1.0)")
-    vol_p.add_argument('-s','--source',required=True,help="Friendly name of target device")
+    vol_p.add_argument('-s','--source',required=True,action='append',help="Friendly name of target device (repeatable)")
     vol_p.add_argument('level',type=float,help="Volume level between 0.0 and 1.0")
 
     # mute/unmute
     mute_p = sub.add_parser('mute', help="Mute or unmute")
-    mute_p.add_argument('-s','--source',required=True,help="Friendly name of target device")
+    mute_p.add_argument('-s','--source',required=True,action='append',help="Friendly name of target device (repeatable)")
     mute_p.add_argument('--unmute',action='store_true',help='Unmute instead of mute')
 
     args = p.parse_args()
@@ -115,43 +193,33 @@ def main():
         # once we've done the handshake, exit
         sys.exit(0)
 
-    # ───────────── MEDIA COMMANDS ─────────────
-    # For all other commands we need to discover & connect
-    # by `args.source` then invoke the correct method on `cc`
-    device_info = find_device(args.source)
-    cc = connect_to(device_info)
-    mc = cc.media_controller
-    status = cc.status  # up-to-date after cc.wait()
-
-    try:
-        if args.cmd == 'load':
-            logging.info("Loading media '%s' (type=%s)", args.url, args.type)
-            mc.play_media(args.url, content_type=args.type)
-            mc.block_until_active()
-        elif args.cmd == 'play':
-            mc.play()
-        elif args.cmd == 'pause':
-            mc.pause()
-        elif args.cmd == 'stop':
-            mc.stop()
-        elif args.cmd == 'seek':
-            logging.info("Seeking to %s seconds", args.seconds)
-            mc.seek(args.seconds)
-        elif args.cmd == 'vol':
-            logging.info("Setting volume to %s", args.level)
-            cc.set_volume(args.level)
-        elif args.cmd == 'mute':
-            action = not args.unmute
-            logging.info("%s the device", "Muting" if action else "Unmuting")
-            cc.set_volume_muted(action)
-        else:
-            logging.error("Unknown command: %s", args.cmd)
+    # ───────────── PLAYLIST ───────────────────
+    # Queue management still runs on a pychromecast connection.
+    if args.cmd == 'playlist':
+        device_info = find_device(args.source)
+        cc = connect_to(device_info)
+        try:
+            entries = expand_sources(args.entries, args.type)
+            if args.local:
+                for e in entries:
+                    e['url'] = localize_url(e['url'])
+            report = play_playlist(cc, entries, args.repeat, args.preload, args.window,
+                                   watch=not args.detach, duration=args.duration)
+            print(json.dumps(report, indent=2))
+        except Exception as e:
+            logging.error("Error running %s: %s", args.cmd, e)
             sys.exit(1)
-
         logging.info("Command '%s' completed", args.cmd)
-    except Exception as e:
-        logging.error("Error running %s: %s", args.cmd, e)
+        sys.exit(0)
+
+    # ───────────── MEDIA COMMANDS ─────────────
+    # load/play/pause/stop/seek/vol/mute run on the asyncio Cast v2 client:
+    # every -s target is handled concurrently on one event loop.
+    targets = [resolve_target(name) + (name,) for name in args.source]
+    failed = asyncio.run(run_media_command(args, targets))
+    if failed:
         sys.exit(1)
+    logging.info("Command '%s' completed", args.cmd)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+import os
+import time
+import random
+import logging
+import mimetypes
+import threading
+import urllib.request
+from urllib.parse import urljoin, urlparse
+
+from pychromecast.controllers import BaseController
+
+#─── Constants ────────────────────────────────────────────────────────────────
+MEDIA_NAMESPACE = "urn:x-cast:com.google.cast.media"
+DEFAULT_TYPE    = "video/mp4"
+PRELOAD_TIME    = 20        # seconds before an item ends that the next starts buffering
+QUEUE_WINDOW    = 20        # items kept on the receiver at once
+LOW_WATER       = 3         # top up when this few items remain after the current one
+LAUNCH_TIMEOUT  = 15
+FETCH_TIMEOUT   = 10        # seconds to download a playlist given by URL
+PLAYLIST_EXTENSIONS = (".m3u",)   # not .m3u8: that is an HLS stream the receiver plays itself
+
+REPEAT_MODES = {
+    "off":     "REPEAT_OFF",
+    "all":     "REPEAT_ALL",
+    "single":  "REPEAT_SINGLE",
+    "shuffle": "REPEAT_ALL_AND_SHUFFLE",
+}
+
+#─── Playlist Parsing ─────────────────────────────────────────────────────────
+def read_playlist(source, default_type=DEFAULT_TYPE):
+    """
+    Parse an M3U-like file: one URL per line, '#' comments, optional
+    '#EXTINF:<secs>,<title>' lines naming the following entry. `source` is
+    a local path or an http(s) URL; relative entries resolve against the
+    playlist's URL. A local playlist must list URLs, since the receiver
+    cannot read files on the controller.
+    """
+    remote = "://" in source
+    if remote:
+        with urllib.request.urlopen(source, timeout=FETCH_TIMEOUT) as resp:
+            lines = resp.read().decode("utf-8", "replace").splitlines()
+    else:
+        with open(source, "r") as f:
+            lines = f.read().splitlines()
+    entries, title = [], None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            title = line.split(",", 1)[1].strip() if "," in line else None
+            continue
+        if line.startswith("#"):
+            continue
+        if "://" not in line:
+            if not remote:
+                raise ValueError(f"{source}: '{line}' is not a URL the Chromecast can fetch")
+            line = urljoin(source, line)
+        entries.append(make_entry(line, title, default_type))
+        title = None
+    return entries
+
+
+def make_entry(url, title=None, default_type=DEFAULT_TYPE):
+    content_type = mimetypes.guess_type(url.split("?", 1)[0])[0] or default_type
+    return {"url": url, "title": title or os.path.basename(url.split("?", 1)[0]), "type": content_type}
+
+
+def expand_sources(sources, default_type=DEFAULT_TYPE):
+    """Turn CLI arguments (URLs and/or playlist files) into a flat entry list."""
+    entries = []
+    for src in sources:
+        is_playlist = urlparse(src).path.lower().endswith(PLAYLIST_EXTENSIONS) if "://" in src \
+            else os.path.isfile(src)
+        if is_playlist:
+            entries.extend(read_playlist(src, default_type))
+        else:
+            entries.append(make_entry(src, None, default_type))
+    return entries
+
+#─── Queue Player ─────────────────────────────────────────────────────────────
+class _QueueWatcher(BaseController):
+    """Sees raw MEDIA_STATUS messages, which carry the queue item ids."""
+
+    def __init__(self, on_status):
+        super().__init__(MEDIA_NAMESPACE)
+        self._on_status = on_status
+
+    def receive_message(self, message, data):
+        if data.get("type") == "MEDIA_STATUS":
+            for status in data.get("status", []):
+                self._on_status(status)
+        return False
+
+
+class PlaylistPlayer:
+    """
+    Plays entries as a Cast media queue so the receiver preloads the next
+    item itself. Playlists longer than the window are fed with QUEUE_INSERT
+    as items finish, and played items are removed, so the queue on the
+    receiver stays bounded for endless loops. Every item change is timed.
+    """
+
+    def __init__(self, cc, entries, repeat="off", preload=PRELOAD_TIME, window=QUEUE_WINDOW):
+        if not entries:
+            raise ValueError("playlist is empty")
+        self.cc = cc
+        self.mc = cc.media_controller
+        self.entries = list(entries)
+        self.repeat = repeat
+        self.preload = preload
+        self.window = window
+        # Short playlists go to the receiver whole and loop natively; longer
+        # ones are rolled through here and the receiver never repeats.
+        self.rolling = len(self.entries) > window and repeat != "single"
+        self.finished = threading.Event()
+        self._lock = threading.Lock()
+        self._order = []
+        self._cursor = 0
+        self._remaining = 0
+        self._session = None
+        self._current = None
+        self._left_playing = None
+        self._pending = None
+        self._preloaded = None
+        self._played = []
+        self.transitions = []
+        self.started = None
+        self.errors = []
+        cc.register_handler(_QueueWatcher(self._on_status))
+
+    # ── queue feeding ──
+    def _next_entries(self, count):
+        out = []
+        while len(out) < count:
+            if self._cursor >= len(self._order):
+                if self._order and self.repeat == "off":
+                    break
+                self._order = list(range(len(self.entries)))
+                if self.repeat == "shuffle":
+                    random.shuffle(self._order)
+                self._cursor = 0
+            idx = self._order[self._cursor]
+            self._cursor += 1
+            out.append(self._item(idx))
+        return out
+
+    def _item(self, idx):
+        entry = self.entries[idx]
+        return {
+            "media": {
+                "contentId": entry["url"],
+                "contentUrl": entry["url"],
+                "contentType": entry["type"],
+                "streamType": "BUFFERED",
+                "metadata": {"metadataType": 0, "title": entry["title"]},
+            },
+            "autoplay": True,
+            "preloadTime": self.preload,
+            "customData": {"index": idx},
+        }
+
+    def start(self):
+        """Launch the default media receiver and send the initial QUEUE_LOAD."""
+        launched = threading.Event()
+        self.mc.launch(callback_function=lambda *a: launched.set())
+        if not launched.wait(LAUNCH_TIMEOUT):
+            raise TimeoutError("media receiver did not launch")
+        with self._lock:
+            if self.rolling:
+                items = self._next_entries(self.window)
+                mode = "REPEAT_OFF"
+            else:
+                self._order = list(range(len(self.entries)))
+                self._cursor = len(self._order)
+                items = [self._item(i) for i in self._order]
+                mode = REPEAT_MODES[self.repeat]
+            self._remaining = len(items)
+        self.started = time.monotonic()
+        self.mc.send_message({
+            "type": "QUEUE_LOAD",
+            "items": items,
+            "startIndex": 0,
+            "repeatMode": mode,
+            "currentTime": 0,
+        })
+        logging.info("Queued %d of %d items (repeat=%s, preload=%ss, %s)", len(items), len(self.entries),
+                     self.repeat, self.preload, "rolling" if self.rolling else "native")
+
+    def _top_up(self):
+        if not self.rolling or self._remaining > LOW_WATER or self._session is None:
+            return
+        items = self._next_entries(self.window - self._remaining)
+        if items:
+            self._remaining += len(items)
+            self.mc.send_message({"type": "QUEUE_INSERT", "mediaSessionId": self._session, "items": items})
+        if self._played:
+            self.mc.send_message({"type": "QUEUE_REMOVE", "mediaSessionId": self._session,
+                                  "itemIds": self._played})
+            self._played = []
+
+    # ── status handling ──
+    def _on_status(self, status):
+        now = time.monotonic()
+        with self._lock:
+            self._session = status.get("mediaSessionId", self._session)
+            state = status.get("playerState")
+            item = status.get("currentItemId", self._current)
+            if status.get("preloadedItemId") is not None:
+                self._preloaded = status["preloadedItemId"]
+
+            if state != "PLAYING" and self._left_playing is None and self._current is not None:
+                self._left_playing = now
+            if item != self._current:
+                if self._current is not None:
+                    self._pending = {"from": self._current, "to": item, "changed": now,
+                                     "preloaded": self._preloaded == item}
+                    if self.rolling:
+                        self._played.append(self._current)
+                        self._remaining -= 1
+                self._current = item
+            if state == "PLAYING":
+                if self._pending:
+                    start = self._left_playing or self._pending["changed"]
+                    self._pending["gap_ms"] = round(max(0.0, now - start) * 1000, 1)
+                    del self._pending["changed"]
+                    self.transitions.append(self._pending)
+                    logging.info("Item %s → %s: gap %.1f ms%s", self._pending["from"], self._pending["to"],
+                                 self._pending["gap_ms"], "" if self._pending["preloaded"] else " (not preloaded)")
+                    self._pending = None
+                self._left_playing = None
+            if state == "IDLE" and status.get("idleReason") in ("FINISHED", "ERROR", "CANCELLED") \
+                    and "currentItemId" not in status:
+                if status.get("idleReason") == "ERROR":
+                    self.errors.append(status.get("extendedStatus") or "playback error")
+                self.finished.set()
+            try:
+                self._top_up()
+            except Exception as e:
+                self.errors.append(str(e))
+                logging.error("Queue top-up failed: %s", e)
+
+    # ── reporting ──
+    def wait(self, duration=None):
+        """Block until the queue ends, `duration` seconds pass, or Ctrl-C."""
+        try:
+            self.finished.wait(duration)
+        except KeyboardInterrupt:
+            pass
+        return self.report()
+
+    def report(self):
+        with self._lock:
+            gaps = sorted(t["gap_ms"] for t in self.transitions)
+        return {
+            "items": len(self.entries),
+            "mode": "rolling" if self.rolling else "native",
+            "repeat": self.repeat,
+            "preload_s": self.preload,
+            "elapsed_s": round(time.monotonic() - self.started, 1) if self.started else 0,
+            "transitions": len(gaps),
+            "gap_ms": {
+                "mean": round(sum(gaps) / len(gaps), 1) if gaps else None,
+                "p95": gaps[min(len(gaps) - 1, int(len(gaps) * 0.95))] if gaps else None,
+                "max": gaps[-1] if gaps else None,
+            },
+            "not_preloaded": sum(1 for t in self.transitions if not t["preloaded"]),
+            "errors": self.errors,
+            "log": self.transitions,
+        }
+
+
+def play_playlist(cc, entries, repeat="off", preload=PRELOAD_TIME, window=QUEUE_WINDOW,
+                  watch=True, duration=None):
+    """Start a queue on a connected Chromecast; returns the gap report."""
+    player = PlaylistPlayer(cc, entries, repeat, preload, window)
+    player.start()
+    if not watch and not player.rolling:
+        return player.report()
+    return player.wait(duration)
+
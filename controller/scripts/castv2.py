@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+import ssl
+import sys
+import json
+import time
+import struct
+import asyncio
+import sqlite3
+import logging
+import argparse
+import itertools
+
+import inventory
+from net_timeouts import get_controller
+
+#─── Constants ────────────────────────────────────────────────────────────────
+CAST_PORT          = 8009
+DEFAULT_RECEIVER   = "CC1AD845"     # Default Media Receiver
+SENDER_ID          = "sender-0"
+RECEIVER_ID        = "receiver-0"
+REQUEST_TIMEOUT    = 10
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_TIMEOUT  = 15             # no traffic for this long = dead connection
+MAX_MESSAGE        = 64 * 1024
+
+NS_CONNECTION = "urn:x-cast:com.google.cast.tp.connection"
+NS_HEARTBEAT  = "urn:x-cast:com.google.cast.tp.heartbeat"
+NS_RECEIVER   = "urn:x-cast:com.google.cast.receiver"
+NS_MEDIA      = "urn:x-cast:com.google.cast.media"
+
+MEDIA_ERRORS = ("LOAD_FAILED", "LOAD_CANCELLED", "INVALID_REQUEST", "INVALID_PLAYER_STATE")
+
+
+class CastError(Exception):
+    pass
+
+#─── CastMessage (protobuf, hand-encoded) ─────────────────────────────────────
+# message CastMessage {
+#   required ProtocolVersion protocol_version = 1;  (CASTV2_1_0 = 0)
+#   required string source_id = 2;   required string destination_id = 3;
+#   required string namespace = 4;   required PayloadType payload_type = 5;
+#   optional string payload_utf8 = 6; optional bytes payload_binary = 7; }
+def _varint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _field(num, value):
+    if isinstance(value, int):
+        return _varint(num << 3) + _varint(value)
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    return _varint(num << 3 | 2) + _varint(len(data)) + data
+
+
+def encode_message(source, destination, namespace, payload):
+    """Serialize one CastMessage (JSON payloads go in payload_utf8)."""
+    if isinstance(payload, (bytes, bytearray)):
+        body = _field(5, 1) + _field(7, bytes(payload))
+    else:
+        body = _field(5, 0) + _field(6, payload if isinstance(payload, str) else json.dumps(payload))
+    return _field(1, 0) + _field(2, source) + _field(3, destination) + _field(4, namespace) + body
+
+
+def _read_varint(data, i):
+    value, shift = 0, 0
+    while True:
+        if i >= len(data):
+            raise CastError("truncated varint")
+        b = data[i]
+        i += 1
+        value |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            return value, i
+
+
+def decode_message(data):
+    """Parse a CastMessage into a dict (source, destination, namespace, payload)."""
+    fields, i = {}, 0
+    while i < len(data):
+        key, i = _read_varint(data, i)
+        num, wire = key >> 3, key & 7
+        if wire == 0:
+            value, i = _read_varint(data, i)
+        elif wire == 2:
+            length, i = _read_varint(data, i)
+            value = data[i:i + length]
+            i += length
+        else:
+            raise CastError(f"unsupported wire type {wire}")
+        fields[num] = value
+    text = lambda n: fields.get(n, b"").decode("utf-8", "replace")
+    return {
+        "source": text(2),
+        "destination": text(3),
+        "namespace": text(4),
+        "payload": text(6) if fields.get(5, 0) == 0 else fields.get(7, b""),
+    }
+
+#─── Connection ───────────────────────────────────────────────────────────────
+class CastConnection:
+    """
+    One TLS Cast v2 channel, driven entirely by the event loop: a reader
+    task routes replies to waiting requests by requestId and a heartbeat
+    task pings receiver-0. No threads, so connections are cheap to hold.
+    """
+
+    def __init__(self, host, port=CAST_PORT, name=None):
+        self.host = host
+        self.port = port
+        self.name = name or host
+        self.receiver_status = None
+        self.media_status = {}          # transportId → latest MEDIA_STATUS entry
+        self._reader = self._writer = None
+        self._tasks = []
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._connected_transports = set()
+        self._last_rx = 0.0
+        self.closed = asyncio.Event()
+
+    async def connect(self):
+        """Open the TLS socket, deadline per attempt from the host's Cast RTT."""
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE     # receivers present self-signed device certs
+        timeouts = get_controller()
+        last_error = None
+        for deadline in timeouts.deadlines(self.host, "cast"):
+            start = time.monotonic()
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=ctx), deadline)
+                break
+            except asyncio.TimeoutError:
+                last_error = f"timed out after {deadline:.1f}s"
+            except OSError as e:
+                raise CastError(f"{self.name}: {e}")
+        else:
+            raise CastError(f"{self.name}: connect {last_error}")
+        timeouts.record_elapsed(self.host, "cast", time.monotonic() - start)
+        self._last_rx = time.monotonic()
+        self._send(RECEIVER_ID, NS_CONNECTION, {"type": "CONNECT"})
+        self._tasks = [asyncio.ensure_future(self._read_loop()), asyncio.ensure_future(self._heartbeat())]
+        return self
+
+    def _send(self, destination, namespace, payload):
+        if self._writer is None or self.closed.is_set():
+            raise CastError(f"{self.name}: connection closed")
+        data = encode_message(SENDER_ID, destination, namespace, payload)
+        self._writer.write(struct.pack(">I", len(data)) + data)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                length = struct.unpack(">I", await self._reader.readexactly(4))[0]
+                if length > MAX_MESSAGE:
+                    raise CastError(f"oversized message ({length} bytes)")
+                msg = decode_message(await self._reader.readexactly(length))
+                self._last_rx = time.monotonic()
+                self._dispatch(msg)
+        except (asyncio.IncompleteReadError, OSError, CastError) as e:
+            logging.debug("Cast connection to %s ended: %s", self.name, e)
+        finally:
+            self._shutdown(CastError(f"{self.name}: connection closed"))
+
+    def _dispatch(self, msg):
+        if not isinstance(msg["payload"], str):
+            return
+        try:
+            payload = json.loads(msg["payload"])
+        except ValueError:
+            return
+        kind = payload.get("type")
+        if msg["namespace"] == NS_HEARTBEAT:
+            if kind == "PING":
+                self._send(msg["source"], NS_HEARTBEAT, {"type": "PONG"})
+            return
+        if msg["namespace"] == NS_CONNECTION and kind == "CLOSE":
+            self._connected_transports.discard(msg["source"])
+            return
+        if kind == "RECEIVER_STATUS":
+            self.receiver_status = payload.get("status", {})
+        elif kind == "MEDIA_STATUS":
+            for entry in payload.get("status", []):
+                self.media_status[msg["source"]] = entry
+        fut = self._pending.pop(payload.get("requestId"), None)
+        if fut and not fut.done():
+            fut.set_result(payload)
+
+    async def _heartbeat(self):
+        while not self.closed.is_set():
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if time.monotonic() - self._last_rx > HEARTBEAT_TIMEOUT:
+                logging.warning("Cast heartbeat to %s lost", self.name)
+                self._shutdown(CastError(f"{self.name}: heartbeat lost"))
+                return
+            try:
+                self._send(RECEIVER_ID, NS_HEARTBEAT, {"type": "PING"})
+            except CastError:
+                return
+
+    def _shutdown(self, error):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(error)
+        self._pending.clear()
+        if self._writer is not None:
+            self._writer.close()
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+
+    async def request(self, destination, namespace, payload, timeout=REQUEST_TIMEOUT):
+        """Send a JSON request and await the reply carrying its requestId."""
+        request_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = fut
+        self._send(destination, namespace, dict(payload, requestId=request_id))
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            raise CastError(f"{self.name}: {payload.get('type')} timed out")
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        if not self.closed.is_set():
+            try:
+                self._send(RECEIVER_ID, NS_CONNECTION, {"type": "CLOSE"})
+                await self._writer.drain()
+            except (CastError, OSError):
+                pass
+        self._shutdown(CastError(f"{self.name}: closed"))
+
+    #── Receiver namespace ──
+    async def get_status(self):
+        reply = await self.request(RECEIVER_ID, NS_RECEIVER, {"type": "GET_STATUS"})
+        return reply.get("status", {})
+
+    async def set_volume(self, level):
+        level = max(0.0, min(1.0, level))
+        return await self.request(RECEIVER_ID, NS_RECEIVER, {"type": "SET_VOLUME", "volume": {"level": level}})
+
+    async def set_muted(self, muted):
+        return await self.request(RECEIVER_ID, NS_RECEIVER, {"type": "SET_VOLUME", "volume": {"muted": bool(muted)}})
+
+    async def launch(self, app_id=DEFAULT_RECEIVER, timeout=20):
+        """Launch app_id unless it is already running; returns its application entry."""
+        status = self.receiver_status or await self.get_status()
+        deadline = time.monotonic() + timeout
+        launched = False
+        while True:
+            for app in status.get("applications", []):
+                if app.get("appId") == app_id and app.get("transportId"):
+                    return app
+            if time.monotonic() > deadline:
+                raise CastError(f"{self.name}: {app_id} did not start")
+            if not launched:
+                reply = await self.request(RECEIVER_ID, NS_RECEIVER, {"type": "LAUNCH", "appId": app_id}, timeout)
+                if reply.get("type") == "LAUNCH_ERROR":
+                    raise CastError(f"{self.name}: launch of {app_id} failed: {reply.get('reason')}")
+                launched = True
+                status = reply.get("status", {})
+            else:
+                # The app can take a moment to appear in RECEIVER_STATUS.
+                await asyncio.sleep(0.3)
+                status = await self.get_status()
+
+    #── Media namespace ──
+    def _media_app(self):
+        for app in (self.receiver_status or {}).get("applications", []):
+            if NS_MEDIA in [ns.get("name") for ns in app.get("namespaces", [])]:
+                return app
+        return None
+
+    async def _media_transport(self, app=None):
+        if app is None:
+            await self.get_status()
+            app = self._media_app()
+            if app is None:
+                raise CastError(f"{self.name}: no media session")
+        transport = app["transportId"]
+        if transport not in self._connected_transports:
+            self._send(transport, NS_CONNECTION, {"type": "CONNECT"})
+            self._connected_transports.add(transport)
+        return transport
+
+    async def media_request(self, payload, transport=None):
+        transport = transport or await self._media_transport()
+        reply = await self.request(transport, NS_MEDIA, payload)
+        if reply.get("type") in MEDIA_ERRORS:
+            raise CastError(f"{self.name}: {reply.get('type')} {reply.get('reason', '')}".strip())
+        return reply
+
+    async def media_session(self):
+        """(transportId, mediaSessionId) of the current media session."""
+        transport = await self._media_transport()
+        status = (await self.media_request({"type": "GET_STATUS"}, transport)).get("status", [])
+        if not status:
+            raise CastError(f"{self.name}: nothing is loaded")
+        return transport, status[0]["mediaSessionId"]
+
+    async def load(self, url, content_type="video/mp4", autoplay=True, current_time=0, app_id=DEFAULT_RECEIVER):
+        app = await self.launch(app_id)
+        transport = await self._media_transport(app)
+        reply = await self.media_request({
+            "type": "LOAD",
+            "sessionId": app.get("sessionId"),
+            "media": {"contentId": url, "contentType": content_type, "streamType": "BUFFERED"},
+            "autoplay": autoplay,
+            "currentTime": current_time,
+        }, transport)
+        return (reply.get("status") or [{}])[0]
+
+    async def _control(self, kind, **extra):
+        transport, session = await self.media_session()
+        return await self.media_request(dict(extra, type=kind, mediaSessionId=session), transport)
+
+    async def play(self):
+        return await self._control("PLAY")
+
+    async def pause(self):
+        return await self._control("PAUSE")
+
+    async def stop(self):
+        return await self._control("STOP")
+
+    async def seek(self, seconds):
+        return await self._control("SEEK", currentTime=seconds)
+
+#─── Pool ─────────────────────────────────────────────────────────────────────
+class CastPool:
+    """Shared connections keyed by host:port, all on one event loop."""
+
+    def __init__(self):
+        self._conns = {}
+        self._locks = {}
+
+    async def get(self, host, port=CAST_PORT, name=None):
+        key = (host, port)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            conn = self._conns.get(key)
+            if conn is None or conn.closed.is_set():
+                conn = self._conns[key] = await CastConnection(host, port, name).connect()
+            return conn
+
+    async def close(self):
+        await asyncio.gather(*(c.close() for c in self._conns.values()), return_exceptions=True)
+        self._conns.clear()
+
+#─── Name Resolution ──────────────────────────────────────────────────────────
+def resolve(name, cache_path=None):
+    """
+    (host, port) for a receiver's friendly name, from castService's cache
+    or the inventory; an IP or host:port is passed through. None if unknown.
+    """
+    host, _, port = name.partition(":")
+    if host.replace(".", "").isdigit():
+        return host, int(port or CAST_PORT)
+    try:
+        with open(cache_path or inventory.CAST_CACHE) as f:
+            cache = json.load(f)
+        now_ms = time.time() * 1000
+        for info in cache.values():
+            fresh = not info.get("lastSeen") or not info.get("ttl") or now_ms - info["lastSeen"] <= info["ttl"]
+            if info.get("name") == name and info.get("host") and fresh:
+                return info["host"], int(info.get("port") or CAST_PORT)
+    except (OSError, ValueError):
+        pass
+    try:
+        rows = [d for d in inventory.list_devices() if d.get("name") == name and d.get("ip")]
+    except (sqlite3.Error, OSError) as e:
+        logging.debug("Inventory lookup for %r failed: %s", name, e)
+        rows = []
+    rows.sort(key=lambda d: (d.get("kind") != "chromecast", -(d.get("last_seen") or 0)))
+    return (rows[0]["ip"], CAST_PORT) if rows else None
+
+
+async def run_on(targets, command, *args):
+    """
+    Run CastConnection.<command>(*args) on every (host, port, name) target
+    concurrently over one pool; returns {name: result or {"error": ...}}.
+    """
+    pool = CastPool()
+
+    async def one(host, port, name):
+        try:
+            conn = await pool.get(host, port, name)
+            return name, await getattr(conn, command)(*args)
+        except (CastError, OSError) as e:
+            return name, {"error": str(e)}
+    try:
+        return dict(await asyncio.gather(*(one(*t) for t in targets)))
+    finally:
+        await pool.close()
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    parser = argparse.ArgumentParser(description="asyncio Cast v2 client")
+    parser.add_argument("targets", nargs="+", help="Friendly names, IPs or host:port")
+    parser.add_argument("--cmd", default="get_status",
+                        choices=["get_status", "play", "pause", "stop", "media_session"])
+    args = parser.parse_args()
+
+    resolved, missing = [], []
+    for t in args.targets:
+        hp = resolve(t)
+        if hp:
+            resolved.append((hp[0], hp[1], t))
+        else:
+            missing.append(t)
+    result = asyncio.run(run_on(resolved, args.cmd))
+    result.update({t: {"error": "unknown receiver"} for t in missing})
+    print(json.dumps(result, indent=2, default=str))
+    sys.exit(1 if any(isinstance(r, dict) and "error" in r for r in result.values()) else 0)
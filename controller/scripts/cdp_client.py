@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import base64
+import socket
+import struct
+import hashlib
+import logging
+import argparse
+import threading
+import urllib.request
+from urllib.parse import urlparse
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+#─── Constants ────────────────────────────────────────────────────────────────
+DEFAULT_HOST    = "127.0.0.1"
+DEFAULT_PORT    = 9222      # kiosk1; kiosk2 listens on 9223
+COMMAND_TIMEOUT = 10
+WS_GUID         = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+class CdpError(Exception):
+    pass
+
+#─── Minimal WebSocket (RFC 6455 client) ──────────────────────────────────────
+class WebSocket:
+    """Blocking client-side WebSocket: enough for the DevTools protocol."""
+
+    def __init__(self, url, timeout=COMMAND_TIMEOUT):
+        u = urlparse(url)
+        if u.scheme != "ws":
+            raise CdpError(f"only ws:// URLs are supported, got {url}")
+        self.sock = socket.create_connection((u.hostname, u.port or 80), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._send_lock = threading.Lock()
+        self._buf = b""
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        self.sock.sendall((f"GET {path} HTTP/1.1\r\n"
+                           f"Host: {u.hostname}:{u.port or 80}\r\n"
+                           "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                           f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+        while b"\r\n\r\n" not in self._buf:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise CdpError("connection closed during WebSocket handshake")
+            self._buf += chunk
+        head, self._buf = self._buf.split(b"\r\n\r\n", 1)
+        lines = head.decode("latin-1").split("\r\n")
+        if " 101 " not in lines[0] + " ":
+            raise CdpError(f"WebSocket handshake refused: {lines[0]}")
+        headers = {k.strip().lower(): v.strip() for k, v in (l.split(":", 1) for l in lines[1:] if ":" in l)}
+        expected = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        if headers.get("sec-websocket-accept") != expected:
+            raise CdpError("bad Sec-WebSocket-Accept in handshake")
+        self.sock.settimeout(None)
+
+    def _read(self, n):
+        while len(self._buf) < n:
+            chunk = self.sock.recv(max(65536, n - len(self._buf)))
+            if not chunk:
+                raise ConnectionError("WebSocket closed")
+            self._buf += chunk
+        data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        n = len(payload)
+        if n < 126:
+            header += bytes([0x80 | n])
+        elif n < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack(">H", n)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack(">Q", n)
+        mask = os.urandom(4)
+        # XOR-mask the whole payload at once via big integers.
+        reps = mask * (n // 4 + 1)
+        masked = (int.from_bytes(payload, "big") ^ int.from_bytes(reps[:n], "big")).to_bytes(n, "big") if n else b""
+        with self._send_lock:
+            self.sock.sendall(header + mask + masked)
+
+    def send_text(self, text):
+        self._send_frame(OP_TEXT, text.encode("utf-8"))
+
+    def recv(self):
+        """Return the next complete text/binary message; answers pings itself."""
+        parts, msg_op = [], None
+        while True:
+            b0, b1 = self._read(2)
+            opcode, fin = b0 & 0x0F, b0 & 0x80
+            n = b1 & 0x7F
+            if n == 126:
+                n = struct.unpack(">H", self._read(2))[0]
+            elif n == 127:
+                n = struct.unpack(">Q", self._read(8))[0]
+            mask = self._read(4) if b1 & 0x80 else None
+            payload = self._read(n)
+            if mask:
+                payload = bytes(c ^ mask[i % 4] for i, c in enumerate(payload))
+            if opcode == OP_PING:
+                self._send_frame(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                raise ConnectionError("WebSocket closed by peer")
+            if opcode != OP_CONT:
+                msg_op = opcode
+            parts.append(payload)
+            if fin:
+                data = b"".join(parts)
+                return data.decode("utf-8") if msg_op == OP_TEXT else data
+
+    def close(self):
+        try:
+            self._send_frame(OP_CLOSE, struct.pack(">H", 1000))
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+#─── DevTools Protocol Client ─────────────────────────────────────────────────
+class CDPClient:
+    """
+    Chrome DevTools Protocol session over one WebSocket. Commands are
+    matched to replies by id on a reader thread, so several threads can
+    issue commands concurrently; events go to callbacks registered with on().
+    """
+
+    def __init__(self, ws_url, timeout=COMMAND_TIMEOUT):
+        self.ws_url = ws_url
+        self.timeout = timeout
+        self.ws = WebSocket(ws_url, timeout)
+        self._next_id = 0
+        self._pending = {}
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self.closed = threading.Event()
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        try:
+            while True:
+                msg = json.loads(self.ws.recv())
+                if "id" in msg:
+                    with self._lock:
+                        fut = self._pending.pop(msg["id"], None)
+                    if fut is None:
+                        continue
+                    if "error" in msg:
+                        fut.set_exception(CdpError(msg["error"].get("message", str(msg["error"]))))
+                    else:
+                        fut.set_result(msg.get("result", {}))
+                else:
+                    for cb in list(self._handlers.get(msg.get("method"), ())):
+                        try:
+                            cb(msg.get("params", {}))
+                        except Exception as e:
+                            logging.error("CDP handler for %s failed: %s", msg.get("method"), e)
+        except (OSError, ConnectionError, ValueError) as e:
+            logging.debug("CDP connection %s ended: %s", self.ws_url, e)
+        finally:
+            self.closed.set()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for fut in pending.values():
+                fut.set_exception(CdpError("DevTools connection closed"))
+
+    def send_async(self, method, params=None):
+        """Send a command; returns a Future resolving to its result dict."""
+        fut = Future()
+        with self._lock:
+            if self.closed.is_set():
+                raise CdpError("DevTools connection closed")
+            self._next_id += 1
+            msg_id = self._next_id
+            self._pending[msg_id] = fut
+        self.ws.send_text(json.dumps({"id": msg_id, "method": method, "params": params or {}}))
+        return fut
+
+    def send(self, method, params=None, timeout=None):
+        fut = self.send_async(method, params)
+        try:
+            return fut.result(timeout or self.timeout)
+        except FutureTimeout:
+            raise CdpError(f"{method} timed out")
+
+    def on(self, event, callback):
+        self._handlers.setdefault(event, []).append(callback)
+
+    def evaluate(self, expression, await_promise=False, timeout=None):
+        """Runtime.evaluate returning the value; page exceptions raise CdpError."""
+        result = self.send("Runtime.evaluate", {
+            "expression": expression,
+            "returnByValue": True,
+            "awaitPromise": await_promise,
+        }, timeout)
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            text = details.get("exception", {}).get("description") or details.get("text")
+            raise CdpError(f"page exception: {text}")
+        return result.get("result", {}).get("value")
+
+    def close(self):
+        self.ws.close()
+        self.closed.wait(1)
+
+
+def list_targets(port=DEFAULT_PORT, host=DEFAULT_HOST, timeout=5):
+    """Return the DevTools target list (/json/list) of a Chromium instance."""
+    with urllib.request.urlopen(f"http://{host}:{port}/json/list", timeout=timeout) as resp:
+        return json.load(resp)
+
+
+def connect_page(port=DEFAULT_PORT, host=DEFAULT_HOST, url_contains=None, timeout=COMMAND_TIMEOUT):
+    """Attach to the first page target (optionally one whose URL contains url_contains)."""
+    try:
+        targets = list_targets(port, host)
+    except OSError as e:
+        raise CdpError(f"no DevTools endpoint on {host}:{port}: {e}")
+    for t in targets:
+        if t.get("type") == "page" and (not url_contains or url_contains in t.get("url", "")):
+            return CDPClient(t["webSocketDebuggerUrl"], timeout)
+    raise CdpError(f"no matching page target on {host}:{port}")
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Minimal Chrome DevTools Protocol client for the kiosks")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("targets", help="List DevTools targets")
+    eval_p = sub.add_parser("eval", help="Evaluate a JS expression in the kiosk page")
+    eval_p.add_argument("expression")
+    eval_p.add_argument("--await", dest="await_promise", action="store_true")
+    call_p = sub.add_parser("call", help="Send a raw CDP command")
+    call_p.add_argument("method")
+    call_p.add_argument("params", nargs="?", default="{}", help="JSON params")
+    args = parser.parse_args()
+
+    try:
+        if args.cmd == "targets":
+            result = list_targets(args.port, args.host)
+        else:
+            client = connect_page(args.port, args.host)
+            try:
+                if args.cmd == "eval":
+                    result = client.evaluate(args.expression, args.await_promise)
+                else:
+                    result = client.send(args.method, json.loads(args.params))
+            finally:
+                client.close()
+    except (CdpError, OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import queue
+import fcntl
+import struct
+import select
+import logging
+import argparse
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+#─── Linux CEC uAPI (include/uapi/linux/cec.h) ────────────────────────────────
+def _ioc(direction, nr, size):
+    return (direction << 30) | (size << 16) | (ord('a') << 8) | nr
+
+_IOW, _IOR, _IOWR = 1, 2, 3
+
+# struct cec_msg: tx_ts, rx_ts, len, timeout, sequence, flags, msg[16],
+# reply, rx_status, tx_status, tx_arb_lost_cnt, tx_nack_cnt,
+# tx_low_drive_cnt, tx_error_cnt (+1 byte tail padding to 8-byte alignment)
+CEC_MSG_STRUCT = struct.Struct("=QQIIII16s7Bx")
+# struct cec_event: ts, event, flags, union { ...; __u32 raw[16]; }
+CEC_EVENT_STRUCT = struct.Struct("=QII64s")
+# struct cec_log_addrs (one logical address claimed, tail-padded to 4 bytes)
+CEC_LOG_ADDRS_STRUCT = struct.Struct("=4sHBBII15s4s4s4s48sx")
+
+CEC_ADAP_G_PHYS_ADDR = _ioc(_IOR, 1, 2)
+CEC_ADAP_G_LOG_ADDRS = _ioc(_IOR, 3, CEC_LOG_ADDRS_STRUCT.size)
+CEC_ADAP_S_LOG_ADDRS = _ioc(_IOWR, 4, CEC_LOG_ADDRS_STRUCT.size)
+CEC_TRANSMIT         = _ioc(_IOWR, 5, CEC_MSG_STRUCT.size)
+CEC_RECEIVE          = _ioc(_IOWR, 6, CEC_MSG_STRUCT.size)
+CEC_DQEVENT          = _ioc(_IOWR, 7, CEC_EVENT_STRUCT.size)
+CEC_S_MODE           = _ioc(_IOW, 9, 4)
+
+CEC_MODE_INITIATOR = 0x01
+CEC_MODE_FOLLOWER  = 0x10
+
+CEC_TX_STATUS_OK          = 0x01
+CEC_TX_STATUS_ARB_LOST    = 0x02
+CEC_TX_STATUS_NACK        = 0x04
+CEC_TX_STATUS_LOW_DRIVE   = 0x08
+CEC_TX_STATUS_ERROR       = 0x10
+CEC_TX_STATUS_MAX_RETRIES = 0x20
+CEC_TX_STATUS_ABORTED     = 0x40
+CEC_TX_STATUS_TIMEOUT     = 0x80
+
+CEC_EVENT_STATE_CHANGE = 1
+CEC_EVENT_LOST_MSGS    = 2
+
+CEC_VENDOR_ID_NONE          = 0xFFFFFFFF
+CEC_OP_CEC_VERSION_1_4      = 5
+CEC_OP_PRIM_DEVTYPE_PLAYBACK = 4
+CEC_LOG_ADDR_TYPE_PLAYBACK  = 3
+CEC_OP_ALL_DEVTYPE_PLAYBACK = 0x10
+CEC_LOG_ADDR_INVALID        = 0xFF
+
+#─── CEC Protocol Constants ───────────────────────────────────────────────────
+LA_TV        = 0x0
+LA_AUDIO     = 0x5
+LA_BROADCAST = 0xF
+
+OP_IMAGE_VIEW_ON           = 0x04
+OP_STANDBY                 = 0x36
+OP_USER_CONTROL_PRESSED    = 0x44
+OP_USER_CONTROL_RELEASED   = 0x45
+OP_ACTIVE_SOURCE           = 0x82
+OP_GIVE_PHYSICAL_ADDR      = 0x83
+OP_REPORT_PHYSICAL_ADDR    = 0x84
+OP_SET_STREAM_PATH         = 0x86
+OP_GIVE_DEVICE_POWER_STATUS = 0x8F
+OP_REPORT_POWER_STATUS     = 0x90
+OP_FEATURE_ABORT           = 0x00
+
+UI_VOLUME_UP   = 0x41
+UI_VOLUME_DOWN = 0x42
+UI_MUTE        = 0x43
+UI_POWER_ON    = 0x6D
+
+POWER_ON, POWER_STANDBY = 0, 1
+
+DEFAULT_DEVICE    = "/dev/cec0"
+DEFAULT_OSD_NAME  = "Suitestream"
+TRANSMIT_TIMEOUT  = 1.0    # seconds the scheduler waits per attempt
+TRANSMIT_RETRIES  = 2      # extra attempts on NACK / arbitration loss / low drive
+RETRY_DELAY       = 0.02
+RETRYABLE = CEC_TX_STATUS_ARB_LOST | CEC_TX_STATUS_NACK | CEC_TX_STATUS_LOW_DRIVE | \
+            CEC_TX_STATUS_ERROR | CEC_TX_STATUS_TIMEOUT
+
+
+def make_frame(src, dst, opcode=None, params=b""):
+    """Build raw CEC frame bytes: header, optional opcode, params."""
+    frame = bytes([(src << 4) | (dst & 0xF)])
+    if opcode is not None:
+        frame += bytes([opcode]) + bytes(params)
+    return frame
+
+
+def split_frame(frame):
+    """Return (src, dst, opcode or None, params bytes) for raw frame bytes."""
+    return frame[0] >> 4, frame[0] & 0xF, (frame[1] if len(frame) > 1 else None), bytes(frame[2:])
+
+
+def phys_to_bytes(phys):
+    """'0x1000' / '1.0.0.0' / 0x1000 → b'\\x10\\x00'."""
+    if isinstance(phys, str):
+        phys = int(phys.replace(".", ""), 16) if "." in phys else int(phys, 16)
+    return bytes([(phys >> 8) & 0xFF, phys & 0xFF])
+
+
+class CecError(Exception):
+    pass
+
+#─── Transports ───────────────────────────────────────────────────────────────
+class CecTransport(ABC):
+    """
+    Minimal transport interface used by CecScheduler.
+    transmit() blocks until the frame is acked/failed and returns a tx_status
+    bitmask; receive() returns raw frame bytes or None on timeout.
+    """
+    logical_address = LA_BROADCAST
+    physical_address = 0xFFFF
+
+    @abstractmethod
+    def transmit(self, frame, timeout):
+        """Send frame; return the tx_status bitmask."""
+
+    @abstractmethod
+    def receive(self, timeout):
+        """Return the next raw frame, or None after timeout seconds."""
+
+    def dequeue_event(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class LinuxCecTransport(CecTransport):
+    """Drives a kernel CEC adapter through one persistent file descriptor."""
+
+    def __init__(self, device=DEFAULT_DEVICE, osd_name=DEFAULT_OSD_NAME):
+        self.device = device
+        self.fd = os.open(device, os.O_RDWR)
+        fcntl.ioctl(self.fd, CEC_S_MODE, struct.pack("=I", CEC_MODE_INITIATOR | CEC_MODE_FOLLOWER))
+        self.physical_address = struct.unpack("=H", fcntl.ioctl(self.fd, CEC_ADAP_G_PHYS_ADDR, b"\0\0"))[0]
+        self.logical_address = self._claim(osd_name)
+        logging.info("CEC adapter %s ready: logical %X, physical %04X",
+                     device, self.logical_address, self.physical_address)
+
+    def _claim(self, osd_name):
+        buf = bytearray(CEC_LOG_ADDRS_STRUCT.size)
+        fcntl.ioctl(self.fd, CEC_ADAP_G_LOG_ADDRS, buf)
+        fields = CEC_LOG_ADDRS_STRUCT.unpack(bytes(buf))
+        if fields[3] > 0 and fields[0][0] != CEC_LOG_ADDR_INVALID:
+            return fields[0][0]     # already configured (e.g. by cec-ctl)
+        req = bytearray(CEC_LOG_ADDRS_STRUCT.pack(
+            b"\xff" * 4, 0, CEC_OP_CEC_VERSION_1_4, 1, CEC_VENDOR_ID_NONE, 0,
+            osd_name.encode("ascii", "replace")[:14],
+            bytes([CEC_OP_PRIM_DEVTYPE_PLAYBACK, 0, 0, 0]),
+            bytes([CEC_LOG_ADDR_TYPE_PLAYBACK, 0, 0, 0]),
+            bytes([CEC_OP_ALL_DEVTYPE_PLAYBACK, 0, 0, 0]),
+            b"\0" * 48,
+        ))
+        fcntl.ioctl(self.fd, CEC_ADAP_S_LOG_ADDRS, req)
+        return CEC_LOG_ADDRS_STRUCT.unpack(bytes(req))[0][0]
+
+    def transmit(self, frame, timeout):
+        msg = bytearray(CEC_MSG_STRUCT.pack(0, 0, len(frame), int(timeout * 1000), 0, 0,
+                                            bytes(frame).ljust(16, b"\0"), 0, 0, 0, 0, 0, 0, 0))
+        try:
+            fcntl.ioctl(self.fd, CEC_TRANSMIT, msg)
+        except OSError as e:
+            logging.debug("CEC_TRANSMIT failed: %s", e)
+            return CEC_TX_STATUS_ERROR
+        return CEC_MSG_STRUCT.unpack(bytes(msg))[9]     # tx_status ([8] is rx_status)
+
+    def receive(self, timeout):
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return None
+        msg = bytearray(CEC_MSG_STRUCT.size)
+        try:
+            fcntl.ioctl(self.fd, CEC_RECEIVE, msg)
+        except OSError:
+            return None
+        fields = CEC_MSG_STRUCT.unpack(bytes(msg))
+        return fields[6][:fields[2]]
+
+    def dequeue_event(self):
+        # Events are signalled with POLLPRI; don't block in CEC_DQEVENT.
+        poller = select.poll()
+        poller.register(self.fd, select.POLLPRI)
+        if not poller.poll(0):
+            return None
+        ev = bytearray(CEC_EVENT_STRUCT.size)
+        try:
+            fcntl.ioctl(self.fd, CEC_DQEVENT, ev)
+        except OSError:
+            return None
+        ts, event, flags, raw = CEC_EVENT_STRUCT.unpack(bytes(ev))
+        if event == CEC_EVENT_STATE_CHANGE:
+            phys, mask = struct.unpack_from("=HH", raw)
+            self.physical_address = phys
+            return {"event": "state_change", "physical_address": phys, "log_addr_mask": mask, "ts": ts}
+        if event == CEC_EVENT_LOST_MSGS:
+            return {"event": "lost_msgs", "count": struct.unpack_from("=I", raw)[0], "ts": ts}
+        return {"event": event, "ts": ts}
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SimulatedBus:
+    """
+    In-memory CEC bus. Transports attached to it exchange frames directly;
+    directed frames to an absent logical address are NACKed like on a real bus.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.log = []               # (src, dst, opcode, params, status)
+        self._faults = []
+        self._lock = threading.Lock()
+
+    def attach(self, logical_address, physical_address, device=None):
+        node = SimulatedTransport(self, logical_address, physical_address, device)
+        self.nodes[logical_address] = node
+        return node
+
+    def fail_next(self, count=1, status=CEC_TX_STATUS_NACK):
+        """Make the next `count` transmissions fail with `status`."""
+        with self._lock:
+            self._faults.extend([status] * count)
+
+    def deliver(self, frame):
+        src, dst, opcode, params = split_frame(frame)
+        with self._lock:
+            status = self._faults.pop(0) if self._faults else None
+        if status is None:
+            if dst == LA_BROADCAST:
+                targets = [n for la, n in self.nodes.items() if la != src]
+                status = CEC_TX_STATUS_OK
+            elif dst in self.nodes:
+                targets = [self.nodes[dst]]
+                status = CEC_TX_STATUS_OK
+            else:
+                targets = []
+                status = CEC_TX_STATUS_NACK
+            for node in targets:
+                node.inbox.put(bytes(frame))
+        self.log.append((src, dst, opcode, params, status))
+        return status
+
+
+class SimulatedTransport(CecTransport):
+    def __init__(self, bus, logical_address, physical_address, device=None):
+        self.bus = bus
+        self.logical_address = logical_address
+        self.physical_address = physical_address
+        self.device = device
+        self.inbox = queue.Queue()
+
+    def transmit(self, frame, timeout):
+        return self.bus.deliver(frame)
+
+    def receive(self, timeout):
+        try:
+            frame = self.inbox.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if self.device is not None:
+            reply = self.device.handle(self, frame)
+            if reply is not None:
+                self.bus.deliver(reply)
+        return frame
+
+
+class SimulatedDevice:
+    """
+    Behaviour for a simulated sink/source: tracks power state, volume and
+    active source, and answers power-status and physical-address queries.
+    Run it with `run_simulated_device(transport)` or poll receive() yourself.
+    """
+
+    def __init__(self, device_type=0, power=POWER_STANDBY):
+        self.device_type = device_type
+        self.power = power
+        self.volume = 50
+        self.muted = False
+        self.active_source = None
+
+    def handle(self, transport, frame):
+        src, dst, opcode, params = split_frame(frame)
+        me = transport.logical_address
+        if opcode == OP_IMAGE_VIEW_ON and dst == me:
+            self.power = POWER_ON
+        elif opcode == OP_STANDBY:
+            self.power = POWER_STANDBY
+        elif opcode == OP_ACTIVE_SOURCE or opcode == OP_SET_STREAM_PATH:
+            self.active_source = (params[0] << 8) | params[1]
+            if opcode == OP_ACTIVE_SOURCE:
+                self.power = POWER_ON
+        elif opcode == OP_USER_CONTROL_PRESSED and dst == me and params:
+            key = params[0]
+            if key == UI_VOLUME_UP:
+                self.volume = min(100, self.volume + 1)
+            elif key == UI_VOLUME_DOWN:
+                self.volume = max(0, self.volume - 1)
+            elif key == UI_MUTE:
+                self.muted = not self.muted
+            elif key == UI_POWER_ON:
+                self.power = POWER_ON
+        elif opcode == OP_GIVE_DEVICE_POWER_STATUS and dst == me:
+            return make_frame(me, src, OP_REPORT_POWER_STATUS, [self.power])
+        elif opcode == OP_GIVE_PHYSICAL_ADDR and dst == me:
+            return make_frame(me, LA_BROADCAST, OP_REPORT_PHYSICAL_ADDR,
+                              phys_to_bytes(transport.physical_address) + bytes([self.device_type]))
+        return None
+
+
+def run_simulated_device(transport, stop_event):
+    """Background loop that lets a SimulatedDevice react to bus traffic."""
+    def loop():
+        while not stop_event.is_set():
+            transport.receive(0.05)
+    t = threading.Thread(target=loop, daemon=True)
+    t.start()
+    return t
+
+#─── Transmit Scheduler ───────────────────────────────────────────────────────
+class CecScheduler:
+    """
+    Serialises all transmissions on one transport through a priority queue and
+    retries transient failures (NACK, arbitration loss, low drive). A receive
+    thread dispatches incoming frames to listeners and pending waiters.
+    """
+
+    def __init__(self, transport, retries=TRANSMIT_RETRIES, retry_delay=RETRY_DELAY):
+        self.transport = transport
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.listeners = []
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._waiters = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._tx_thread = threading.Thread(target=self._tx_loop, name="cec-tx", daemon=True)
+        self._rx_thread = threading.Thread(target=self._rx_loop, name="cec-rx", daemon=True)
+        self._tx_thread.start()
+        self._rx_thread.start()
+
+    def submit(self, frame, priority=10):
+        """Queue a raw frame; returns a Future resolving to a result dict."""
+        fut = Future()
+        self._queue.put((priority, next(self._seq), bytes(frame), fut))
+        return fut
+
+    def send(self, dst, opcode, params=b"", priority=10):
+        return self.submit(make_frame(self.transport.logical_address, dst, opcode, params), priority)
+
+    def expect(self, src, opcode, timeout=TRANSMIT_TIMEOUT):
+        """Register interest in a reply; call .result() on the returned Future."""
+        fut = Future()
+        with self._lock:
+            self._waiters.append((src, opcode, fut, time.monotonic() + timeout))
+        return fut
+
+    def close(self):
+        self._stop.set()
+        self._queue.put((-1, -1, b"", None))
+        self._tx_thread.join(timeout=2)
+        self._rx_thread.join(timeout=2)
+        self.transport.close()
+
+    def _tx_loop(self):
+        while not self._stop.is_set():
+            _, _, frame, fut = self._queue.get()
+            if fut is None:
+                break
+            if not fut.set_running_or_notify_cancel():
+                continue
+            start = time.monotonic()
+            status = 0
+            for attempt in range(self.retries + 1):
+                status = self.transport.transmit(frame, TRANSMIT_TIMEOUT)
+                if status & CEC_TX_STATUS_OK or not status & RETRYABLE:
+                    break
+                time.sleep(self.retry_delay * (attempt + 1))
+            result = {"status": status, "ok": bool(status & CEC_TX_STATUS_OK),
+                      "attempts": attempt + 1, "latency_ms": (time.monotonic() - start) * 1000}
+            fut.set_result(result)
+
+    def _rx_loop(self):
+        while not self._stop.is_set():
+            event = self.transport.dequeue_event()
+            if event is not None:
+                logging.info("CEC adapter event: %s", event)
+            frame = self.transport.receive(0.1)
+            now = time.monotonic()
+            with self._lock:
+                for w in [w for w in self._waiters if w[3] < now]:
+                    self._waiters.remove(w)
+                    w[2].set_exception(TimeoutError("no CEC reply"))
+            if frame is None or len(frame) < 2:
+                continue
+            src, _, opcode, _ = split_frame(frame)
+            with self._lock:
+                for w in [w for w in self._waiters if w[0] == src and w[1] == opcode]:
+                    self._waiters.remove(w)
+                    w[2].set_result(frame)
+            for listener in self.listeners:
+                try:
+                    listener(frame)
+                except Exception as e:
+                    logging.error("CEC listener failed: %s", e)
+
+#─── High-Level Operations ────────────────────────────────────────────────────
+class CecController:
+    """Power, input and volume operations on top of a CecScheduler."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    @property
+    def me(self):
+        return self.scheduler.transport.logical_address
+
+    def _wait(self, fut):
+        result = fut.result(timeout=TRANSMIT_TIMEOUT * (self.scheduler.retries + 2))
+        if not result["ok"]:
+            raise CecError(f"transmit failed (tx_status=0x{result['status']:02X})")
+        return result
+
+    def power_on(self, dst=LA_TV):
+        if dst == LA_TV:
+            return self._wait(self.scheduler.send(dst, OP_IMAGE_VIEW_ON, priority=0))
+        return self._press(dst, UI_POWER_ON, priority=0)
+
+    def standby(self, dst=LA_BROADCAST):
+        return self._wait(self.scheduler.send(dst, OP_STANDBY, priority=0))
+
+    def active_source(self):
+        """Announce this adapter as the active source (switches the TV to us)."""
+        phys = phys_to_bytes(self.scheduler.transport.physical_address)
+        return self._wait(self.scheduler.send(LA_BROADCAST, OP_ACTIVE_SOURCE, phys, priority=1))
+
+    def set_input(self, physical_address):
+        """Route the TV to another source, e.g. '0x2000' for HDMI2."""
+        return self._wait(self.scheduler.send(LA_BROADCAST, OP_SET_STREAM_PATH,
+                                              phys_to_bytes(physical_address), priority=1))
+
+    def volume_up(self, dst=LA_AUDIO):
+        return self._press(dst, UI_VOLUME_UP)
+
+    def volume_down(self, dst=LA_AUDIO):
+        return self._press(dst, UI_VOLUME_DOWN)
+
+    def mute(self, dst=LA_AUDIO):
+        return self._press(dst, UI_MUTE)
+
+    def power_status(self, dst=LA_TV):
+        """Query and return the power status byte of dst."""
+        reply = self.scheduler.expect(dst, OP_REPORT_POWER_STATUS)
+        self._wait(self.scheduler.send(dst, OP_GIVE_DEVICE_POWER_STATUS, priority=5))
+        return reply.result()[2]
+
+    def _press(self, dst, key, priority=2):
+        pressed = self.scheduler.send(dst, OP_USER_CONTROL_PRESSED, [key], priority=priority)
+        released = self.scheduler.send(dst, OP_USER_CONTROL_RELEASED, priority=priority)
+        self._wait(pressed)
+        return self._wait(released)
+
+
+def open_controller(device=DEFAULT_DEVICE, simulate=False):
+    """Return a CecController on /dev/cecN, or on a simulated TV + soundbar bus."""
+    if simulate:
+        bus = SimulatedBus()
+        stop = threading.Event()
+        for la, phys, dtype in ((LA_TV, 0x0000, 0), (LA_AUDIO, 0x1000, 5)):
+            run_simulated_device(bus.attach(la, phys, SimulatedDevice(dtype)), stop)
+        transport = bus.attach(0x4, 0x2000)
+    else:
+        transport = LinuxCecTransport(device)
+    return CecController(CecScheduler(transport))
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Direct HDMI-CEC control via the Linux CEC API")
+    parser.add_argument("--device", default=DEFAULT_DEVICE, help="CEC adapter node")
+    parser.add_argument("--simulate", action="store_true", help="Use an in-memory simulated bus")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    on_p = sub.add_parser("on", help="Power on (TV by default)")
+    on_p.add_argument("--dest", type=lambda v: int(v, 0), default=LA_TV)
+    sb_p = sub.add_parser("standby", help="Standby (all devices by default)")
+    sb_p.add_argument("--dest", type=lambda v: int(v, 0), default=LA_BROADCAST)
+    sub.add_parser("active", help="Make this adapter the active source")
+    in_p = sub.add_parser("input", help="Switch TV input by HDMI port or physical address")
+    in_p.add_argument("target", help="Port number (e.g. 2) or physical address (e.g. 0x2100)")
+    for name in ("vol-up", "vol-down", "mute"):
+        v = sub.add_parser(name, help=f"{name} on the audio system")
+        v.add_argument("--dest", type=lambda v: int(v, 0), default=LA_AUDIO)
+    st_p = sub.add_parser("status", help="Query power status")
+    st_p.add_argument("--dest", type=lambda v: int(v, 0), default=LA_TV)
+    args = parser.parse_args()
+
+    try:
+        ctl = open_controller(args.device, simulate=args.simulate)
+    except OSError as e:
+        logging.error("Cannot open CEC adapter %s: %s", args.device, e)
+        sys.exit(1)
+
+    try:
+        if args.cmd == "on":
+            result = ctl.power_on(args.dest)
+        elif args.cmd == "standby":
+            result = ctl.standby(args.dest)
+        elif args.cmd == "active":
+            result = ctl.active_source()
+        elif args.cmd == "input":
+            target = f"0x{int(args.target):X}000" if args.target.isdigit() else args.target
+            result = ctl.set_input(target)
+        elif args.cmd == "vol-up":
+            result = ctl.volume_up(args.dest)
+        elif args.cmd == "vol-down":
+            result = ctl.volume_down(args.dest)
+        elif args.cmd == "mute":
+            result = ctl.mute(args.dest)
+        else:
+            result = {"power_status": ctl.power_status(args.dest)}
+        print(json.dumps(result, indent=2))
+    except (CecError, TimeoutError) as e:
+        logging.error("CEC %s failed: %s", args.cmd, e)
+        sys.exit(1)
+    finally:
+        ctl.scheduler.close()
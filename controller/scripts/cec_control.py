@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
-import os
 import socket
 import subprocess
 import logging
-import time
-import configparser
 import json
+import sqlite3
 from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import messagebox, ttk
 import argparse
 
+import adb_fleet
+import inventory
+from net_timeouts import get_controller
+from network_scan import ping_ip, check_ssdp, check_mdns, check_adb_port
+
 # ----------------- Pure CLI-Ready Functions -----------------
 
 def quick_scan_results():
@@ -55,64 +58,30 @@ def get_local_ip():
     finally:
         s.close()
 
-def check_ssdp(ip):
-    cmd = 'echo -e "M-SEARCH * HTTP/1.1\\r\\nHOST: 239.255.255.250:1900\\r\\nMAN: \"ssdp:discover\"\\r\\nMX: 1\\r\\nST: ssdp:all\\r\\n\\r\\n" | nc -u -w1 ' + ip + ' 1900'
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=1)
-        return "LOCATION:" in result.stdout
-    except Exception:
-        return False
-
-def check_mdns(ip):
-    cmd = f"dig @{ip} -p 5353 some.local"
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=1)
-        return "ANSWER:" in result.stdout
-    except Exception:
-        return False
-
 def check_port(ip, port):
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(2)
-        s.connect((ip, port))
-        s.close()
-        return True
-    except Exception:
-        return False
-
-def ping_ip(ip):
-    return os.system(f"ping -c 1 -W 1 {ip} > /dev/null 2>&1") == 0
-
-def check_adb_port(ip):
-    device_str = f"{ip}:5555"
-    cmd = f"adb -s {device_str} get-state"
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=3)
-        if result.returncode == 0 and result.stdout.strip().lower() == "device":
-            return True
-        if "unauthorized" in result.stderr.lower():
-            return True
-    except Exception:
-        pass
-    return False
+    def attempt(timeout):
+        try:
+            with socket.create_connection((ip, port), timeout=timeout):
+                return True
+        except socket.timeout:
+            return None
+        except OSError:
+            return False
+    return bool(get_controller().run(ip, "tcp", attempt))
 
 def save_adb_devices(devices):
-    config = configparser.ConfigParser()
-    config.read("config.ini")
-    if not config.has_section("ADB_Devices"):
-        config.add_section("ADB_Devices")
-    for i, device in enumerate(devices):
-        config["ADB_Devices"][f"device_{i}"] = device
-    with open("config.ini", "w") as configfile:
-        config.write(configfile)
-    logging.info(f"Saved {len(devices)} ADB devices to config.ini.")
+    try:
+        inventory.upsert_devices([{"adb_serial": d, "ip": d.rsplit(":", 1)[0], "adb": 1} for d in devices])
+        logging.info(f"Saved {len(devices)} ADB devices to the inventory.")
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Could not save ADB devices: {e}")
 
 def update_adb_dropdown(adb_dropdown):
-    config = configparser.ConfigParser()
-    config.read("config.ini")
-    adb_devices = config["ADB_Devices"] if "ADB_Devices" in config else {}
-    adb_dropdown["values"] = list(adb_devices.values())
+    try:
+        adb_dropdown["values"] = inventory.adb_serials()
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"Could not read ADB devices: {e}")
+        return
     logging.info("ADB dropdown updated.")
 
 def quick_scan_active_ips(active_ips_listbox, adb_dropdown):
@@ -142,7 +111,7 @@ def scan_network_for_adb(active_ips_listbox, adb_dropdown):
     active_ips = []
     for i in range(1, 255):
         ip = f"{subnet}.{i}"
-        if os.system(f"ping -c 1 -W 1 {ip} > /dev/null 2>&1") == 0:
+        if ping_ip(ip):
             active_ips.append(ip)
     active_ips_listbox.delete(0, tk.END)
     for ip in active_ips:
@@ -161,10 +130,12 @@ def deep_scan(active_ips_listbox, adb_dropdown):
 def connect_to_adb(adb_dropdown):
     adb_target = adb_dropdown.get()
     if adb_target:
-        os.system(f"adb disconnect {adb_target}")
-        time.sleep(1)
-        os.system(f"adb connect {adb_target}")
         logging.info(f"Attempting ADB connection to {adb_target}")
+        status = adb_fleet.connect_all([adb_target])[0]
+        if status["state"] == "device":
+            logging.info(f"ADB connected to {adb_target}")
+        else:
+            messagebox.showerror("Connect ADB", f"{adb_target}: {status['last_error'] or status['state']}")
 
 def check_adb_on_selected_ip(active_ips_listbox, adb_dropdown):
     selection = active_ips_listbox.curselection()
@@ -178,14 +149,7 @@ def check_adb_on_selected_ip(active_ips_listbox, adb_dropdown):
         if adb_device not in current_values:
             current_values.append(adb_device)
             adb_dropdown['values'] = current_values
-        config = configparser.ConfigParser()
-        config.read("config.ini")
-        if not config.has_section("ADB_Devices"):
-            config.add_section("ADB_Devices")
-        key = f"device_{len(config['ADB_Devices'])}"
-        config["ADB_Devices"][key] = adb_device
-        with open("config.ini", "w") as configfile:
-            config.write(configfile)
+        save_adb_devices([adb_device])
     else:
         messagebox.showerror("Check ADB", f"IP {ip} does not appear to be running ADB on port 5555.")
 
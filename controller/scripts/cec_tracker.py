@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+import subprocess
+
+from probe_hdmi_cec import scan_cec_layout
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+#─── Constants ────────────────────────────────────────────────────────────────
+# Tags the HDMI-CEC stack logs received/sent messages under. logcat applies the
+# filter on the TV, so only these lines cross the network.
+LOGCAT_TAGS = [
+    "HdmiControlService",
+    "HdmiCecController",
+    "HdmiCecLocalDevice",
+    "HdmiCecLocalDeviceTv",
+    "HdmiCecLocalDevicePlayback",
+    "HdmiCecNetwork",
+    "CEC",
+]
+RESTART_DELAY     = 1      # base delay before restarting a dead logcat stream
+RESTART_DELAY_MAX = 30
+
+BROADCAST = 0xF
+
+OP_IMAGE_VIEW_ON          = 0x04
+OP_TEXT_VIEW_ON           = 0x0D
+OP_STANDBY                = 0x36
+OP_SET_OSD_NAME           = 0x47
+OP_ROUTING_CHANGE         = 0x80
+OP_ROUTING_INFORMATION    = 0x81
+OP_ACTIVE_SOURCE          = 0x82
+OP_REPORT_PHYSICAL_ADDR   = 0x84
+OP_SET_STREAM_PATH        = 0x86
+OP_DEVICE_VENDOR_ID       = 0x87
+OP_REPORT_POWER_STATUS    = 0x90
+OP_INACTIVE_SOURCE        = 0x9D
+
+# Opcode names as printed by HdmiCecMessage.toString(), normalised to lower
+# case without spaces, for firmwares that log "<Name> src: 4, dst: 15, ...".
+OPCODE_NAMES = {
+    "imageviewon": OP_IMAGE_VIEW_ON,
+    "textviewon": OP_TEXT_VIEW_ON,
+    "standby": OP_STANDBY,
+    "setosdname": OP_SET_OSD_NAME,
+    "routingchange": OP_ROUTING_CHANGE,
+    "routinginformation": OP_ROUTING_INFORMATION,
+    "activesource": OP_ACTIVE_SOURCE,
+    "reportphysicaladdress": OP_REPORT_PHYSICAL_ADDR,
+    "setstreampath": OP_SET_STREAM_PATH,
+    "devicevendorid": OP_DEVICE_VENDOR_ID,
+    "reportpowerstatus": OP_REPORT_POWER_STATUS,
+    "inactivesource": OP_INACTIVE_SOURCE,
+}
+
+POWER_ON, POWER_STANDBY, POWER_TO_ON, POWER_TO_STANDBY = 0, 1, 2, 3
+
+# logcat -v epoch: "  1697712345.123  1234  1250 D HdmiCecController: <message>"
+LOGCAT_LINE = re.compile(r"^\s*(\d+\.\d+)\s+\d+\s+\d+\s+[VDIWEF]\s+(\S+?)\s*:\s(.*)$")
+HEX_FRAME   = re.compile(r"(?:^|[\s\]>:])([0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2})+)\s*$")
+NAMED_FRAME = re.compile(
+    r"<([A-Za-z ]+)>.*?src:\s*(\d+|0x[0-9A-Fa-f]+),\s*dst:\s*(\d+|0x[0-9A-Fa-f]+)"
+    r"(?:.*?params:\s*([0-9A-Fa-f:]*))?"
+)
+
+#─── Frame Parsing ────────────────────────────────────────────────────────────
+def parse_cec_frame(message):
+    """
+    Extract a CEC frame from one HDMI log message.
+    Returns dict with src, dst, opcode, params (list of ints), or None.
+    """
+    m = HEX_FRAME.search(message)
+    if m:
+        data = [int(b, 16) for b in m.group(1).split(":")]
+        if len(data) >= 2:
+            return {"src": data[0] >> 4, "dst": data[0] & 0xF, "opcode": data[1], "params": data[2:]}
+    m = NAMED_FRAME.search(message)
+    if m:
+        opcode = OPCODE_NAMES.get(m.group(1).replace(" ", "").lower())
+        if opcode is None:
+            return None
+        params_hex = (m.group(4) or "").replace(":", "")
+        params = [int(params_hex[i:i + 2], 16) for i in range(0, len(params_hex) - 1, 2)]
+        return {"src": int(m.group(2), 0), "dst": int(m.group(3), 0), "opcode": opcode, "params": params}
+    return None
+
+
+def parse_logcat_line(line):
+    """Return (timestamp, tag, frame) for a logcat line carrying a CEC frame, else None."""
+    m = LOGCAT_LINE.match(line)
+    if not m:
+        return None
+    frame = parse_cec_frame(m.group(3))
+    if frame is None:
+        return None
+    return float(m.group(1)), m.group(2), frame
+
+
+def _phys(params, offset=0):
+    if len(params) < offset + 2:
+        return None
+    return f"0x{params[offset]:02X}{params[offset + 1]:02X}"
+
+
+def _logical(addr):
+    return f"0x{addr:02X}"
+
+#─── Topology Model ───────────────────────────────────────────────────────────
+class CecTopology:
+    """In-memory view of one TV's CEC bus, updated frame by frame."""
+
+    def __init__(self):
+        self.devices = {}          # logical address (int) → device dict
+        self.active_source = None  # physical address string
+        self.updated = None
+        self._lock = threading.Lock()
+
+    def seed(self, layout):
+        """Initialise from a probe_hdmi_cec layout (one dumpsys, not periodic)."""
+        with self._lock:
+            for d in layout.get("connected_devices", []):
+                la = int(d["logical_address"], 16)
+                self.devices[la] = {
+                    "logical_address": d["logical_address"],
+                    "physical_address": d.get("physical_address"),
+                    "device_type": d.get("device_type"),
+                    "vendor_id": d.get("vendor_id"),
+                    "display_name": d.get("display_name"),
+                    "power_status": d.get("power_status"),
+                }
+            self.updated = time.time()
+
+    def _device(self, la, events):
+        dev = self.devices.get(la)
+        if dev is None:
+            dev = {"logical_address": _logical(la), "physical_address": None, "device_type": None,
+                   "vendor_id": None, "display_name": None, "power_status": None}
+            self.devices[la] = dev
+            events.append({"type": "device_added", "logical_address": dev["logical_address"]})
+        return dev
+
+    def _set(self, dev, field, value, events):
+        old = dev.get(field)
+        if old != value:
+            dev[field] = value
+            events.append({"type": field, "logical_address": dev["logical_address"], "old": old, "new": value})
+
+    def _set_active(self, phys, events):
+        if phys != self.active_source:
+            events.append({"type": "active_source", "old": self.active_source, "new": phys})
+            self.active_source = phys
+
+    def apply(self, frame, ts=None):
+        """Apply one parsed frame; return the list of change events it caused."""
+        events = []
+        src, dst, op, params = frame["src"], frame["dst"], frame["opcode"], frame["params"]
+        with self._lock:
+            if src == BROADCAST:
+                return events   # unregistered initiator
+            if op == OP_REPORT_PHYSICAL_ADDR and len(params) >= 3:
+                dev = self._device(src, events)
+                self._set(dev, "physical_address", _phys(params), events)
+                self._set(dev, "device_type", str(params[2]), events)
+            elif op == OP_ACTIVE_SOURCE and len(params) >= 2:
+                dev = self._device(src, events)
+                self._set(dev, "physical_address", _phys(params), events)
+                self._set(dev, "power_status", POWER_ON, events)
+                self._set_active(_phys(params), events)
+            elif op == OP_INACTIVE_SOURCE and len(params) >= 2:
+                if self.active_source == _phys(params):
+                    self._set_active(None, events)
+            elif op == OP_ROUTING_CHANGE and len(params) >= 4:
+                self._set_active(_phys(params, 2), events)
+            elif op in (OP_ROUTING_INFORMATION, OP_SET_STREAM_PATH) and len(params) >= 2:
+                self._set_active(_phys(params), events)
+            elif op == OP_STANDBY:
+                targets = [la for la in self.devices if la != src] if dst == BROADCAST else [dst]
+                for la in targets:
+                    self._set(self._device(la, events), "power_status", POWER_STANDBY, events)
+                if dst == BROADCAST:
+                    self._set_active(None, events)
+            elif op == OP_REPORT_POWER_STATUS and params:
+                self._set(self._device(src, events), "power_status", params[0], events)
+            elif op in (OP_IMAGE_VIEW_ON, OP_TEXT_VIEW_ON):
+                self._set(self._device(dst, events), "power_status", POWER_TO_ON, events)
+            elif op == OP_DEVICE_VENDOR_ID and len(params) >= 3:
+                vendor = str((params[0] << 16) | (params[1] << 8) | params[2])
+                self._set(self._device(src, events), "vendor_id", vendor, events)
+            elif op == OP_SET_OSD_NAME and params:
+                name = bytes(params).decode("ascii", "replace")
+                self._set(self._device(src, events), "display_name", name, events)
+            if events:
+                self.updated = ts or time.time()
+        return events
+
+    def snapshot(self):
+        """Return a JSON-serialisable copy of the current topology."""
+        with self._lock:
+            return {
+                "devices": [dict(d) for _, d in sorted(self.devices.items())],
+                "active_source": self.active_source,
+                "updated": self.updated,
+            }
+
+#─── Streaming Tracker ────────────────────────────────────────────────────────
+class CecTracker:
+    """
+    Keeps one streaming, device-filtered `adb logcat` per TV and folds the CEC
+    traffic into a CecTopology per serial. `on_event(serial, event)` is called
+    from the reader thread for every topology change.
+    """
+
+    def __init__(self, serials, on_event=None, seed=True):
+        self.serials = list(serials)
+        self.on_event = on_event
+        self.seed = seed
+        self.topologies = {s: CecTopology() for s in self.serials}
+        self._procs = {}
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        for serial in self.serials:
+            t = threading.Thread(target=self._run, args=(serial,), name=f"cec-{serial}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        for proc in list(self._procs.values()):
+            proc.terminate()
+        for t in self._threads:
+            t.join(timeout=2)
+
+    def snapshot(self, serial=None):
+        if serial is not None:
+            return self.topologies[serial].snapshot()
+        return {s: topo.snapshot() for s, topo in self.topologies.items()}
+
+    def _logcat_cmd(self, serial):
+        # -T 1: start at the newest line instead of replaying the ring buffer.
+        return ["adb", "-s", serial, "logcat", "-T", "1", "-v", "epoch", "-s"] + [f"{t}:V" for t in LOGCAT_TAGS]
+
+    def _run(self, serial):
+        topo = self.topologies[serial]
+        if self.seed:
+            try:
+                topo.seed(scan_cec_layout(serial))
+            except Exception as e:
+                logging.warning("Initial CEC probe of %s failed: %s", serial, e)
+        delay = RESTART_DELAY
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                proc = subprocess.Popen(self._logcat_cmd(serial), stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True, bufsize=1)
+            except OSError as e:
+                logging.error("Cannot start logcat for %s: %s", serial, e)
+                return
+            self._procs[serial] = proc
+            logging.info("Streaming CEC events from %s", serial)
+            for line in proc.stdout:
+                parsed = parse_logcat_line(line)
+                if parsed is None:
+                    continue
+                ts, _, frame = parsed
+                for event in topo.apply(frame, ts):
+                    event["serial"] = serial
+                    event["ts"] = ts
+                    if self.on_event:
+                        try:
+                            self.on_event(serial, event)
+                        except Exception as e:
+                            logging.error("CEC event handler failed: %s", e)
+            proc.wait()
+            if self._stop.is_set():
+                break
+            if time.time() - started > RESTART_DELAY_MAX:
+                delay = RESTART_DELAY
+            logging.warning("logcat for %s exited (%s); restarting in %.1fs", serial, proc.returncode, delay)
+            self._stop.wait(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, RESTART_DELAY_MAX)
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Live HDMI-CEC topology tracker (streams logcat)")
+    parser.add_argument("devices", nargs="+", help="ADB targets (e.g. 192.168.1.42:5555)")
+    parser.add_argument("--no-seed", action="store_true", help="Skip the initial dumpsys probe")
+    parser.add_argument("--snapshot-every", type=float, default=0,
+                        help="Also print full snapshots every N seconds (0 = events only)")
+    args = parser.parse_args()
+
+    def print_event(serial, event):
+        print(json.dumps(event), flush=True)
+
+    tracker = CecTracker(args.devices, on_event=print_event, seed=not args.no_seed)
+    tracker.start()
+    try:
+        while True:
+            time.sleep(args.snapshot_every or 3600)
+            if args.snapshot_every:
+                print(json.dumps({"type": "snapshot", "topology": tracker.snapshot()}), flush=True)
+    except KeyboardInterrupt:
+        tracker.stop()
+        sys.exit(0)
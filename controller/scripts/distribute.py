@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import shlex
+import struct
+import hashlib
+import logging
+import argparse
+import threading
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+import inventory
+from adb_session import AdbError, adb_open_service, get_shell, _recv_exact
+from app_controls import package_version
+
+#─── Constants ────────────────────────────────────────────────────────────────
+MAX_DEVICES   = 16          # devices receiving in parallel (one transfer each)
+BWLIMIT_MBIT  = float(os.environ.get("DIST_BWLIMIT_MBIT", "400"))   # 0 = uncapped
+SYNC_CHUNK    = 64 * 1024   # max DATA payload in the sync protocol
+MAX_ATTEMPTS  = 3
+HASH_TIMEOUT  = 180         # on-device sha256 of a large file on a slow eMMC
+INSTALL_TIMEOUT = 300
+APK_STAGING   = "/data/local/tmp"
+FILE_MODE     = 0o100644
+
+
+class DistributeError(Exception):
+    pass
+
+#─── Local Payloads ───────────────────────────────────────────────────────────
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Payload:
+    """A local file, hashed once, plus where it should land on each device."""
+
+    def __init__(self, path, remote):
+        self.path = path
+        self.remote = remote
+        self.size = os.path.getsize(path)
+        self.sha256 = sha256_file(path)
+
+#─── Bandwidth Cap ────────────────────────────────────────────────────────────
+class TokenBucket:
+    """Global byte budget shared by every transfer thread."""
+
+    def __init__(self, rate_bytes, burst=None):
+        self.rate = rate_bytes
+        self.capacity = burst or max(SYNC_CHUNK * 4, rate_bytes / 4)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+#─── Device Side ──────────────────────────────────────────────────────────────
+def remote_sha256(serial, path):
+    """sha256 of a file on the device, or None if it is missing/unreadable."""
+    rc, out, _ = get_shell(serial).run(f"sha256sum {shlex.quote(path)} 2>/dev/null", timeout=HASH_TIMEOUT)
+    digest = out.split()[0] if rc == 0 and out.split() else ""
+    return digest.lower() if len(digest) == 64 else None
+
+
+def sync_push(serial, local, remote, bucket, mtime=None):
+    """
+    Push one file through the adb server's sync service, metering every
+    DATA chunk through the shared bucket. Returns bytes sent.
+    """
+    sock = adb_open_service(serial, "sync:", timeout=30)
+    sent = 0
+    try:
+        spec = f"{remote},{FILE_MODE}".encode()
+        sock.sendall(b"SEND" + struct.pack("<I", len(spec)) + spec)
+        with open(local, "rb") as f:
+            while True:
+                chunk = f.read(SYNC_CHUNK)
+                if not chunk:
+                    break
+                bucket.consume(len(chunk))
+                sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                sent += len(chunk)
+        sock.sendall(b"DONE" + struct.pack("<I", int(mtime or time.time())))
+        reply = _recv_exact(sock, 8)
+        if reply[:4] != b"OKAY":
+            length = struct.unpack("<I", reply[4:])[0]
+            raise AdbError(_recv_exact(sock, length).decode("utf-8", "replace") if reply[:4] == b"FAIL"
+                           else f"unexpected sync reply {reply[:4]!r}")
+        sock.sendall(b"QUIT" + struct.pack("<I", 0))
+    finally:
+        sock.close()
+    return sent
+
+
+def _sh(serial, command, timeout=60):
+    rc, out, _ = get_shell(serial).run(command, timeout=timeout)
+    return rc, out
+
+
+def installed_apk_path(serial, package):
+    rc, out = _sh(serial, f"pm path {shlex.quote(package)}")
+    for line in out.splitlines():
+        if line.startswith("package:") and line.endswith("base.apk"):
+            return line[len("package:"):].strip()
+    return None
+
+#─── Distribution ─────────────────────────────────────────────────────────────
+class DeviceJob:
+    """Everything sent to one device, run strictly one transfer at a time."""
+
+    def __init__(self, serial, payloads, bucket, package=None, version_code=None):
+        self.serial = serial
+        self.payloads = payloads
+        self.bucket = bucket
+        self.package = package
+        self.version_code = version_code
+        self.report = {"serial": serial, "files": [], "bytes": 0, "seconds": 0.0}
+
+    def _deliver(self, payload, remote):
+        """Ensure remote holds payload's bytes; returns a per-file report dict."""
+        entry = {"remote": remote, "size": payload.size, "sent": 0, "attempts": 0}
+        if remote_sha256(self.serial, remote) == payload.sha256:
+            entry["status"] = "skipped"
+            return entry
+        # Push to a side file and rename only once its hash checks out, so an
+        # interrupted transfer never leaves a truncated file at the real path.
+        partial = f"{remote}.part"
+        _sh(self.serial, f"mkdir -p {shlex.quote(posixpath.dirname(remote))}")
+        last_error = None
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            entry["attempts"] = attempt
+            start = time.monotonic()
+            try:
+                entry["sent"] += sync_push(self.serial, payload.path, partial, self.bucket)
+                if remote_sha256(self.serial, partial) != payload.sha256:
+                    raise DistributeError("hash mismatch after push")
+                rc, out = _sh(self.serial, f"mv -f {shlex.quote(partial)} {shlex.quote(remote)}")
+                if rc != 0:
+                    raise DistributeError(f"rename failed: {out.strip()}")
+                entry["status"] = "pushed"
+                entry["seconds"] = round(time.monotonic() - start, 2)
+                return entry
+            except (AdbError, DistributeError, OSError, TimeoutError) as e:
+                last_error = str(e)
+                logging.warning("%s: push of %s failed (attempt %d/%d): %s",
+                                self.serial, remote, attempt, MAX_ATTEMPTS, e)
+                if attempt < MAX_ATTEMPTS:
+                    time.sleep(min(10, 2 ** attempt))
+        _sh(self.serial, f"rm -f {shlex.quote(partial)}")
+        raise DistributeError(f"{remote}: {last_error}")
+
+    def _install(self, apk):
+        """Install apk unless the device already runs exactly these bytes."""
+        base = installed_apk_path(self.serial, self.package)
+        if base and remote_sha256(self.serial, base) == apk.sha256:
+            return {"status": "current", "version_code": package_version(self.serial, self.package)}
+        staged = posixpath.join(APK_STAGING, f"dist-{apk.sha256[:16]}.apk")
+        entry = self._deliver(apk, staged)
+        rc, out = _sh(self.serial, f"pm install -r {shlex.quote(staged)}", timeout=INSTALL_TIMEOUT)
+        _sh(self.serial, f"rm -f {shlex.quote(staged)}")
+        if rc != 0 or "Success" not in out:
+            raise DistributeError(f"pm install: {out.strip()[-200:]}")
+        version = package_version(self.serial, self.package)
+        base = installed_apk_path(self.serial, self.package)
+        if not base or remote_sha256(self.serial, base) != apk.sha256:
+            raise DistributeError("installed base.apk does not match the payload")
+        if self.version_code is not None and version != self.version_code:
+            raise DistributeError(f"versionCode is {version}, expected {self.version_code}")
+        return dict(entry, status="installed", version_code=version)
+
+    def run(self):
+        start = time.monotonic()
+        try:
+            for payload in self.payloads:
+                if self.package:
+                    entry = dict(self._install(payload), remote=f"package:{self.package}")
+                else:
+                    entry = self._deliver(payload, payload.remote)
+                self.report["files"].append(entry)
+                self.report["bytes"] += entry.get("sent", 0)
+        except (AdbError, DistributeError, OSError, TimeoutError) as e:
+            self.report["error"] = str(e)
+        self.report["seconds"] = round(time.monotonic() - start, 2)
+        if self.report["bytes"] and self.report["seconds"]:
+            self.report["mbit_s"] = round(self.report["bytes"] * 8 / 1e6 / self.report["seconds"], 1)
+        return self.report
+
+
+def distribute(serials, payloads, package=None, version_code=None, bwlimit_mbit=BWLIMIT_MBIT,
+               workers=MAX_DEVICES):
+    """
+    Deliver payloads to every device in parallel (one transfer per device at
+    a time, all sharing one bandwidth cap). Returns a report dict.
+    """
+    bucket = TokenBucket(bwlimit_mbit * 1e6 / 8 if bwlimit_mbit else 0)
+    jobs = [DeviceJob(s, payloads, bucket, package, version_code) for s in serials]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as executor:
+        devices = list(executor.map(DeviceJob.run, jobs))
+    elapsed = time.monotonic() - start
+    sent = sum(d["bytes"] for d in devices)
+    skipped = sum(p.size for d in devices for p, f in zip(payloads, d["files"])
+                  if f["status"] in ("skipped", "current"))
+    return {
+        "payloads": [{"path": p.path, "sha256": p.sha256, "size": p.size} for p in payloads],
+        "devices": devices,
+        "failed": [d["serial"] for d in devices if "error" in d],
+        "bytes_sent": sent,
+        "bytes_skipped": skipped,
+        "seconds": round(elapsed, 2),
+        "mbit_s": round(sent * 8 / 1e6 / elapsed, 1) if elapsed else 0.0,
+    }
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    parser = argparse.ArgumentParser(description="Content-addressed parallel push / APK install over ADB")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    push_p = sub.add_parser("push", help="Copy files to a directory on every device")
+    push_p.add_argument("files", nargs="+")
+    push_p.add_argument("--dest", required=True, help="Remote directory, e.g. /sdcard/signage")
+    inst_p = sub.add_parser("install", help="Install an APK on every device")
+    inst_p.add_argument("apk")
+    inst_p.add_argument("--package", required=True, help="Package name (used to verify the install)")
+    inst_p.add_argument("--version-code", type=int, help="Fail unless devices report this versionCode")
+    for p in (push_p, inst_p):
+        p.add_argument("-d", "--devices", nargs="+", help="ADB serials (default: ADB devices in the inventory)")
+        p.add_argument("--bwlimit", type=float, default=BWLIMIT_MBIT, help="Total Mbit/s across devices (0 = uncapped)")
+        p.add_argument("--parallel", type=int, default=MAX_DEVICES)
+    args = parser.parse_args()
+
+    serials = args.devices or inventory.adb_serials()
+    if not serials:
+        print(json.dumps({"error": "no ADB targets"}))
+        sys.exit(1)
+    if args.cmd == "push":
+        payloads = [Payload(f, posixpath.join(args.dest, os.path.basename(f))) for f in args.files]
+        report = distribute(serials, payloads, bwlimit_mbit=args.bwlimit, workers=args.parallel)
+    else:
+        report = distribute(serials, [Payload(args.apk, None)], args.package, args.version_code,
+                            args.bwlimit, args.parallel)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failed"] else 0)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import errno
+import socket
+import struct
+import logging
+import argparse
+import selectors
+import threading
+
+from net_timeouts import get_controller
+from json_state import save_json
+from vendor_index import lookup_vendor
+
+#─── Constants ────────────────────────────────────────────────────────────────
+FINGERPRINT_CACHE = "/data/fingerprints.json"
+TARGET_TTL        = 24 * 3600       # re-fingerprint control targets daily
+IGNORE_TTL        = 7 * 24 * 3600   # phones/printers/APs are left alone for a week
+OTHER_TTL         = 24 * 3600       # fully probed, nothing of interest
+
+# Ports checked in one non-blocking pass before deciding what else to run.
+PORT_ADB, PORT_CAST_HTTP, PORT_CAST, PORT_VIERA = 5555, 8008, 8009, 55000
+PORT_IPP, PORT_JETDIRECT, PORT_IOS_LOCKDOWN = 631, 9100, 62078
+STAGE1_PORTS = (PORT_ADB, PORT_CAST_HTTP, PORT_CAST, PORT_VIERA, PORT_IPP, PORT_JETDIRECT, PORT_IOS_LOCKDOWN)
+
+# Probes network_scan runs for each class; unknown hosts get everything.
+CLASS_PROBES = {
+    "android_tv":   ("adb", "mdns", "ssdp"),
+    "chromecast":   ("mdns", "ssdp"),
+    "panasonic_tv": ("ssdp",),
+    "smart_tv":     ("ssdp", "mdns"),
+    "generic":      ("ssdp", "mdns", "adb"),
+    "other":        (),
+    "printer":      (),
+    "mobile":       (),
+    "network":      (),
+}
+TARGET_CLASSES = ("android_tv", "chromecast", "panasonic_tv", "smart_tv")
+IGNORED_CLASSES = ("printer", "mobile", "network")
+
+# Vendor-name keywords for hosts that are never control targets (IEEE names
+# are long legal names, so match loosely). TV vendors alone prove nothing.
+VENDOR_HINTS = (
+    ("apple", "mobile"), ("oneplus", "mobile"), ("motorola mobility", "mobile"),
+    ("hewlett packard", "printer"), ("canon", "printer"), ("seiko epson", "printer"),
+    ("brother industries", "printer"), ("kyocera", "printer"), ("xerox", "printer"),
+    ("ubiquiti", "network"), ("cisco", "network"), ("aruba", "network"), ("ruckus", "network"),
+    ("mikrotik", "network"), ("juniper", "network"), ("meraki", "network"),
+)
+# A few OUIs worth knowing even without the full IEEE index.
+OUI_HINTS = {
+    0x3C5AB4: "Google", 0x54600A: "Google", 0xF4F5D8: "Google", 0xF4F5E8: "Google",
+    0x00044B: "NVIDIA", 0x48B02D: "NVIDIA", 0x04209A: "Panasonic",
+}
+ANDROID_TV_VENDORS = ("tcl", "sony", "philips", "xiaomi", "nvidia", "hisense", "sharp", "amazon")
+SMART_TV_SERVERS = ("samsung", "tizen", "webos", "lge", "bravia", "philips", "hisense", "roku")
+
+MDNS_HINTS = (
+    ("_androidtvremote", "android_tv"),
+    ("_googlecast", "chromecast"),
+    ("_ipp", "printer"), ("_printer", "printer"), ("_pdl-datastream", "printer"), ("_scanner", "printer"),
+    ("_apple-mobdev", "mobile"), ("_companion-link", "mobile"),
+)
+
+# ADB wire protocol (host ↔ adbd), enough to read the CNXN banner.
+A_CNXN, A_AUTH = 0x4E584E43, 0x48545541
+A_VERSION, MAX_PAYLOAD = 0x01000000, 4096
+
+#─── Cheap Signals ────────────────────────────────────────────────────────────
+def mac_vendor(mac):
+    """(vendor name or None, locally administered?) for an aa:bb:cc:… MAC."""
+    if not mac:
+        return None, False
+    octets = mac.replace("-", ":").split(":")
+    try:
+        oui = int("".join(octets[:3]), 16)
+        local = bool(int(octets[0], 16) & 0x02)
+    except ValueError:
+        return None, False
+    if local:
+        return None, True   # randomized MAC: the OUI means nothing
+    vendor = lookup_vendor(oui, None)
+    return vendor or OUI_HINTS.get(oui), False
+
+
+def probe_ports(ip, ports=STAGE1_PORTS, timeout=None):
+    """Non-blocking connect to every port at once; returns the set that accepted."""
+    timeout = timeout or get_controller().timeout(ip, "tcp")
+    sel = selectors.DefaultSelector()
+    open_ports = set()
+    try:
+        for port in ports:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setblocking(False)
+            rc = s.connect_ex((ip, port))
+            if rc in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                sel.register(s, selectors.EVENT_WRITE, port)
+            else:
+                s.close()
+        deadline = time.monotonic() + timeout
+        while sel.get_map() and time.monotonic() < deadline:
+            for key, _ in sel.select(max(0.0, deadline - time.monotonic())):
+                if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    open_ports.add(key.data)
+                sel.unregister(key.fileobj)
+                key.fileobj.close()
+    finally:
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
+    return open_ports
+
+
+def _adb_packet(command, arg0, arg1, payload):
+    return struct.pack("<6I", command, arg0, arg1, len(payload), sum(payload) & 0xFFFFFFFF,
+                       command ^ 0xFFFFFFFF) + payload
+
+
+def adb_banner(ip, port=PORT_ADB, timeout=None):
+    """
+    Speak CNXN to adbd directly. Returns {"auth": True} if the device wants a
+    key, {"auth": False, "props": {...}} with its banner properties, or None.
+    No key is offered, so the TV never shows an authorization prompt.
+    """
+    timeout = timeout or get_controller().timeout(ip, "adb")
+    try:
+        with socket.create_connection((ip, port), timeout=timeout) as s:
+            s.sendall(_adb_packet(A_CNXN, A_VERSION, MAX_PAYLOAD, b"host::\0"))
+            header = b""
+            while len(header) < 24:
+                chunk = s.recv(24 - len(header))
+                if not chunk:
+                    return None
+                header += chunk
+            command, _, _, length, _, magic = struct.unpack("<6I", header)
+            if magic != command ^ 0xFFFFFFFF:
+                return None
+            if command == A_AUTH:
+                return {"auth": True}
+            if command != A_CNXN:
+                return None
+            payload = b""
+            while len(payload) < min(length, 4096):
+                chunk = s.recv(length - len(payload))
+                if not chunk:
+                    break
+                payload += chunk
+    except OSError:
+        return None
+    banner = payload.decode("utf-8", "replace").rstrip("\0")
+    props = {}
+    for item in banner.partition("::")[2].split(";"):
+        key, sep, value = item.partition("=")
+        if sep and key.startswith("ro."):
+            props[key] = value
+    return {"auth": False, "props": props}
+
+#─── Classification ───────────────────────────────────────────────────────────
+def classify(signals):
+    """
+    Map collected signals to a class, strongest evidence first:
+    ADB > mDNS service types > SSDP SERVER/UPnP manufacturer > open ports > OUI.
+    """
+    ports = set(signals.get("ports", ()))
+    mdns = " ".join(signals.get("mdns") or ())
+    server = (signals.get("server") or "").lower()
+    vendor = (signals.get("vendor") or "").lower()
+    cast = PORT_CAST in ports or PORT_CAST_HTTP in ports or "_googlecast" in mdns
+
+    if signals.get("adb") or PORT_ADB in ports or "_androidtvremote" in mdns:
+        return "android_tv"
+    if "panasonic" in server or "viera" in server or PORT_VIERA in ports:
+        return "panasonic_tv"
+    if cast:
+        if any(v in vendor for v in ANDROID_TV_VENDORS):
+            return "android_tv"
+        return "chromecast"
+    for key, cls in MDNS_HINTS:
+        if key in mdns:
+            return cls
+    if PORT_IPP in ports or PORT_JETDIRECT in ports:
+        return "printer"
+    if PORT_IOS_LOCKDOWN in ports:
+        return "mobile"
+    if any(k in server for k in SMART_TV_SERVERS):
+        return "smart_tv"
+    for key, cls in VENDOR_HINTS:
+        if key in vendor:
+            return cls
+    # Randomized MACs are mostly phones, but Wi-Fi TVs randomize too: probe once.
+    if signals.get("local_mac") and signals.get("probed") and not server and not mdns:
+        return "mobile"
+    # Fully probed with nothing of interest: stop probing for a while.
+    return "other" if signals.get("probed") else "generic"
+
+#─── Per-MAC Cache ────────────────────────────────────────────────────────────
+class Fingerprinter:
+    """
+    Classifies hosts and hands network_scan a per-host probe plan. Results
+    are cached per MAC in /data/fingerprints.json, so known phones, printers
+    and APs cost nothing on repeat scans.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or FINGERPRINT_CACHE
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _fresh(self, entry):
+        ttl = IGNORE_TTL if entry["class"] in IGNORED_CLASSES else \
+              OTHER_TTL if entry["class"] == "other" else TARGET_TTL
+        return time.time() - entry.get("updated", 0) < ttl
+
+    def plan(self, ip, mac):
+        """
+        Return (entry, probes). Cached classes are used as-is; otherwise the
+        OUI, one parallel port sweep and (if 5555 is open) the ADB banner
+        decide the class before any slower probe runs.
+        """
+        with self._lock:
+            entry = self.entries.get(mac) if mac else None
+        if entry and self._fresh(entry):
+            entry["ip"] = ip
+            return entry, CLASS_PROBES[entry["class"]]
+        vendor, local = mac_vendor(mac)
+        signals = {"vendor": vendor, "local_mac": local, "ports": sorted(probe_ports(ip))}
+        if PORT_ADB in signals["ports"]:
+            signals["adb"] = adb_banner(ip)
+        cls = classify(signals)
+        entry = self._store(ip, mac, cls, signals)
+        return entry, CLASS_PROBES[cls]
+
+    def update(self, ip, mac, **found):
+        """
+        Fold the planned probes' results (server, mdns, upnp, adb) in and
+        reclassify. The entry keeps its age unless the class changed, so the
+        TTL still forces a fresh stage-1 sweep of hosts seen every scan.
+        """
+        with self._lock:
+            entry = self.entries.get(mac) if mac else None
+        signals = dict(entry["signals"]) if entry else {}
+        signals.update({k: v for k, v in found.items() if v})
+        signals["probed"] = True
+        cls = classify(signals)
+        updated = entry["updated"] if entry and entry["class"] == cls else None
+        return self._store(ip, mac, cls, signals, updated)
+
+    def _store(self, ip, mac, cls, signals, updated=None):
+        entry = {"ip": ip, "class": cls, "vendor": signals.get("vendor"), "signals": signals,
+                 "updated": updated or time.time()}
+        if mac:
+            with self._lock:
+                self.entries[mac] = entry
+                self._dirty = True
+        return entry
+
+    def forget(self, mac):
+        with self._lock:
+            self._dirty = self.entries.pop(mac, None) is not None or self._dirty
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self.entries, indent=2)
+            self._dirty = False
+        try:
+            save_json(self.path, data)
+        except OSError as e:
+            logging.warning("Could not save fingerprint cache: %s", e)
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    parser = argparse.ArgumentParser(description="Classify LAN hosts from cheap signals (cached per MAC)")
+    parser.add_argument("--cache", default=FINGERPRINT_CACHE)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    cls_p = sub.add_parser("classify", help="Fingerprint hosts (stage 1: OUI, ports, ADB banner)")
+    cls_p.add_argument("hosts", nargs="+", help="ip or ip=mac")
+    cls_p.add_argument("--fresh", action="store_true", help="Ignore cached classifications")
+    sub.add_parser("list", help="Show the cache")
+    forget_p = sub.add_parser("forget", help="Drop cached MACs")
+    forget_p.add_argument("macs", nargs="+")
+    args = parser.parse_args()
+
+    fp = Fingerprinter(args.cache)
+    if args.cmd == "list":
+        print(json.dumps(fp.entries, indent=2))
+        sys.exit(0)
+    if args.cmd == "forget":
+        for mac in args.macs:
+            fp.forget(mac.lower())
+        fp.save()
+        sys.exit(0)
+    result = {}
+    for host in args.hosts:
+        ip, _, mac = host.partition("=")
+        if args.fresh and mac:
+            fp.forget(mac.lower())
+        entry, probes = fp.plan(ip, mac.lower() or None)
+        result[ip] = dict(entry, probes=list(probes))
+    fp.save()
+    print(json.dumps(result, indent=2))
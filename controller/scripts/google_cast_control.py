@@ -5,7 +5,10 @@ import json
 import time
 import logging
 import argparse
-import pychromecast
+import asyncio
+from pychromecast.discovery import discover_listed_chromecasts
+
+import castv2
 
 # Configure logging
 logging.basicConfig(
@@ -14,141 +17,59 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S"
 )
 
-current_cast = None
-CONNECT_TIMEOUT = 5
-CONNECT_RETRIES = 3
+DISCOVER_TIMEOUT = 5
+DISCOVER_RETRIES = 3
 RETRY_DELAY = 2
-CAST_PORT = 8009
+CAST_PORT = castv2.CAST_PORT
 
 def is_ip(source):
     """Return True if source looks like an IP or IP:port."""
     return bool(re.match(r'^\d+\.\d+\.\d+\.\d+(:\d+)?$', source))
 
-def list_devices(timeout=5):
+def list_devices(timeout=DISCOVER_TIMEOUT):
     logging.info("Discovering Chromecast devices (timeout=%ds)...", timeout)
-    chromecasts, browser = pychromecast.get_chromecasts(timeout=timeout)
-    names = [cc.cast_info.friendly_name for cc in chromecasts]
-    logging.info("Found devices: %s", names)
+    devices, browser = discover_listed_chromecasts(timeout=timeout)
     browser.stop_discovery()
+    names = [d.friendly_name for d in devices]
+    logging.info("Found devices: %s", names)
     print(json.dumps(names, indent=2))
-    return chromecasts
+    return devices
 
-def find_chromecast_by_name(name, timeout=CONNECT_TIMEOUT, retries=CONNECT_RETRIES):
-    """Discover and connect to the Chromecast with the given friendly name."""
+def find_chromecast_by_name(name, timeout=DISCOVER_TIMEOUT, retries=DISCOVER_RETRIES):
+    """(host, port) for a friendly name: cast cache / inventory first, mDNS discovery as a fallback."""
+    target = castv2.resolve(name)
+    if target:
+        return target
     for attempt in range(1, retries+1):
         logging.info("Discovering by name '%s' (attempt %d/%d)...", name, attempt, retries)
-        chromecasts, browser = pychromecast.get_chromecasts(timeout=timeout)
-        target = None
-        for cc in chromecasts:
-            fn = cc.cast_info.friendly_name
-            if fn == name:
-                target = cc
-                break
+        devices, browser = discover_listed_chromecasts(friendly_names=[name], timeout=timeout)
         browser.stop_discovery()
-        if target:
-            try:
-                target.wait(timeout=timeout)
-                logging.info("Connected to '%s'", name)
-                return target
-            except Exception as e:
-                logging.error("Failed to wait/connect to '%s': %s", name, e)
+        for d in devices:
+            if d.friendly_name == name:
+                logging.info("Found '%s' at %s:%d", name, d.host, d.port)
+                return d.host, d.port
         if attempt < retries:
             time.sleep(RETRY_DELAY)
     logging.critical("No Chromecast named '%s' found after %d attempts", name, retries)
     sys.exit(1)
 
-def connect_by_ip(host, port=CAST_PORT, timeout=CONNECT_TIMEOUT, retries=CONNECT_RETRIES):
-    """Direct IP connect with retries."""
-    for attempt in range(1, retries+1):
-        try:
-            logging.info("Connecting to %s:%d (attempt %d/%d)...", host, port, attempt, retries)
-            cc = pychromecast.Chromecast(host=host, port=port, timeout=timeout)
-            cc.wait(timeout=timeout)
-            logging.info("Connected to '%s' at %s", cc.cast_info.friendly_name, host)
-            return cc
-        except Exception as e:
-            logging.error("Connection attempt %d failed: %s", attempt, e)
-            if attempt < retries:
-                time.sleep(RETRY_DELAY)
-    logging.critical("Failed to connect to Chromecast at %s after %d attempts", host, retries)
-    sys.exit(1)
-
-def load_media(url, content_type="video/mp4"):
-    logging.info("Loading media '%s' (type=%s)", url, content_type)
-    try:
-        current_cast.media_controller.play_media(url, content_type=content_type)
-        current_cast.media_controller.block_until_active()
-        logging.info("Media playback started")
-    except Exception as e:
-        logging.warning("load_media error: %s -- reconnecting", e)
-        reconnect()
-        current_cast.media_controller.play_media(url, content_type=content_type)
-        current_cast.media_controller.block_until_active()
-        logging.info("Media playback started after retry")
-
-def play():
-    logging.info("Play command")
+async def run_command(host, port, name, command, *args):
+    """
+    Run castv2.CastConnection.<command>(*args) on one receiver. Connect
+    deadlines adapt to the host's RTT; a dropped channel is reopened once.
+    """
+    pool = castv2.CastPool()
     try:
-        current_cast.media_controller.play()
-    except Exception as e:
-        logging.warning("Play error: %s -- reconnecting", e)
-        reconnect()
-        current_cast.media_controller.play()
-
-def pause():
-    logging.info("Pause command")
-    try:
-        current_cast.media_controller.pause()
-    except Exception as e:
-        logging.warning("Pause error: %s -- reconnecting", e)
-        reconnect()
-        current_cast.media_controller.pause()
-
-def stop():
-    logging.info("Stop command")
-    try:
-        current_cast.media_controller.stop()
-    except Exception as e:
-        logging.warning("Stop error: %s -- reconnecting", e)
-        reconnect()
-        current_cast.media_controller.stop()
-
-def seek(seconds):
-    logging.info("Seek to %s seconds", seconds)
-    try:
-        current_cast.media_controller.seek(seconds)
-    except Exception as e:
-        logging.warning("Seek error: %s -- reconnecting", e)
-        reconnect()
-        current_cast.media_controller.seek(seconds)
-
-def set_volume(level):
-    logging.info("Set volume to %s", level)
-    try:
-        current_cast.set_volume(level)
-    except Exception as e:
-        logging.warning("Set volume error: %s -- reconnecting", e)
-        reconnect()
-        current_cast.set_volume(level)
-
-def mute_device(unmute=False):
-    action = "Unmuting" if unmute else "Muting"
-    logging.info("%s device", action)
-    try:
-        current_cast.set_volume_muted(not unmute)
-    except Exception as e:
-        logging.warning("Mute error: %s -- reconnecting", e)
-        reconnect()
-        current_cast.set_volume_muted(not unmute)
-
-def reconnect():
-    """Re‐establish the connection to `current_cast`."""
-    global current_cast
-    name = current_cast.cast_info.friendly_name
-    host = current_cast.host
-    port = current_cast.port
-    logging.info("Reconnecting to '%s' at %s:%d...", name, host, port)
-    current_cast = connect_by_ip(host, port)
+        for attempt in (1, 2):
+            conn = await pool.get(host, port, name)
+            try:
+                return await getattr(conn, command)(*args)
+            except castv2.CastError as e:
+                if attempt == 2 or not conn.closed.is_set():
+                    raise
+                logging.warning("%s error: %s -- reconnecting", command, e)
+    finally:
+        await pool.close()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Chromecast control CLI')
@@ -195,7 +116,13 @@ if __name__ == '__main__':
 
     # CONNECT
     if args.cmd == 'connect':
-        cc = find_chromecast_by_name(args.name)
+        host, port = find_chromecast_by_name(args.name)
+        try:
+            asyncio.run(run_command(host, port, args.name, 'get_status'))
+        except (castv2.CastError, OSError) as e:
+            logging.critical("Failed to connect to '%s': %s", args.name, e)
+            sys.exit(1)
+        logging.info("Connected to '%s' at %s:%d", args.name, host, port)
         sys.exit(0)
 
     # OTHER COMMANDS
@@ -203,24 +130,25 @@ if __name__ == '__main__':
     if is_ip(source):
         host, *port = source.split(':')
         port = int(port[0]) if port else CAST_PORT
-        current_cast = connect_by_ip(host, port)
     else:
-        current_cast = find_chromecast_by_name(source)
+        host, port = find_chromecast_by_name(source)
 
     # DISPATCH
     if args.cmd == 'load':
-        load_media(args.url, args.type)
-    elif args.cmd == 'play':
-        play()
-    elif args.cmd == 'pause':
-        pause()
-    elif args.cmd == 'stop':
-        stop()
+        logging.info("Loading media '%s' (type=%s)", args.url, args.type)
+        command = ('load', args.url, args.type)
+    elif args.cmd in ('play', 'pause', 'stop'):
+        command = (args.cmd,)
     elif args.cmd == 'seek':
-        seek(args.seconds)
+        command = ('seek', args.seconds)
     elif args.cmd == 'vol':
-        set_volume(args.level)
-    elif args.cmd == 'mute':
-        mute_device(unmute=args.unmute)
+        command = ('set_volume', args.level)
+    else:
+        command = ('set_muted', not args.unmute)
+    try:
+        asyncio.run(run_command(host, port, source, *command))
+    except (castv2.CastError, OSError) as e:
+        logging.error("Error running %s on '%s': %s", args.cmd, source, e)
+        sys.exit(1)
 
     logging.info("Command '%s' completed", args.cmd)
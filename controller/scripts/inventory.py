@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import configparser
+
+#─── Constants ────────────────────────────────────────────────────────────────
+INVENTORY_DB   = "/data/inventory.db"
+CAST_CACHE     = "/data/cast_devices.json"
+BUSY_TIMEOUT   = 10         # seconds a writer waits for the lock
+
+# Identity columns, strongest first. An upsert matches an existing row on
+# the first of these it carries; ip is only used when nothing stronger is known.
+IDENTITY_KEYS = ("mac", "cast_uuid", "adb_serial")
+DEVICE_FIELDS = ("ip", "mac", "cast_uuid", "adb_serial", "name", "model", "kind",
+                 "ssdp", "mdns", "adb")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id          INTEGER PRIMARY KEY,
+    ip          TEXT,
+    mac         TEXT,
+    cast_uuid   TEXT,
+    adb_serial  TEXT,
+    name        TEXT,
+    model       TEXT,
+    kind        TEXT,
+    ssdp        INTEGER,
+    mdns        INTEGER,
+    adb         INTEGER,
+    first_seen  REAL NOT NULL,
+    last_seen   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_devices_ip ON devices(ip);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_devices_mac  ON devices(mac)        WHERE mac IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_devices_cast ON devices(cast_uuid)  WHERE cast_uuid IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_devices_adb  ON devices(adb_serial) WHERE adb_serial IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS hdmi_links (
+    sink_id          INTEGER NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
+    logical_address  TEXT NOT NULL,
+    port_id          INTEGER,
+    physical_address TEXT,
+    display_name     TEXT,
+    device_type      TEXT,
+    vendor_id        TEXT,
+    manufacturer     TEXT,
+    power_status     INTEGER,
+    updated          REAL NOT NULL,
+    PRIMARY KEY (sink_id, logical_address)
+);
+CREATE INDEX IF NOT EXISTS idx_hdmi_port ON hdmi_links(sink_id, port_id);
+"""
+
+_local = threading.local()
+
+#─── Connection ───────────────────────────────────────────────────────────────
+def connect(path=None):
+    """Return this thread's connection to the inventory (WAL, schema ensured)."""
+    path = path or INVENTORY_DB
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        conns[path] = conn
+    return conn
+
+
+class _transaction:
+    """BEGIN IMMEDIATE … COMMIT/ROLLBACK, so concurrent writers serialise cleanly."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+#─── Writes ───────────────────────────────────────────────────────────────────
+def _find_row(conn, fields):
+    for key in IDENTITY_KEYS:
+        if fields.get(key):
+            row = conn.execute(f"SELECT * FROM devices WHERE {key} = ?", (fields[key],)).fetchone()
+            if row:
+                return row
+    if fields.get("ip"):
+        # Fall back to IP only for rows that don't contradict a stronger identity.
+        for row in conn.execute("SELECT * FROM devices WHERE ip = ? ORDER BY last_seen DESC", (fields["ip"],)):
+            if all(not fields.get(k) or not row[k] or row[k] == fields[k] for k in IDENTITY_KEYS):
+                return row
+    return None
+
+
+def _upsert(conn, fields, now):
+    fields = {k: v for k, v in fields.items() if k in DEVICE_FIELDS and v is not None}
+    row = _find_row(conn, fields)
+    if row is None:
+        cols = list(fields) + ["first_seen", "last_seen"]
+        cur = conn.execute(
+            f"INSERT INTO devices ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            list(fields.values()) + [now, now],
+        )
+        return cur.lastrowid
+    for key in IDENTITY_KEYS:
+        # An identity value now belongs to this row; release it elsewhere.
+        if fields.get(key) and row[key] != fields[key]:
+            conn.execute(f"UPDATE devices SET {key} = NULL WHERE {key} = ? AND id != ?", (fields[key], row["id"]))
+    sets = ", ".join(f"{k} = ?" for k in fields)
+    conn.execute(f"UPDATE devices SET {sets}{', ' if sets else ''}last_seen = ? WHERE id = ?",
+                 list(fields.values()) + [now, row["id"]])
+    return row["id"]
+
+
+def upsert_device(path=None, **fields):
+    """Insert or update one device; returns its row id."""
+    conn = connect(path)
+    with _transaction(conn):
+        return _upsert(conn, fields, time.time())
+
+
+def upsert_devices(records, path=None):
+    """Upsert many device dicts in one transaction; returns their row ids."""
+    conn = connect(path)
+    now = time.time()
+    with _transaction(conn):
+        return [_upsert(conn, dict(r), now) for r in records]
+
+
+def record_hdmi_layout(adb_serial, layout, path=None):
+    """Replace the HDMI links of the device probed over adb_serial."""
+    conn = connect(path)
+    now = time.time()
+    ip = adb_serial.rsplit(":", 1)[0] if ":" in adb_serial else None
+    local = layout.get("local_device", {})
+    with _transaction(conn):
+        sink_id = _upsert(conn, {"adb_serial": adb_serial, "ip": ip, "adb": 1,
+                                 "name": local.get("display_name")}, now)
+        conn.execute("DELETE FROM hdmi_links WHERE sink_id = ?", (sink_id,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO hdmi_links (sink_id, logical_address, port_id, physical_address, display_name,"
+            " device_type, vendor_id, manufacturer, power_status, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(sink_id, d["logical_address"], d.get("port_id"), d.get("physical_address"), d.get("display_name"),
+              d.get("device_type"), d.get("vendor_id"), d.get("manufacturer"), d.get("power_status"), now)
+             for d in layout.get("connected_devices", [])],
+        )
+    return sink_id
+
+
+def import_cast_cache(cache_path=CAST_CACHE, path=None):
+    """Upsert Chromecasts from castService's JSON cache; returns the count."""
+    with open(cache_path, "r") as f:
+        cache = json.load(f)
+    records = []
+    for uid, info in cache.items():
+        records.append({"cast_uuid": uid, "ip": info.get("host"), "name": info.get("name"),
+                        "model": info.get("model"), "kind": "chromecast", "mdns": 1})
+    upsert_devices(records, path)
+    return len(records)
+
+
+def import_config_ini(ini_path="config.ini", path=None):
+    """One-off migration of the legacy [ADB_Devices] section; returns the count."""
+    config = configparser.ConfigParser()
+    config.read(ini_path)
+    serials = sorted(set(config["ADB_Devices"].values())) if config.has_section("ADB_Devices") else []
+    upsert_devices([{"adb_serial": s, "ip": s.rsplit(":", 1)[0], "adb": 1} for s in serials], path)
+    return len(serials)
+
+#─── Queries ──────────────────────────────────────────────────────────────────
+def find_device(path=None, **criteria):
+    """Return the device matching ip/mac/cast_uuid/adb_serial (indexed lookups), or None."""
+    conn = connect(path)
+    for key in IDENTITY_KEYS + ("ip",):
+        if criteria.get(key):
+            row = conn.execute(f"SELECT * FROM devices WHERE {key} = ? ORDER BY last_seen DESC LIMIT 1",
+                               (criteria[key],)).fetchone()
+            return dict(row) if row else None
+    return None
+
+
+def list_devices(kind=None, adb_only=False, path=None):
+    conn = connect(path)
+    sql = "SELECT * FROM devices"
+    where, params = [], []
+    if kind:
+        where.append("kind = ?")
+        params.append(kind)
+    if adb_only:
+        where.append("adb_serial IS NOT NULL")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return [dict(r) for r in conn.execute(sql + " ORDER BY ip", params)]
+
+
+def adb_serials(path=None):
+    return [d["adb_serial"] for d in list_devices(adb_only=True, path=path)]
+
+
+def device_on_port(host, port_id, path=None):
+    """
+    Which device sits on HDMI<port_id> of the sink at `host` (an IP or ADB
+    serial)? Returns the hdmi_links row(s) for that port.
+    """
+    conn = connect(path)
+    rows = conn.execute(
+        "SELECT l.*, d.ip AS sink_ip, d.adb_serial AS sink_serial, d.name AS sink_name"
+        " FROM devices d JOIN hdmi_links l ON l.sink_id = d.id"
+        " WHERE (d.ip = ? OR d.adb_serial = ?) AND l.port_id = ?",
+        (host, host, port_id),
+    )
+    return [dict(r) for r in rows]
+
+
+def hdmi_links(host, path=None):
+    conn = connect(path)
+    rows = conn.execute(
+        "SELECT l.* FROM devices d JOIN hdmi_links l ON l.sink_id = d.id"
+        " WHERE d.ip = ? OR d.adb_serial = ? ORDER BY l.port_id", (host, host))
+    return [dict(r) for r in rows]
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Device inventory (SQLite, /data/inventory.db)")
+    parser.add_argument("--db", default=INVENTORY_DB, help="Inventory database path")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    list_p = sub.add_parser("list", help="List known devices")
+    list_p.add_argument("--kind")
+    list_p.add_argument("--adb", action="store_true", help="Only devices with an ADB serial")
+    find_p = sub.add_parser("find", help="Look up one device")
+    for key in ("ip", "mac", "cast-uuid", "adb-serial"):
+        find_p.add_argument(f"--{key}")
+    port_p = sub.add_parser("port", help="Which device is on HDMI<port> of a sink")
+    port_p.add_argument("host", help="IP or ADB serial of the TV/soundbar")
+    port_p.add_argument("port", type=int)
+    links_p = sub.add_parser("links", help="All HDMI links of a sink")
+    links_p.add_argument("host")
+    cast_p = sub.add_parser("import-cast", help="Import castService's cast_devices.json")
+    cast_p.add_argument("path", nargs="?", default=CAST_CACHE)
+    ini_p = sub.add_parser("import-config", help="Import legacy config.ini ADB devices")
+    ini_p.add_argument("path", nargs="?", default="config.ini")
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        result = list_devices(args.kind, args.adb, args.db)
+    elif args.cmd == "find":
+        result = find_device(args.db, ip=args.ip, mac=args.mac, cast_uuid=args.cast_uuid,
+                             adb_serial=args.adb_serial)
+    elif args.cmd == "port":
+        result = device_on_port(args.host, args.port, args.db)
+    elif args.cmd == "links":
+        result = hdmi_links(args.host, args.db)
+    elif args.cmd == "import-cast":
+        result = {"imported": import_cast_cache(args.path, args.db)}
+    else:
+        result = {"imported": import_config_ini(args.path, args.db)}
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result not in (None, []) else 1)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+import os
+import json
+
+
+def save_json(path, data, indent=None):
+    """
+    Atomically replace path with data as JSON: written to a per-process tmp
+    file, then os.replace'd, so readers never see a half-written cache.
+    data may be pre-serialized text (e.g. a snapshot taken under a lock).
+    Raises OSError if it can't be written.
+    """
+    text = data if isinstance(data, str) else json.dumps(data, indent=indent)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
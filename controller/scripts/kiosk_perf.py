@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cdp_client import connect_page, CdpError, DEFAULT_HOST
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+#─── Constants ────────────────────────────────────────────────────────────────
+PERF_DIR         = "/data/kiosk_perf"
+KIOSK_PORTS      = {"kiosk1": 9222, "kiosk2": 9223}
+SAMPLE_INTERVAL  = 15       # seconds between samples
+FRAME_WINDOW_MS  = 1000     # rAF sampling window per sample; the loop is off otherwise
+WINDOW_SAMPLES   = 240      # samples in the rolling summary (1 h at 15 s)
+RETENTION_DAYS   = 7        # daily minute-aggregate files kept
+LONG_FRAME_MS    = 50       # a frame this long is visibly janky
+HEAP_LEAK_MB_H   = 20       # sustained heap growth that raises an alert
+DROPPED_ALERT    = 0.25     # fraction of janky frames that raises an alert
+
+# Installed once per document: a long-task observer (free until a long task
+# happens) and an on-demand requestAnimationFrame sampler.
+PERF_JS = r"""
+(() => {
+  if (window.__ssPerf) return true;
+  const P = window.__ssPerf = {longtasks: 0, longtaskMs: 0};
+  try {
+    new PerformanceObserver(list => {
+      for (const e of list.getEntries()) { P.longtasks++; P.longtaskMs += e.duration; }
+    }).observe({entryTypes: ['longtask']});
+  } catch (e) {}
+  P.drain = () => { const r = {longtasks: P.longtasks, longtaskMs: P.longtaskMs}; P.longtasks = 0; P.longtaskMs = 0; return r; };
+  P.frames = (ms, longMs) => new Promise(resolve => {
+    const gaps = [];
+    let last = null;
+    const end = performance.now() + ms;
+    const tick = t => {
+      if (last !== null) gaps.push(t - last);
+      last = t;
+      if (t < end) requestAnimationFrame(tick);
+      else resolve({frames: gaps.length, long: gaps.filter(g => g >= longMs).length,
+                    maxMs: gaps.length ? Math.max(...gaps) : null,
+                    meanMs: gaps.length ? gaps.reduce((a, b) => a + b, 0) / gaps.length : null,
+                    hidden: document.hidden});
+    };
+    requestAnimationFrame(tick);
+    setTimeout(() => resolve({frames: gaps.length, long: 0, maxMs: null, meanMs: null, hidden: document.hidden}), ms * 3);
+  });
+  return true;
+})()
+"""
+
+#─── Process Memory ───────────────────────────────────────────────────────────
+def proc_root():
+    """The host's /proc when the controller sees it (mounted at /host), else our own."""
+    return "/host/proc" if os.path.isdir("/host/proc/1") else "/proc"
+
+
+def _proc_status(root, pid):
+    out = {}
+    try:
+        with open(f"{root}/{pid}/status", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("PPid", "VmRSS"):
+                    out[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        pass
+    return out
+
+
+def chromium_rss(port, root=None):
+    """
+    Sum VmRSS (kB) over the Chromium process tree whose browser process was
+    started with --remote-debugging-port=port. Returns {'total_kb', 'processes'}
+    or None when the process can't be found.
+    """
+    root = root or proc_root()
+    flag = f"--remote-debugging-port={port}".encode()
+    parents, browser = {}, None
+    for name in os.listdir(root):
+        if not name.isdigit():
+            continue
+        status = _proc_status(root, name)
+        if "PPid" in status:
+            parents[int(name)] = status["PPid"]
+        if browser is None:
+            try:
+                with open(f"{root}/{name}/cmdline", "rb") as f:
+                    cmdline = f.read()
+            except OSError:
+                continue
+            if flag in cmdline and b"--type=" not in cmdline:
+                browser = int(name)
+    if browser is None:
+        return None
+    tree, frontier = {browser}, [browser]
+    while frontier:
+        pid = frontier.pop()
+        children = [c for c, p in parents.items() if p == pid and c not in tree]
+        tree.update(children)
+        frontier.extend(children)
+    total = sum(_proc_status(root, pid).get("VmRSS", 0) for pid in tree)
+    return {"total_kb": total, "processes": len(tree)}
+
+#─── Collector ────────────────────────────────────────────────────────────────
+def _stats(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "min": round(ordered[0], 2),
+        "mean": round(statistics.mean(ordered), 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def _slope_per_hour(points):
+    """Least-squares slope of (t seconds, value) points, per hour."""
+    if len(points) < 4:
+        return None
+    ts = [p[0] for p in points]
+    vs = [p[1] for p in points]
+    mt, mv = statistics.mean(ts), statistics.mean(vs)
+    denom = sum((t - mt) ** 2 for t in ts)
+    if not denom:
+        return None
+    return sum((t - mt) * (v - mv) for t, v in zip(ts, vs)) / denom * 3600
+
+
+class KioskCollector:
+    """
+    Samples one kiosk over CDP: Performance.getMetrics (heap, DOM nodes,
+    listeners, layout/script time), long tasks, a short rAF frame-timing
+    window, and the RSS of its Chromium process tree. Keeps a rolling window
+    and writes <name>.json (summary) and <name>-YYYYMMDD.jsonl (per-minute
+    aggregates) under the output directory.
+    """
+
+    def __init__(self, name, port, host=DEFAULT_HOST, out_dir=None, frame_window_ms=FRAME_WINDOW_MS):
+        self.name = name
+        self.port = port
+        self.host = host
+        self.out_dir = out_dir or PERF_DIR
+        self.frame_window_ms = frame_window_ms
+        self.client = None
+        self.samples = deque(maxlen=WINDOW_SAMPLES)
+        self._minute = []
+        self._minute_key = None
+        self._prev_metrics = None
+        os.makedirs(self.out_dir, exist_ok=True)
+
+    def _connect(self):
+        self.client = connect_page(self.port, self.host)
+        self.client.send("Performance.enable")
+        self.client.send("Page.addScriptToEvaluateOnNewDocument", {"source": PERF_JS})
+        self.client.evaluate(PERF_JS)
+        self._prev_metrics = None
+
+    def _disconnect(self):
+        if self.client:
+            try:
+                self.client.close()
+            except OSError:
+                pass
+        self.client = None
+
+    def sample(self):
+        """Take one sample; returns it (with 'error' set when the kiosk is unreachable)."""
+        now = time.time()
+        sample = {"ts": now}
+        try:
+            if self.client is None or self.client.closed.is_set():
+                self._connect()
+            frames = self.client.send_async("Runtime.evaluate", {
+                "expression": f"__ssPerf.frames({self.frame_window_ms}, {LONG_FRAME_MS})",
+                "awaitPromise": True, "returnByValue": True})
+            metrics = {m["name"]: m["value"] for m in self.client.send("Performance.getMetrics")["metrics"]}
+            tasks = self.client.evaluate("window.__ssPerf ? __ssPerf.drain() : null")
+            if tasks is None:
+                # Page navigated before the new-document script ran.
+                self.client.evaluate(PERF_JS)
+                tasks = {"longtasks": 0, "longtaskMs": 0}
+            frame_stats = frames.result(self.frame_window_ms / 1000 * 3 + 5).get("result", {}).get("value") or {}
+        except (CdpError, OSError, ValueError) as e:
+            self._disconnect()
+            sample["error"] = str(e)
+            logging.warning("%s: sample failed: %s", self.name, e)
+            return self._record(sample)
+
+        prev, self._prev_metrics = self._prev_metrics, (now, metrics)
+        sample.update({
+            "heap_used_mb": metrics.get("JSHeapUsedSize", 0) / 1e6,
+            "heap_total_mb": metrics.get("JSHeapTotalSize", 0) / 1e6,
+            "nodes": metrics.get("Nodes"),
+            "documents": metrics.get("Documents"),
+            "listeners": metrics.get("JSEventListeners"),
+            "frames": frame_stats.get("frames"),
+            "long_frames": frame_stats.get("long"),
+            "max_frame_ms": frame_stats.get("maxMs"),
+            "fps": frame_stats["frames"] / (self.frame_window_ms / 1000) if frame_stats.get("frames") else None,
+            "hidden": frame_stats.get("hidden"),
+            "longtasks": tasks["longtasks"],
+            "longtask_ms": tasks["longtaskMs"],
+        })
+        if prev:
+            # TaskDuration/ScriptDuration are cumulative seconds of main-thread work.
+            dt = now - prev[0]
+            for key, out in (("TaskDuration", "main_thread_busy"), ("ScriptDuration", "script_busy")):
+                if key in metrics and key in prev[1] and dt > 0:
+                    sample[out] = max(0.0, (metrics[key] - prev[1][key]) / dt)
+        rss = chromium_rss(self.port)
+        if rss:
+            sample["rss_mb"] = rss["total_kb"] / 1024
+            sample["processes"] = rss["processes"]
+        return self._record(sample)
+
+    def _record(self, sample):
+        self.samples.append(sample)
+        minute = time.strftime("%Y%m%d%H%M", time.localtime(sample["ts"]))
+        if self._minute_key and minute != self._minute_key:
+            self._flush_minute()
+        self._minute_key = minute
+        self._minute.append(sample)
+        self._write_summary()
+        return sample
+
+    def _flush_minute(self):
+        ok = [s for s in self._minute if "error" not in s]
+        line = {
+            "minute": self._minute_key,
+            "samples": len(self._minute),
+            "errors": len(self._minute) - len(ok),
+            "heap_used_mb": _stats([s.get("heap_used_mb") for s in ok]),
+            "rss_mb": _stats([s.get("rss_mb") for s in ok]),
+            "nodes": _stats([s.get("nodes") for s in ok]),
+            "fps": _stats([s.get("fps") for s in ok]),
+            "long_frames": sum(s.get("long_frames") or 0 for s in ok),
+            "longtasks": sum(s.get("longtasks") or 0 for s in ok),
+            "longtask_ms": round(sum(s.get("longtask_ms") or 0 for s in ok), 1),
+        }
+        path = os.path.join(self.out_dir, f"{self.name}-{self._minute_key[:8]}.jsonl")
+        with open(path, "a") as f:
+            f.write(json.dumps(line) + "\n")
+        self._minute = []
+        self._prune()
+
+    def _prune(self):
+        cutoff = time.strftime("%Y%m%d", time.localtime(time.time() - RETENTION_DAYS * 86400))
+        for name in os.listdir(self.out_dir):
+            m = re.fullmatch(re.escape(self.name) + r"-(\d{8})\.jsonl", name)
+            if m and m.group(1) < cutoff:
+                try:
+                    os.remove(os.path.join(self.out_dir, name))
+                except OSError:
+                    pass
+
+    def summary(self):
+        ok = [s for s in self.samples if "error" not in s]
+        frames = sum(s.get("frames") or 0 for s in ok)
+        long_frames = sum(s.get("long_frames") or 0 for s in ok)
+        heap_trend = _slope_per_hour([(s["ts"], s["heap_used_mb"]) for s in ok])
+        rss_trend = _slope_per_hour([(s["ts"], s["rss_mb"]) for s in ok if "rss_mb" in s])
+        dropped = long_frames / frames if frames else None
+        alerts = []
+        if heap_trend is not None and heap_trend > HEAP_LEAK_MB_H and len(ok) >= WINDOW_SAMPLES // 4:
+            alerts.append(f"JS heap growing {heap_trend:.1f} MB/h")
+        if rss_trend is not None and rss_trend > HEAP_LEAK_MB_H and len(ok) >= WINDOW_SAMPLES // 4:
+            alerts.append(f"RSS growing {rss_trend:.1f} MB/h")
+        if dropped is not None and dropped > DROPPED_ALERT:
+            alerts.append(f"{dropped:.0%} of frames over {LONG_FRAME_MS} ms")
+        return {
+            "kiosk": self.name,
+            "port": self.port,
+            "updated": time.time(),
+            "window_samples": len(self.samples),
+            "errors": len(self.samples) - len(ok),
+            "latest": self.samples[-1] if self.samples else None,
+            "heap_used_mb": _stats([s["heap_used_mb"] for s in ok]),
+            "rss_mb": _stats([s.get("rss_mb") for s in ok]),
+            "nodes": _stats([s.get("nodes") for s in ok]),
+            "listeners": _stats([s.get("listeners") for s in ok]),
+            "fps": _stats([s.get("fps") for s in ok]),
+            "main_thread_busy": _stats([s.get("main_thread_busy") for s in ok]),
+            "long_frame_ratio": round(dropped, 3) if dropped is not None else None,
+            "longtasks": sum(s.get("longtasks") or 0 for s in ok),
+            "heap_trend_mb_per_h": round(heap_trend, 2) if heap_trend is not None else None,
+            "rss_trend_mb_per_h": round(rss_trend, 2) if rss_trend is not None else None,
+            "alerts": alerts,
+        }
+
+    def _write_summary(self):
+        summary = self.summary()
+        path = os.path.join(self.out_dir, f"{self.name}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp, path)
+        for alert in summary["alerts"]:
+            logging.warning("%s: %s", self.name, alert)
+
+
+def run(collectors, interval=SAMPLE_INTERVAL, once=False):
+    """Sample every collector each interval (in parallel) until interrupted."""
+    with ThreadPoolExecutor(max_workers=len(collectors)) as executor:
+        while True:
+            tick = time.monotonic()
+            results = list(executor.map(lambda c: c.sample(), collectors))
+            if once:
+                return results
+            time.sleep(max(0.0, interval - (time.monotonic() - tick)))
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sample kiosk Chromium performance over DevTools")
+    parser.add_argument("--kiosk", action="append", default=[], metavar="NAME=PORT",
+                        help="Kiosk to sample (default: kiosk1=9222 and kiosk2=9223)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL)
+    parser.add_argument("--out", default=PERF_DIR, help="Output directory")
+    parser.add_argument("--once", action="store_true", help="Take one sample per kiosk, print it and exit")
+    args = parser.parse_args()
+
+    kiosks = dict(k.split("=", 1) for k in args.kiosk) if args.kiosk else KIOSK_PORTS
+    collectors = [KioskCollector(name, int(port), args.host, args.out) for name, port in kiosks.items()]
+    try:
+        results = run(collectors, args.interval, args.once)
+    except KeyboardInterrupt:
+        sys.exit(0)
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if any("error" in r for r in results) else 0)
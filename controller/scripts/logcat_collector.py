@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+import io
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import queue
+import random
+import socket
+import logging
+import argparse
+import threading
+
+import inventory
+from adb_session import AdbError, adb_open_service
+
+try:
+    import zstandard
+    TRUNCATED_ERRORS = (EOFError, OSError, zstandard.ZstdError)
+except ImportError:
+    zstandard = None
+    TRUNCATED_ERRORS = (EOFError, OSError)
+
+#─── Constants ────────────────────────────────────────────────────────────────
+LOGCAT_DIR        = "/data/logcat"
+DEFAULT_FILTER    = ["*:I"]          # logcat filterspecs, applied on the TV
+SEGMENT_BYTES     = 8 * 1024 * 1024  # uncompressed bytes per segment
+SEGMENT_SECONDS   = 3600
+DEVICE_CAP_MB     = 256              # compressed bytes kept per device
+FLUSH_INTERVAL    = 5                # seconds between flushes of open segments
+QUEUE_BATCHES     = 4096             # reader → writer backlog before readers block
+BATCH_LINES       = 256
+BATCH_MAX_AGE     = 1.0              # seconds a line may wait in a reader before it is queued
+RESTART_DELAY     = 1
+RESTART_DELAY_MAX = 30
+
+# logcat -v epoch: "  1697712345.123  1234  1250 D Tag: message"
+LOGCAT_LINE = re.compile(r"^\s*(\d+\.\d+)\s+(\d+)\s+(\d+)\s+([VDIWEFS])\s+(.*?)\s*:\s(.*)$")
+PRIORITIES  = "VDIWEFS"
+
+#─── Records ──────────────────────────────────────────────────────────────────
+def parse_line(line):
+    """Return a compact record [ts, pid, tid, prio, tag, msg], or None."""
+    m = LOGCAT_LINE.match(line)
+    if not m:
+        return None
+    return [float(m.group(1)), int(m.group(2)), int(m.group(3)), m.group(4), m.group(5), m.group(6)]
+
+
+def device_dir(serial, root=None):
+    return os.path.join(root or LOGCAT_DIR, serial.replace(":", "_").replace("/", "_"))
+
+
+def _open_write(path):
+    if path.endswith(".zst"):
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"), closefd=True)
+    return gzip.open(path, "wb", compresslevel=4)
+
+
+def _open_read(path):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} needs the zstandard module")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return gzip.open(path, "rb")
+
+
+def read_segment(path):
+    """Yield records from one segment; an open or crash-truncated segment ends early."""
+    try:
+        with io.TextIOWrapper(_open_read(path), encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+    except TRUNCATED_ERRORS as e:
+        logging.debug("Segment %s ends early: %s", path, e)
+
+#─── Segment Store ────────────────────────────────────────────────────────────
+class SegmentStore:
+    """
+    Per-device ring of compressed JSON-lines segments plus index.json, which
+    records each segment's first/last timestamp so queries only open the
+    segments that overlap the requested window.
+    """
+
+    def __init__(self, serial, root=None, cap_mb=DEVICE_CAP_MB):
+        self.serial = serial
+        self.dir = device_dir(serial, root)
+        self.cap = cap_mb * 1024 * 1024
+        self.ext = ".jsonl.zst" if zstandard else ".jsonl.gz"
+        os.makedirs(self.dir, exist_ok=True)
+        self.index = self._load_index()
+        self.current = None
+        self._fh = None
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.dir, "index.json")) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = []
+        # A crash leaves the last segment marked open; it is complete as far as it goes.
+        for seg in index:
+            seg["open"] = False
+        return [s for s in index if os.path.exists(os.path.join(self.dir, s["file"]))]
+
+    def _save_index(self):
+        tmp = os.path.join(self.dir, "index.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, os.path.join(self.dir, "index.json"))
+
+    @property
+    def last_ts(self):
+        return max((s["last"] for s in self.index if s.get("last")), default=None)
+
+    def _roll(self, first_ts):
+        self.close()
+        name = f"{int(first_ts * 1000)}{self.ext}"
+        self.current = {"file": name, "first": first_ts, "last": first_ts, "lines": 0, "raw": 0,
+                        "bytes": 0, "opened": time.time(), "open": True}
+        self._fh = _open_write(os.path.join(self.dir, name))
+        self.index.append(self.current)
+
+    def write(self, records):
+        for rec in records:
+            if (self.current is None or self.current["raw"] >= SEGMENT_BYTES
+                    or time.time() - self.current["opened"] >= SEGMENT_SECONDS):
+                self._roll(rec[0])
+            data = (json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+            self._fh.write(data)
+            cur = self.current
+            cur["raw"] += len(data)
+            cur["lines"] += 1
+            cur["last"] = max(cur["last"], rec[0])
+
+    def flush(self):
+        if self._fh is None:
+            return
+        self._fh.flush()
+        self.current["bytes"] = os.path.getsize(os.path.join(self.dir, self.current["file"]))
+        self._enforce_cap()
+        self._save_index()
+
+    def _enforce_cap(self):
+        total = sum(s["bytes"] for s in self.index)
+        while total > self.cap and len(self.index) > 1 and not self.index[0].get("open"):
+            old = self.index.pop(0)
+            total -= old["bytes"]
+            try:
+                os.remove(os.path.join(self.dir, old["file"]))
+            except OSError:
+                pass
+
+    def close(self):
+        if self._fh is None:
+            return
+        self._fh.close()
+        self.current["open"] = False
+        self.current["bytes"] = os.path.getsize(os.path.join(self.dir, self.current["file"]))
+        self._fh, self.current = None, None
+        self._enforce_cap()
+        self._save_index()
+
+#─── Collector ────────────────────────────────────────────────────────────────
+class LogcatCollector:
+    """
+    One streaming logcat per device, read over the adb server socket (no adb
+    client process per TV). Reader threads only parse and enqueue batches;
+    a single writer thread compresses and writes, so slow storage applies
+    backpressure to the TCP streams instead of dropping lines.
+    """
+
+    def __init__(self, serials, filters=None, root=None, cap_mb=DEVICE_CAP_MB):
+        self.serials = list(serials)
+        self.filters = filters or DEFAULT_FILTER
+        self.stores = {s: SegmentStore(s, root, cap_mb) for s in self.serials}
+        self.stats = {s: {"lines": 0, "restarts": 0, "connected": False} for s in self.serials}
+        self._queue = queue.Queue(maxsize=QUEUE_BATCHES)
+        self._socks = {}
+        self._threads = []
+        self._stop = threading.Event()
+
+    def _command(self, serial):
+        # Resume from the last stored line; a fresh device replays its ring buffer.
+        since = self.stores[serial].last_ts
+        start = f"-T {since:.3f} " if since else ""
+        return f"exec:logcat -v epoch {start}{' '.join(self.filters)}"
+
+    def start(self):
+        writer = threading.Thread(target=self._write_loop, name="logcat-writer", daemon=True)
+        writer.start()
+        self._threads.append(writer)
+        for serial in self.serials:
+            t = threading.Thread(target=self._read_loop, args=(serial,), name=f"logcat-{serial}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for sock in list(self._socks.values()):
+            try:
+                # shutdown() wakes a reader blocked in recv; close() alone does not.
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for t in self._threads[1:]:
+            t.join(timeout=2)
+        self._queue.put(None)
+        self._threads[0].join(timeout=10)
+
+    def _read_loop(self, serial):
+        delay = RESTART_DELAY
+        while not self._stop.is_set():
+            started = time.time()
+            # Lines sharing the resume timestamp were already stored once.
+            resume_ts = self.stores[serial].last_ts
+            try:
+                sock = adb_open_service(serial, self._command(serial))
+                # Wake up at least every BATCH_MAX_AGE so a quiet device's
+                # last lines reach the store without waiting for the next one.
+                sock.settimeout(BATCH_MAX_AGE)
+                self._socks[serial] = sock
+                self.stats[serial]["connected"] = True
+                logging.info("Collecting logcat from %s", serial)
+                batch, pending, batch_started = [], b"", 0.0
+                while True:
+                    try:
+                        chunk = sock.recv(65536)
+                    except socket.timeout:
+                        chunk = None
+                    if chunk == b"":
+                        break
+                    if chunk:
+                        lines = (pending + chunk).split(b"\n")
+                        pending = lines.pop()
+                        for raw in lines:
+                            rec = parse_line(raw.decode("utf-8", "replace"))
+                            if rec is None or (resume_ts is not None and rec[0] <= resume_ts):
+                                continue
+                            if not batch:
+                                batch_started = time.monotonic()
+                            batch.append(rec)
+                    if batch and (chunk is None or len(batch) >= BATCH_LINES
+                                  or time.monotonic() - batch_started >= BATCH_MAX_AGE):
+                        self._queue.put((serial, batch))
+                        batch = []
+                rec = parse_line(pending.decode("utf-8", "replace")) if pending else None
+                if rec is not None and (resume_ts is None or rec[0] > resume_ts):
+                    batch.append(rec)
+                if batch:
+                    self._queue.put((serial, batch))
+            except (AdbError, OSError) as e:
+                if not self._stop.is_set():
+                    logging.warning("logcat for %s failed: %s", serial, e)
+            finally:
+                self.stats[serial]["connected"] = False
+                self._socks.pop(serial, None)
+            if self._stop.is_set():
+                break
+            self.stats[serial]["restarts"] += 1
+            if time.time() - started > RESTART_DELAY_MAX:
+                delay = RESTART_DELAY
+            self._stop.wait(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, RESTART_DELAY_MAX)
+
+    def _write_loop(self):
+        next_flush = time.monotonic() + FLUSH_INTERVAL
+        dirty = set()
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                serial, batch = item
+                try:
+                    self.stores[serial].write(batch)
+                    self.stats[serial]["lines"] += len(batch)
+                    dirty.add(serial)
+                except OSError as e:
+                    logging.error("Writing logcat for %s failed: %s", serial, e)
+            if time.monotonic() >= next_flush:
+                for serial in dirty:
+                    try:
+                        self.stores[serial].flush()
+                    except OSError as e:
+                        logging.error("Flushing logcat for %s failed: %s", serial, e)
+                dirty.clear()
+                next_flush = time.monotonic() + FLUSH_INTERVAL
+        for store in self.stores.values():
+            store.close()
+
+#─── Query ────────────────────────────────────────────────────────────────────
+def query(serial, since=None, until=None, min_prio=None, tags=None, grep=None, limit=None, root=None):
+    """Yield stored records for serial within [since, until], oldest first."""
+    ddir = device_dir(serial, root)
+    try:
+        with open(os.path.join(ddir, "index.json")) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return
+    pattern = re.compile(grep) if grep else None
+    floor = PRIORITIES.index(min_prio) if min_prio else 0
+    count = 0
+    for seg in sorted(index, key=lambda s: s["first"]):
+        if (until is not None and seg["first"] > until) or (since is not None and seg["last"] < since):
+            continue
+        for rec in read_segment(os.path.join(ddir, seg["file"])):
+            ts, _, _, prio, tag, msg = rec
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts > until:
+                break
+            if PRIORITIES.index(prio) < floor or (tags and tag not in tags):
+                continue
+            if pattern and not pattern.search(msg):
+                continue
+            yield rec
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+def parse_time(value):
+    """Epoch seconds, or a relative age like 90s / 15m / 2h / 1d."""
+    if value is None:
+        return None
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", value)
+    if m:
+        return time.time() - float(m.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[m.group(2)]
+    return float(value)
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    parser = argparse.ArgumentParser(description="Multi-device logcat collector with compressed ring storage")
+    parser.add_argument("--dir", default=LOGCAT_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run_p = sub.add_parser("collect", help="Stream logcat from devices into /data/logcat")
+    run_p.add_argument("devices", nargs="*", help="ADB serials (default: ADB devices in the inventory)")
+    run_p.add_argument("--filter", nargs="+", default=DEFAULT_FILTER,
+                       help="logcat filterspecs applied on the device, e.g. '*:W' 'ActivityManager:I'")
+    run_p.add_argument("--cap-mb", type=int, default=DEVICE_CAP_MB, help="Compressed MB kept per device")
+    q_p = sub.add_parser("query", help="Read stored lines")
+    q_p.add_argument("device")
+    q_p.add_argument("--since", help="Epoch seconds or age (e.g. 15m, 2h)")
+    q_p.add_argument("--until", help="Epoch seconds or age")
+    q_p.add_argument("--prio", choices=list(PRIORITIES), help="Minimum priority")
+    q_p.add_argument("--tag", action="append", help="Only these tags (repeatable)")
+    q_p.add_argument("--grep", help="Regex on the message")
+    q_p.add_argument("--limit", type=int)
+    q_p.add_argument("--json", action="store_true", help="Print records as JSON lines")
+    sub.add_parser("segments", help="Show stored segments per device")
+    args = parser.parse_args()
+
+    if args.cmd == "query":
+        for ts, pid, tid, prio, tag, msg in query(args.device, parse_time(args.since), parse_time(args.until),
+                                                  args.prio, args.tag, args.grep, args.limit, args.dir):
+            if args.json:
+                print(json.dumps([ts, pid, tid, prio, tag, msg]))
+            else:
+                stamp = time.strftime("%m-%d %H:%M:%S", time.localtime(ts)) + f".{int(ts * 1000) % 1000:03d}"
+                print(f"{stamp} {pid:5d} {tid:5d} {prio} {tag}: {msg}")
+        sys.exit(0)
+    if args.cmd == "segments":
+        result = {}
+        for name in sorted(os.listdir(args.dir)) if os.path.isdir(args.dir) else []:
+            try:
+                with open(os.path.join(args.dir, name, "index.json")) as f:
+                    result[name] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        print(json.dumps(result, indent=2))
+        sys.exit(0)
+
+    serials = args.devices or inventory.adb_serials()
+    if not serials:
+        print(json.dumps({"error": "no ADB targets"}))
+        sys.exit(1)
+    collector = LogcatCollector(serials, args.filter, args.dir, args.cap_mb).start()
+    try:
+        while True:
+            time.sleep(60)
+            logging.info("logcat: %s", json.dumps(collector.stats))
+    except KeyboardInterrupt:
+        collector.stop()
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import mimetypes
+import threading
+import urllib.request
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlparse, parse_qs, quote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+#─── Constants ────────────────────────────────────────────────────────────────
+CACHE_DIR       = "/data/media_cache"
+CACHE_MAX_BYTES = int(float(os.environ.get("MEDIA_CACHE_MAX_GB", "8")) * 1024 ** 3)
+ORIGIN_PORT     = int(os.environ.get("MEDIA_ORIGIN_PORT", "8090"))
+ORIGIN_HOST     = os.environ.get("MEDIA_ORIGIN_HOST")     # LAN address casts use; autodetected if unset
+FETCH_TIMEOUT   = 30
+FETCH_CHUNK     = 1 << 20
+KEEPALIVE_IDLE  = 60        # seconds an idle keep-alive connection is held
+PREFETCH_WORKERS = 4
+
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("application/dash+xml", ".mpd")
+mimetypes.add_type("video/mp2t", ".ts")
+mimetypes.add_type("video/webm", ".webm")
+mimetypes.add_type("audio/aac", ".aac")
+
+#─── Content Cache ────────────────────────────────────────────────────────────
+def cache_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+
+def _extension(url):
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,5}", ext) else ""
+
+
+class MediaCache:
+    """
+    Content cache of whole media files, one `<key><ext>` per URL plus a
+    `<key>.json` sidecar. Recency lives in each file's atime (set explicitly
+    on every hit), so the origin server and `prefetch` runs can share the
+    directory without a common index. Eviction drops least-recently-served
+    files until the cache is under its size cap.
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or CACHE_DIR
+        self.max_bytes = max_bytes or CACHE_MAX_BYTES
+        os.makedirs(self.root, exist_ok=True)
+        self._fetching = {}
+        self._lock = threading.Lock()
+
+    def _meta_path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def lookup(self, key):
+        """Return the entry dict (with 'path') for a cached key, or None."""
+        try:
+            with open(self._meta_path(key), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = os.path.join(self.root, meta["file"])
+        if not os.path.exists(path):
+            return None
+        meta["path"] = path
+        return meta
+
+    def touch(self, entry):
+        try:
+            st = os.stat(entry["path"])
+            os.utime(entry["path"], (time.time(), st.st_mtime))
+        except OSError:
+            pass
+
+    def fetch(self, url):
+        """Download url into the cache (once, even if asked concurrently); returns the entry."""
+        key = cache_key(url)
+        with self._lock:
+            event = self._fetching.get(key)
+            owner = event is None
+            if owner:
+                event = self._fetching[key] = threading.Event()
+        if not owner:
+            event.wait()
+            entry = self.lookup(key)
+            if entry is None:
+                raise OSError(f"fetch of {url} failed")
+            return entry
+        try:
+            entry = self.lookup(key)
+            if entry is None:
+                entry = self._download(url, key)
+            return entry
+        finally:
+            with self._lock:
+                del self._fetching[key]
+            event.set()
+
+    def _download(self, url, key):
+        name = key + _extension(url)
+        path = os.path.join(self.root, name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        digest = hashlib.sha256()
+        size = 0
+        start = time.monotonic()
+        req = urllib.request.Request(url, headers={"User-Agent": "suitestream-media-origin"})
+        try:
+            with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT) as resp, open(tmp, "wb") as f:
+                content_type = resp.headers.get_content_type()
+                expected = int(resp.headers.get("Content-Length") or 0)
+                if expected:
+                    self.evict(expected)
+                while True:
+                    chunk = resp.read(FETCH_CHUNK)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            if content_type in ("application/octet-stream", "text/plain", "binary/octet-stream"):
+                content_type = mimetypes.guess_type(name)[0] or content_type
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        meta = {
+            "url": url,
+            "file": name,
+            "size": size,
+            "content_type": content_type,
+            "etag": f'"{digest.hexdigest()[:32]}"',
+            "sha256": digest.hexdigest(),
+            "fetched": time.time(),
+        }
+        mtmp = f"{self._meta_path(key)}.tmp"
+        with open(mtmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(mtmp, self._meta_path(key))
+        elapsed = time.monotonic() - start
+        logging.info("Cached %s (%.1f MB in %.1fs)", url, size / 1e6, elapsed)
+        self.evict()
+        meta["path"] = path
+        return meta
+
+    def entries(self):
+        out = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json"):
+                entry = self.lookup(name[:-5])
+                if entry:
+                    try:
+                        st = os.stat(entry["path"])
+                    except OSError:
+                        continue    # evicted between listdir and stat
+                    entry["last_access"] = st.st_atime
+                    out.append(entry)
+        return out
+
+    def evict(self, incoming=0):
+        """Drop least-recently-served files until size + incoming fits the cap."""
+        entries = sorted(self.entries(), key=lambda e: e["last_access"])
+        total = sum(e["size"] for e in entries)
+        removed = []
+        while entries and total + incoming > self.max_bytes:
+            e = entries.pop(0)
+            for p in (e["path"], self._meta_path(cache_key(e["url"]))):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= e["size"]
+            removed.append(e["url"])
+        if removed:
+            logging.info("Evicted %d cached files", len(removed))
+        return removed
+
+#─── HTTP Origin ──────────────────────────────────────────────────────────────
+def parse_range(header, size):
+    """
+    Parse a single 'bytes=' range. Returns (start, end) inclusive, None when
+    the header should be ignored (absent, malformed, multi-range), or
+    'unsatisfiable'.
+    """
+    if not header:
+        return None
+    m = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header)
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+        if end < start:
+            return None     # RFC 9110: invalid range spec, serve the whole file
+        if start >= size:
+            return "unsatisfiable"
+        return start, min(end, size - 1)
+    length = int(m.group(2))
+    if length == 0:
+        return "unsatisfiable"
+    return max(0, size - length), size - 1
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SuiteStreamOrigin/1.0"
+    timeout = KEEPALIVE_IDLE
+
+    def log_message(self, fmt, *args):
+        logging.debug("%s %s", self.address_string(), fmt % args)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _reply(self, code, body=b"", content_type="text/plain", headers=()):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _serve(self, head):
+        u = urlparse(self.path)
+        if u.path == "/stats":
+            body = json.dumps(self.server.stats_snapshot()).encode()
+            return self._reply(200, body, "application/json")
+        m = re.fullmatch(r"/c/([0-9a-f]{32})(\.[a-z0-9]{1,5})?", u.path)
+        if not m:
+            return self._reply(404, b"not found\n")
+        key = m.group(1)
+        cache = self.server.cache
+        entry = cache.lookup(key)
+        if entry is None:
+            src = parse_qs(u.query).get("src", [None])[0]
+            if not src or cache_key(src) != key:
+                return self._reply(404, b"not cached\n")
+            # Send this request straight to the source and fill the cache behind it.
+            self.server.count("misses")
+            self.server.prefetch(src)
+            return self._reply(302, headers=[("Location", src), ("Cache-Control", "no-store")])
+        self.server.count("hits")
+        cache.touch(entry)
+        self._send_entry(entry, head)
+
+    def _send_entry(self, entry, head):
+        size = entry["size"]
+        etag = entry["etag"]
+        common = [
+            ("ETag", etag),
+            ("Last-Modified", formatdate(entry["fetched"], usegmt=True)),
+            ("Accept-Ranges", "bytes"),
+            ("Cache-Control", "public, max-age=86400"),
+            ("Access-Control-Allow-Origin", "*"),
+        ]
+        inm = self.headers.get("If-None-Match")
+        if inm and (inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]):
+            self.send_response(304)
+            for k, v in common:
+                self.send_header(k, v)
+            self.end_headers()
+            return
+
+        rng = parse_range(self.headers.get("Range"), size)
+        if_range = self.headers.get("If-Range")
+        if rng is not None and if_range and not self._if_range_matches(if_range, entry):
+            rng = None
+        if rng == "unsatisfiable":
+            return self._reply(416, headers=[("Content-Range", f"bytes */{size}")] + common)
+
+        start, end = rng if rng else (0, size - 1)
+        length = max(0, end - start + 1)
+        self.send_response(206 if rng else 200)
+        self.send_header("Content-Type", entry["content_type"])
+        self.send_header("Content-Length", str(length))
+        if rng:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        for k, v in common:
+            self.send_header(k, v)
+        self.end_headers()
+        if head or not length:
+            return
+        with open(entry["path"], "rb") as f:
+            # socket.sendfile() uses os.sendfile (zero-copy) and copes with socket timeouts.
+            sent = self.connection.sendfile(f, start, length)
+        self.server.count("bytes_served", sent)
+
+    @staticmethod
+    def _if_range_matches(value, entry):
+        value = value.strip()
+        if value.startswith('"') or value.startswith("W/"):
+            return value == entry["etag"]
+        try:
+            return parsedate_to_datetime(value).timestamp() >= int(entry["fetched"])
+        except (TypeError, ValueError):
+            return False
+
+
+class MediaOriginServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, cache):
+        super().__init__(address, OriginHandler)
+        self.cache = cache
+        self.stats = {"hits": 0, "misses": 0, "bytes_served": 0, "prefetches": 0}
+        self._stats_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+
+    def count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def prefetch(self, url):
+        self.count("prefetches")
+        self._prefetcher.submit(self._prefetch_quietly, url)
+
+    def _prefetch_quietly(self, url):
+        try:
+            self.cache.fetch(url)
+        except Exception as e:
+            logging.warning("Prefetch of %s failed: %s", url, e)
+
+    def stats_snapshot(self):
+        entries = self.cache.entries()
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update({"entries": len(entries), "bytes": sum(e["size"] for e in entries),
+                      "max_bytes": self.cache.max_bytes})
+        return stats
+
+#─── Cast Helpers ─────────────────────────────────────────────────────────────
+def origin_base(host=None, port=None):
+    if not host:
+        host = ORIGIN_HOST
+    if not host:
+        from network_scan import get_local_ip
+        host = get_local_ip()
+    return f"http://{host}:{port or ORIGIN_PORT}"
+
+
+def localize_url(url, base=None):
+    """
+    Rewrite a remote http(s) media URL to the local origin. The original URL
+    rides along as ?src= so a cold cache redirects to it and fills itself.
+    """
+    if urlparse(url).scheme not in ("http", "https"):
+        return url
+    base = base or origin_base()
+    if url.startswith(base + "/"):
+        return url
+    return f"{base}/c/{cache_key(url)}{_extension(url)}?src={quote(url, safe='')}"
+
+
+def read_url_list(sources):
+    """URLs from arguments; a local file argument contributes one URL per non-comment line."""
+    urls = []
+    for src in sources:
+        if "://" not in src and os.path.isfile(src):
+            with open(src, "r") as f:
+                urls.extend(l.strip() for l in f if l.strip() and not l.startswith("#"))
+        else:
+            urls.append(src)
+    return urls
+
+
+def prefetch(urls, cache=None, workers=PREFETCH_WORKERS):
+    """Warm the cache; returns {url: {'size','cached'} or {'error'}}."""
+    cache = cache or MediaCache()
+
+    def one(url):
+        try:
+            hit = cache.lookup(cache_key(url)) is not None
+            entry = cache.fetch(url)
+            return url, {"size": entry["size"], "cached": hit}
+        except Exception as e:
+            return url, {"error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls)))) as executor:
+        return dict(executor.map(one, urls))
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local media origin with a size-capped LRU cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--max-gb", type=float, help="Cache size cap (default MEDIA_CACHE_MAX_GB or 8)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    serve_p = sub.add_parser("serve", help="Run the HTTP origin")
+    serve_p.add_argument("--bind", default="0.0.0.0")
+    serve_p.add_argument("--port", type=int, default=ORIGIN_PORT)
+    pre_p = sub.add_parser("prefetch", help="Download URLs (or URL list files) into the cache")
+    pre_p.add_argument("sources", nargs="+")
+    loc_p = sub.add_parser("localize", help="Print the local-origin URL for remote URLs")
+    loc_p.add_argument("urls", nargs="+")
+    sub.add_parser("list", help="List cached files")
+    sub.add_parser("evict", help="Apply the size cap now")
+    args = parser.parse_args()
+
+    cache = MediaCache(args.cache_dir, int(args.max_gb * 1024 ** 3) if args.max_gb else None)
+    if args.cmd == "serve":
+        server = MediaOriginServer((args.bind, args.port), cache)
+        logging.info("Media origin on %s:%d serving %s (cap %.1f GB)", args.bind, args.port,
+                     cache.root, cache.max_bytes / 1024 ** 3)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            sys.exit(0)
+    elif args.cmd == "prefetch":
+        results = prefetch(read_url_list(args.sources), cache)
+        print(json.dumps(results, indent=2))
+        sys.exit(1 if any("error" in r for r in results.values()) else 0)
+    elif args.cmd == "localize":
+        print(json.dumps({u: localize_url(u) for u in args.urls}, indent=2))
+    elif args.cmd == "list":
+        print(json.dumps([{k: e[k] for k in ("url", "size", "content_type", "last_access")}
+                          for e in sorted(cache.entries(), key=lambda e: -e["last_access"])], indent=2))
+    else:
+        print(json.dumps({"evicted": cache.evict()}, indent=2))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import atexit
+import logging
+import argparse
+import threading
+
+from json_state import save_json
+
+#─── Constants ────────────────────────────────────────────────────────────────
+RTT_STATE_PATH = "/data/rtt_estimates.json"
+
+# RFC 6298 smoothing: SRTT ← (1-α)·SRTT + α·R, RTTVAR ← (1-β)·RTTVAR + β·|SRTT-R|
+ALPHA = 1 / 8
+BETA  = 1 / 4
+K     = 4
+
+INITIAL_RTT  = 0.2          # assumed RTT before anything on the subnet was measured
+MAX_RETRIES  = 2            # extra attempts after a timeout
+BACKOFF      = 2.0          # timeout multiplier per retry
+STALE_AFTER  = 7 * 86400    # forget host estimates not refreshed for a week
+SAVE_EVERY   = 30           # seconds between automatic saves
+
+# Per-probe (fixed processing overhead, floor, cap) in seconds. The overhead
+# covers work the responder does beyond the network round trip, e.g. adbd
+# answering get-state or a Chromecast completing TLS + CONNECT.
+PROBE_PROFILES = {
+    "ping": (0.0,  0.2,  1.0),   # Wi-Fi clients in power save answer late
+    "tcp":  (0.0,  0.05, 2.0),
+    "ssdp": (0.05, 0.1,  2.0),
+    "mdns": (0.02, 0.1,  2.0),
+    "http": (0.1,  0.2,  5.0),
+    "adb":  (0.3,  0.5,  3.0),
+    "cast": (0.5,  1.0,  5.0),
+}
+
+
+def subnet_of(host):
+    """'192.168.0.175' or '192.168.0.175:5555' → '192.168.0'."""
+    ip = host.split(":")[0]
+    return ".".join(ip.split(".")[:3])
+
+#─── Estimators ───────────────────────────────────────────────────────────────
+class RttEstimate:
+    __slots__ = ("srtt", "rttvar", "samples", "updated")
+
+    def __init__(self, srtt=None, rttvar=None, samples=0, updated=0.0):
+        self.srtt = srtt
+        self.rttvar = rttvar
+        self.samples = samples
+        self.updated = updated
+
+    def update(self, rtt):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.samples += 1
+        self.updated = time.time()
+
+    def rto(self):
+        return self.srtt + K * self.rttvar
+
+    def to_dict(self):
+        return {"srtt": self.srtt, "rttvar": self.rttvar, "samples": self.samples, "updated": self.updated}
+
+
+class TimeoutController:
+    """
+    Keeps SRTT/RTTVAR per host and per /24 subnet and turns them into probe
+    deadlines. Hosts never measured borrow their subnet's estimate, so a sweep
+    of dead addresses waits about as long as the live ones take to answer.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or RTT_STATE_PATH
+        self.hosts = {}
+        self.subnets = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        cutoff = time.time() - STALE_AFTER
+        for table, key in ((self.hosts, "hosts"), (self.subnets, "subnets")):
+            for name, est in data.get(key, {}).items():
+                if est.get("updated", 0) >= cutoff and est.get("srtt") is not None:
+                    table[name] = RttEstimate(**est)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"hosts": {h: e.to_dict() for h, e in self.hosts.items()},
+                    "subnets": {s: e.to_dict() for s, e in self.subnets.items()}}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            save_json(self.path, data)
+        except OSError as e:
+            logging.debug("Could not persist RTT estimates: %s", e)
+
+    def record(self, host, rtt):
+        """Feed one measured round-trip time (seconds) for host."""
+        ip = host.split(":")[0]
+        with self._lock:
+            self.hosts.setdefault(ip, RttEstimate()).update(rtt)
+            self.subnets.setdefault(subnet_of(ip), RttEstimate()).update(rtt)
+            self._dirty = True
+            due = time.monotonic() - self._last_save > SAVE_EVERY
+        if due:
+            self.save()
+
+    def record_elapsed(self, host, probe, elapsed):
+        """Record a probe's wall time, less the responder's fixed processing overhead."""
+        overhead = PROBE_PROFILES.get(probe, PROBE_PROFILES["tcp"])[0]
+        self.record(host, max(0.0, elapsed - overhead))
+
+    def measured(self, host):
+        """True if host has an RTT estimate of its own (not just its subnet's)."""
+        with self._lock:
+            return host.split(":")[0] in self.hosts
+
+    def estimate(self, host):
+        ip = host.split(":")[0]
+        with self._lock:
+            est = self.hosts.get(ip) or self.subnets.get(subnet_of(ip))
+            return (est.srtt, est.rttvar) if est else (None, None)
+
+    def timeout(self, host, probe="tcp"):
+        """Deadline in seconds for one attempt of `probe` against host."""
+        overhead, floor, cap = PROBE_PROFILES.get(probe, PROBE_PROFILES["tcp"])
+        srtt, rttvar = self.estimate(host)
+        base = srtt + K * rttvar if srtt is not None else INITIAL_RTT * 3
+        return min(cap, max(floor, base + overhead))
+
+    def deadlines(self, host, probe="tcp", retries=MAX_RETRIES):
+        """Per-attempt deadlines: first from the estimate, then backed off."""
+        first = self.timeout(host, probe)
+        cap = PROBE_PROFILES.get(probe, PROBE_PROFILES["tcp"])[2]
+        return [min(cap, first * BACKOFF ** i) for i in range(retries + 1)]
+
+    def run(self, host, probe, attempt, retries=MAX_RETRIES):
+        """
+        Call attempt(timeout) until it returns a non-None result or the
+        attempts run out; attempt returns None only when it timed out.
+        Positive answers feed the RTT estimate (timed-out attempts never do).
+        Returns the result, or None if every attempt timed out.
+        """
+        for deadline in self.deadlines(host, probe, retries):
+            start = time.monotonic()
+            result = attempt(deadline)
+            if result is not None:
+                if result:
+                    self.record_elapsed(host, probe, time.monotonic() - start)
+                return result
+        return None
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """Process-wide TimeoutController, saved automatically at exit."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = TimeoutController()
+            atexit.register(_controller.save)
+        return _controller
+
+
+def probe_timeout(host, probe="tcp"):
+    return get_controller().timeout(host, probe)
+
+
+def record_rtt(host, rtt):
+    get_controller().record(host, rtt)
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Show adaptive probe timeouts derived from measured RTTs")
+    parser.add_argument("hosts", nargs="*", help="Hosts to show deadlines for (default: all known)")
+    args = parser.parse_args()
+
+    ctl = get_controller()
+    hosts = args.hosts or sorted(ctl.hosts)
+    out = {}
+    for host in hosts:
+        srtt, rttvar = ctl.estimate(host)
+        out[host] = {
+            "srtt_ms": round(srtt * 1000, 1) if srtt is not None else None,
+            "rttvar_ms": round(rttvar * 1000, 1) if rttvar is not None else None,
+            "timeouts": {p: round(ctl.timeout(host, p), 3) for p in PROBE_PROFILES},
+        }
+    print(json.dumps(out, indent=2))
+    sys.exit(0)
@@ -1,20 +1,62 @@
 #!/usr/bin/env python3
-import os
+import re
 import socket
+import struct
 import subprocess
 import logging
 import argparse
 import json
+import sqlite3
+import threading
 from concurrent.futures import ThreadPoolExecutor
 
+import inventory
+import fingerprint
+import ssdp_devices
+from net_timeouts import get_controller
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+ADB_START_TIMEOUT = 10     # seconds; a cold adb server takes a few to come up
+
+PING_TIME_RE = re.compile(r"time[=<]([\d.]+) ms")
+# DNS-SD service enumeration (_services._dns-sd._udp.local PTR), QU bit set.
+MDNS_QUERY = (struct.pack(">HHHHHH", 0x5353, 0, 1, 0, 0, 0)
+              + b"".join(bytes([len(l)]) + l for l in (b"_services", b"_dns-sd", b"_udp", b"local")) + b"\x00"
+              + struct.pack(">HH", 12, 0x8001))
+
 # ----------------- Core Functions -----------------
 
-def ping_ip(ip):
-    """Return True if the host responds to a single ping."""
-    return os.system(f"ping -c 1 -W 1 {ip} > /dev/null 2>&1") == 0
+def ping_ip(ip, retries=None):
+    """
+    Return True if the host responds to ping (deadlines from net_timeouts).
+    Hosts without an RTT estimate of their own get one backed-off retry by default.
+    """
+    timeouts = get_controller()
+    if retries is None:
+        retries = 0 if timeouts.measured(ip) else 1
+
+    def attempt(timeout):
+        try:
+            proc = subprocess.run(["ping", "-c", "1", "-W", f"{timeout:.3f}", ip],
+                                  capture_output=True, text=True, timeout=timeout + 0.25)
+        except subprocess.TimeoutExpired:
+            return None
+        except OSError:
+            return False
+        if proc.returncode != 0:
+            return None
+        m = PING_TIME_RE.search(proc.stdout)
+        if m:
+            timeouts.record(ip, float(m.group(1)) / 1000)
+        return True
+    # ping reports its own RTT, so skip run()'s wall-clock sample
+    for deadline in timeouts.deadlines(ip, "ping", retries):
+        result = attempt(deadline)
+        if result is not None:
+            return result
+    return False
 
 
 def get_local_ip():
@@ -29,45 +71,179 @@ def get_local_ip():
         s.close()
 
 
+def ssdp_search(ip):
+    """Return the host's SSDP replies (lower-cased header dicts); [] if it doesn't answer."""
+    for deadline in get_controller().deadlines(ip, "ssdp"):
+        replies = ssdp_devices.unicast_search(ip, deadline)
+        if replies is not None:
+            return replies
+    return []
+
+
 def check_ssdp(ip):
-    """Return True if SSDP discovery returns a LOCATION header."""
-    cmd = ('echo -e "M-SEARCH * HTTP/1.1\r\n'
-           'HOST: 239.255.255.250:1900\r\nMAN: \"ssdp:discover\"\r\n'
-           'MX: 1\r\nST: ssdp:all\r\n\r\n"'
-           f' | nc -u -w1 {ip} 1900')
-    try:
-        out = subprocess.check_output(cmd, shell=True, stderr=subprocess.DEVNULL, timeout=2, text=True)
-        return "LOCATION:" in out
-    except Exception:
-        return False
+    """Return True if a unicast SSDP M-SEARCH returns a LOCATION header."""
+    return bool(ssdp_search(ip))
+
+
+def _dns_name(data, offset):
+    """Decode a (possibly compressed) DNS name; returns (name, offset after it)."""
+    labels, end, hops = [], None, 0
+    while offset < len(data):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            hops += 1
+            if hops > 16:
+                break
+            continue
+        offset += 1
+        if not length:
+            break
+        labels.append(data[offset:offset + length].decode('utf-8', 'replace'))
+        offset += length
+    return '.'.join(labels), end if end is not None else offset
+
+
+def parse_mdns_services(data):
+    """Return the service types (e.g. '_googlecast._tcp') advertised in a DNS-SD reply."""
+    qdcount, ancount, nscount, arcount = struct.unpack('>4H', data[4:12])
+    offset, services = 12, set()
+    for _ in range(qdcount):
+        offset = _dns_name(data, offset)[1] + 4
+    for _ in range(ancount + nscount + arcount):
+        name, offset = _dns_name(data, offset)
+        rtype, _, _, rdlength = struct.unpack('>HHIH', data[offset:offset + 10])
+        offset += 10
+        if rtype == 12:
+            target = _dns_name(data, offset)[0]
+            services.add(target if name.startswith('_services.') else name)
+        offset += rdlength
+    return sorted(s[:-len('.local')] if s.endswith('.local') else s for s in services)
+
+
+def mdns_services(ip):
+    """Return the host's DNS-SD service types, or None if it doesn't answer on 5353."""
+    def attempt(timeout):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.settimeout(timeout)
+            try:
+                s.sendto(MDNS_QUERY, (ip, 5353))
+                data = s.recv(4096)
+            except socket.timeout:
+                return None
+            except OSError:
+                return False
+        if len(data) < 12 or data[:2] != MDNS_QUERY[:2]:
+            return False
+        try:
+            return parse_mdns_services(data)
+        except (struct.error, IndexError):
+            return []
+    services = get_controller().run(ip, "mdns", attempt)
+    return services if isinstance(services, list) else None
 
 
 def check_mdns(ip):
-    """Return True if mDNS query returns an ANSWER section."""
-    cmd = f"dig @{ip} -p 5353 some.local +timeout=2 +tries=1"
-    try:
-        out = subprocess.check_output(cmd, shell=True, stderr=subprocess.DEVNULL, timeout=3, text=True)
-        return "ANSWER:" in out
-    except Exception:
-        return False
+    """Return True if the host answers a unicast mDNS query on port 5353."""
+    return mdns_services(ip) is not None
+
+
+_adb_server_started = False
+_adb_server_lock = threading.Lock()
+
+
+def _ensure_adb_server():
+    """Start the local adb server once, so its cold start isn't charged to a probe deadline."""
+    global _adb_server_started
+    with _adb_server_lock:
+        if _adb_server_started:
+            return
+        try:
+            subprocess.run(["adb", "start-server"], capture_output=True, timeout=ADB_START_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.warning("Could not start adb server: %s", e)
+        _adb_server_started = True
 
 
 def check_adb_port(ip):
     """Return True if ADB on port 5555 is available (device or unauthorized)."""
     target = f"{ip}:5555"
-    cmd = f"adb -s {target} get-state"
-    try:
-        proc = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=3)
+    _ensure_adb_server()
+    # get-state is answered by the local adb server, so its wall time says
+    # nothing about the network; use the deadlines without recording samples.
+    for deadline in get_controller().deadlines(ip, "adb", retries=1):
+        try:
+            proc = subprocess.run(["adb", "-s", target, "get-state"], capture_output=True, text=True,
+                                  timeout=deadline)
+        except subprocess.TimeoutExpired:
+            continue
+        except OSError:
+            return False
         if proc.returncode == 0 and proc.stdout.strip().lower() == 'device':
             return True
-        if 'unauthorized' in proc.stderr.lower():
-            return True
-    except Exception:
-        pass
+        return 'unauthorized' in proc.stderr.lower()
     return False
 
+
+def read_arp_table():
+    """Return {ip: mac} from the kernel neighbour table (filled by the ping sweep)."""
+    table = {}
+    try:
+        with open("/proc/net/arp") as f:
+            next(f)
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 4 and parts[3] != "00:00:00:00:00:00":
+                    table[parts[0]] = parts[3].lower()
+    except (OSError, StopIteration):
+        pass
+    return table
+
+
+def save_scan_results(results):
+    """Upsert scan results into the device inventory in one transaction."""
+    arp = read_arp_table()
+    records = [{
+        "ip": r["ip"],
+        "mac": arp.get(r["ip"]),
+        "adb_serial": f"{r['ip']}:5555" if r["adb"] else None,
+        "name": (r.get("upnp") or {}).get("friendly_name"),
+        "model": (r.get("upnp") or {}).get("model"),
+        "kind": r.get("class") if r.get("class") in fingerprint.TARGET_CLASSES else None,
+        "ssdp": int(r["ssdp"]),
+        "mdns": int(r["mdns"]),
+        "adb": int(r["adb"]),
+    } for r in results]
+    try:
+        inventory.upsert_devices(records)
+    except (sqlite3.Error, OSError) as e:
+        logging.warning("Could not update inventory: %s", e)
+
 # ----------------- Scan Functions -----------------
 
+def probe_host(ip, mac, fingerprints):
+    """
+    Run only the probes the host's fingerprint calls for. Returns the result
+    row and its SSDP replies; known phones, printers and APs cost nothing.
+    """
+    entry, probes = fingerprints.plan(ip, mac)
+    result = {'ip': ip, 'mac': mac, 'class': entry['class'], 'probes': list(probes),
+              'ssdp': False, 'mdns': False, 'adb': False}
+    if not probes:
+        return result, []
+    replies = ssdp_search(ip) if 'ssdp' in probes else []
+    services = mdns_services(ip) if 'mdns' in probes else None
+    result['ssdp'] = bool(replies)
+    result['mdns'] = services is not None
+    result['adb'] = check_adb_port(ip) if 'adb' in probes else False
+    server = next((r.get('server') for r in replies if r.get('server')), None)
+    entry = fingerprints.update(ip, mac, server=server, mdns=services, adb=result['adb'])
+    result['class'] = entry['class']
+    return result, replies
+
+
 def quick_scan_results():
     """Perform a parallel scan of local /24 subnet for ping, SSDP, mDNS, and ADB."""
     local_ip = get_local_ip()
@@ -75,15 +251,19 @@ def quick_scan_results():
     ips = [f"{subnet}.{i}" for i in range(1, 255)]
     with ThreadPoolExecutor(max_workers=50) as executor:
         alive = list(executor.map(ping_ip, ips))
-    results = []
-    for ip, up in zip(ips, alive):
-        if up:
-            results.append({
-                'ip': ip,
-                'ssdp': check_ssdp(ip),
-                'mdns': check_mdns(ip),
-                'adb': check_adb_port(ip)
-            })
+    live = [ip for ip, up in zip(ips, alive) if up]
+    arp = read_arp_table()
+    fingerprints = fingerprint.Fingerprinter()
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        probed = list(executor.map(lambda ip: probe_host(ip, arp.get(ip), fingerprints), live))
+    fingerprints.save()
+    results = [r for r, _ in probed]
+    replies = {r['ip']: rep for r, rep in probed if rep}
+    # Descriptor fetches run concurrently; unchanged devices come from the USN cache.
+    described = ssdp_devices.describe_all(replies)
+    for r in results:
+        r['upnp'] = ssdp_devices.summarize(described.get(r['ip'], []))
+    save_scan_results(results)
     return results
 
 
@@ -108,4 +288,4 @@ if __name__ == '__main__':
         print(json.dumps(output, indent=2))
     else:
         for entry in output:
-            print(f"{entry['ip']}\tSSDP={entry['ssdp']}\tmDNS={entry['mdns']}\tADB={entry['adb']}")
+            print(f"{entry['ip']}\t{entry['class']}\tSSDP={entry['ssdp']}\tmDNS={entry['mdns']}\tADB={entry['adb']}")
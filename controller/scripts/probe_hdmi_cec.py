@@ -3,19 +3,26 @@ import subprocess
 import re
 import json
 import os
+import time
+import hashlib
+import logging
+import sqlite3
 import argparse
 from tkinter import messagebox
 
-# Load vendor lookup from file, or use a default small lookup.
-lookup_file = "vendor_lookup.json"
-if os.path.exists(lookup_file):
-    with open(lookup_file, "r") as f:
-        vendor_lookup = json.load(f)
-else:
-    vendor_lookup = {
-        "6673": "Chromecast",
-        "7173227": "Panasonic"
-    }
+import inventory
+from vendor_index import lookup_vendor
+from adb_session import safe_serial
+
+# Per-device layout cache, keyed by ADB serial.
+LAYOUT_CACHE_DIR = "/data/hdmi_layouts"
+
+# Separates the dumpsys and getprop sections of the combined probe command.
+PROBE_SEPARATOR = "__SUITESTREAM_GETPROP__"
+
+
+class ProbeError(Exception):
+    pass
 
 
 def run_command(cmd):
@@ -92,8 +99,11 @@ def parse_connected_devices(dumpsys_output):
             "port_id":         int(re.search(r"port_id:\s*(-?\d+)", line).group(1)),
             "mac_address":     "Not available"
         }
+        power = re.search(r"power_status:\s*(-?\d+)", line)
+        if power:
+            dev["power_status"] = int(power.group(1))
         vid = dev["vendor_id"]
-        dev["manufacturer"] = vendor_lookup.get(vid, "Unknown")
+        dev["manufacturer"] = lookup_vendor(vid)
         devices.append(dev)
     return devices
 
@@ -136,15 +146,124 @@ def generate_summary(local_device, ports, connected_devices):
     return "\n".join(summary)
 
 
-def scan_cec_layout(device):
-    """Scan HDMI-CEC layout for given ADB device and return summary and JSON."""
-    dumpsys = run_command(f"adb -s {device} shell dumpsys hdmi_control")
+def layout_fingerprint(dumpsys_output, props_raw):
+    """
+    Hash only the parts of the probe output that describe the HDMI topology:
+    the mPortInfo block, the "CEC:" device lines and the hdmi getprop values.
+    Counters and message history elsewhere in dumpsys are ignored.
+    """
+    h = hashlib.sha1()
+    port_block = re.search(r"mPortInfo:\s*((?:\s+port_id:.*\n)+)", dumpsys_output)
+    if port_block:
+        h.update(port_block.group(1).strip().encode())
+    for line in sorted(set(re.findall(r"CEC:\s+(.*?port_id:\s*-?\d+)", dumpsys_output))):
+        h.update(line.encode())
+    for line in sorted(props_raw.splitlines()):
+        h.update(line.strip().encode())
+    return h.hexdigest()
+
+
+def _cache_path(device):
+    return os.path.join(LAYOUT_CACHE_DIR, f"{safe_serial(device)}.json")
+
+
+def load_cached_layout(device):
+    """Return the cached {fingerprint, layout, updated} entry for device, or None."""
+    try:
+        with open(_cache_path(device), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_layout(device, fingerprint, layout):
+    """Atomically store the parsed layout for device."""
+    os.makedirs(LAYOUT_CACHE_DIR, exist_ok=True)
+    path = _cache_path(device)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"fingerprint": fingerprint, "updated": time.time(), "layout": layout}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _device_key(dev):
+    """
+    Stable identity for a CEC device across port moves. The logical address
+    keeps two identical devices (same vendor, type and OSD name) apart.
+    """
+    return f"{dev.get('vendor_id')}:{dev.get('device_type')}:{dev.get('display_name')}:{dev.get('logical_address')}"
+
+
+def diff_layouts(old, new):
+    """
+    Compare two parsed layouts and return a structured diff:
+    added/removed devices, port moves, power changes and port table changes.
+    """
+    old_devs = {_device_key(d): d for d in old.get("connected_devices", [])}
+    new_devs = {_device_key(d): d for d in new.get("connected_devices", [])}
+    diff = {
+        "added": [new_devs[k] for k in new_devs if k not in old_devs],
+        "removed": [old_devs[k] for k in old_devs if k not in new_devs],
+        "moved": [],
+        "power": [],
+        "ports_changed": old.get("ports") != new.get("ports"),
+    }
+    for key in old_devs.keys() & new_devs.keys():
+        before, after = old_devs[key], new_devs[key]
+        if (before["port_id"], before["physical_address"]) != (after["port_id"], after["physical_address"]):
+            diff["moved"].append({
+                "display_name": after["display_name"],
+                "from_port": before["port_id"],
+                "to_port": after["port_id"],
+                "from_physical_address": before["physical_address"],
+                "to_physical_address": after["physical_address"],
+            })
+        if before.get("power_status") != after.get("power_status"):
+            diff["power"].append({
+                "display_name": after["display_name"],
+                "from": before.get("power_status"),
+                "to": after.get("power_status"),
+            })
+    return diff
+
+
+def diff_is_empty(diff):
+    return not (diff["added"] or diff["removed"] or diff["moved"] or diff["power"] or diff["ports_changed"])
+
+
+def scan_cec_layout(device, use_cache=True):
+    """
+    Scan HDMI-CEC layout for given ADB device and return summary and JSON.
+
+    dumpsys and getprop are fetched in a single adb round-trip. When the
+    topology fingerprint matches the cached one, the cached layout is returned
+    without parsing or rewriting anything; otherwise the result carries a
+    "diff" against the previous layout (also with use_cache=False).
+
+    Raises ProbeError, leaving cache and inventory untouched, when adb fails
+    or the device has no hdmi_control service.
+    """
+    raw = run_command(
+        f"adb -s {device} shell 'dumpsys hdmi_control; echo {PROBE_SEPARATOR}; getprop | grep -i hdmi'"
+    )
+    dumpsys, sep, props_raw = raw.partition(PROBE_SEPARATOR)
+    # run_command hands back stderr on failure; never parse that into an
+    # empty layout, or the next good scan reports every device re-added.
+    if not sep or not re.search(r"mPortInfo:|HdmiCecLocalDevice", dumpsys):
+        raise ProbeError(f"no hdmi_control output from {device}: {raw[:200]!r}")
+    fingerprint = layout_fingerprint(dumpsys, props_raw)
+
+    cached = load_cached_layout(device)
+    if use_cache and cached and cached.get("fingerprint") == fingerprint:
+        data = cached["layout"]
+        data["changed"] = False
+        data["diff"] = None
+        return data
+
     ports = parse_port_info(dumpsys)
     local = parse_local_device(dumpsys)
     devices = parse_connected_devices(dumpsys)
-    props_raw = run_command(f"adb -s {device} shell getprop | grep -i hdmi")
-    sys_props = {k:v for line in props_raw.splitlines() if ":" in line
-                 for k,v in [line.replace(']','').split('[:',1)]}
+    sys_props = dict(re.findall(r"^\[(.*?)\]:\s*\[(.*?)\]", props_raw, re.MULTILINE))
     summary = generate_summary(local, ports, devices)
     data = {
         "local_device": local,
@@ -153,8 +272,16 @@ def scan_cec_layout(device):
         "system_properties": sys_props,
         "summary": summary
     }
-    with open("hdmi_layout.json", "w") as f:
-        json.dump(data, f, indent=2)
+    save_cached_layout(device, fingerprint, data)
+    try:
+        inventory.record_hdmi_layout(device, data)
+    except (sqlite3.Error, OSError) as e:
+        logging.warning("Could not record HDMI layout of %s in inventory: %s", device, e)
+
+    data["changed"] = True
+    data["diff"] = diff_layouts(cached["layout"], data) if cached else None
+    if data["diff"] and not diff_is_empty(data["diff"]):
+        logging.warning("HDMI layout changed on %s: %s", device, json.dumps(data["diff"]))
     return data
 
 
@@ -162,9 +289,21 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="HDMI-CEC layout probe CLI")
     parser.add_argument("device", help="ADB target (e.g. 192.168.1.42:5555)")
     parser.add_argument("--json", action="store_true", help="Output full JSON data")
+    parser.add_argument("--force", action="store_true", help="Ignore the cached layout and re-parse")
+    parser.add_argument("--diff", action="store_true", help="Only output the change diff (empty if unchanged)")
+    parser.add_argument("--out", help="Also write the full layout JSON to this file")
     args = parser.parse_args()
-    result = scan_cec_layout(args.device)
-    if args.json:
+    try:
+        result = scan_cec_layout(args.device, use_cache=not args.force)
+    except ProbeError as e:
+        print(json.dumps({"error": str(e)}))
+        raise SystemExit(1)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.diff:
+        print(json.dumps(result.get("diff") or {}, indent=2))
+    elif args.json:
         print(json.dumps(result, indent=2))
     else:
         print(result['summary'])
@@ -1,170 +1,243 @@
 #!/usr/bin/env python3
-import subprocess
 import re
+import sys
 import json
-import os
+import time
+import queue
+import logging
 import argparse
-from tkinter import messagebox
-
-# Load vendor lookup from file, or use a default small lookup.
-lookup_file = "vendor_lookup.json"
-if os.path.exists(lookup_file):
-    with open(lookup_file, "r") as f:
-        vendor_lookup = json.load(f)
-else:
-    vendor_lookup = {
-        "6673": "Chromecast",
-        "7173227": "Panasonic"
-    }
-
-
-def run_command(cmd):
-    """Run a shell command and return its stdout (or stderr on error)."""
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        return e.stderr.strip()
-
+import threading
+from concurrent.futures import Future
+
+from adb_session import get_shell
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+#─── Constants ────────────────────────────────────────────────────────────────
+BATCH_MAX      = 32        # keys sent in one `input keyevent` invocation
+LATENCY_WINDOW = 200       # per-device latency samples kept for reporting
+
+# Friendly names accepted on top of raw KEYCODE_* names / numbers.
+KEY_ALIASES = {
+    "home": "KEYCODE_HOME",
+    "back": "KEYCODE_BACK",
+    "up": "KEYCODE_DPAD_UP",
+    "down": "KEYCODE_DPAD_DOWN",
+    "left": "KEYCODE_DPAD_LEFT",
+    "right": "KEYCODE_DPAD_RIGHT",
+    "ok": "KEYCODE_DPAD_CENTER",
+    "select": "KEYCODE_DPAD_CENTER",
+    "enter": "KEYCODE_ENTER",
+    "menu": "KEYCODE_MENU",
+    "power": "KEYCODE_POWER",
+    "wakeup": "KEYCODE_WAKEUP",
+    "sleep": "KEYCODE_SLEEP",
+    "vol_up": "KEYCODE_VOLUME_UP",
+    "vol_down": "KEYCODE_VOLUME_DOWN",
+    "mute": "KEYCODE_VOLUME_MUTE",
+    "play_pause": "KEYCODE_MEDIA_PLAY_PAUSE",
+    "play": "KEYCODE_MEDIA_PLAY",
+    "pause": "KEYCODE_MEDIA_PAUSE",
+    "stop": "KEYCODE_MEDIA_STOP",
+    "next": "KEYCODE_MEDIA_NEXT",
+    "previous": "KEYCODE_MEDIA_PREVIOUS",
+    "input": "KEYCODE_TV_INPUT",
+    "hdmi1": "KEYCODE_TV_INPUT_HDMI_1",
+    "hdmi2": "KEYCODE_TV_INPUT_HDMI_2",
+    "hdmi3": "KEYCODE_TV_INPUT_HDMI_3",
+    "hdmi4": "KEYCODE_TV_INPUT_HDMI_4",
+    "settings": "KEYCODE_SETTINGS",
+    "search": "KEYCODE_SEARCH",
+}
+
+
+def resolve_key(key):
+    """Map 'vol_up' / 'VOLUME_UP' / 'KEYCODE_VOLUME_UP' / '24' to an input keycode."""
+    k = str(key).strip()
+    if k.isdigit():
+        return k
+    alias = KEY_ALIASES.get(k.lower())
+    if alias:
+        return alias
+    k = k.upper()
+    if not re.fullmatch(r"[A-Z0-9_]+", k):
+        raise ValueError(f"Invalid key name: {key!r}")
+    return k if k.startswith("KEYCODE_") else f"KEYCODE_{k}"
+
+
+def escape_text(text):
+    """Escape text for `input text`: %s for spaces, backslash-escape shell metacharacters."""
+    out = []
+    for ch in text:
+        if ch == " ":
+            out.append("%s")
+        elif ch.isalnum() or ch in "._-,@:/+=":
+            out.append(ch)
+        else:
+            out.append("\\" + ch)
+    return "".join(out)
 
-def parse_port_info(dumpsys_output):
-    """
-    Extracts port information from the mPortInfo block.
-    Returns a list of dictionaries with port_id, type, address, cec, arc, mhl.
-    """
-    ports = []
-    port_block = re.search(r"mPortInfo:\s*((?:\s+port_id:.*\n)+)", dumpsys_output)
-    if port_block:
-        lines = port_block.group(1).strip().splitlines()
-        for line in lines:
-            port_data = {}
-            for part in line.strip().split(","):
-                if ":" in part:
-                    key, val = part.split(":", 1)
-                    port_data[key.strip()] = val.strip()
-            if "port_id" in port_data:
-                try:
-                    port_data["port_id"] = int(port_data["port_id"])
-                except ValueError:
-                    pass
-            for flag in ["cec", "arc", "mhl"]:
-                if flag in port_data:
-                    port_data[flag] = port_data[flag].lower() == "true"
-            ports.append(port_data)
-    return ports
-
-
-def parse_local_device(dumpsys_output):
-    """
-    Extracts local device info from the HdmiCecLocalDevice block.
-    Returns dict with display_name, device_type, logical_address, vendor_id, physical_address, mac_address.
-    """
-    local_dev = {}
-    m = re.search(r"HdmiCecLocalDevice #\d+:\n((?: {4}.*\n)+)", dumpsys_output)
-    if m:
-        block = m.group(1)
-        info = re.search(r"mDeviceInfo:\s*(CEC:.*)", block)
-        if info:
-            line = info.group(1)
-            local_dev["logical_address"] = re.search(r"logical_address:\s*(0x[0-9A-Fa-f]+)", line).group(1)
-            local_dev["device_type"]     = re.search(r"device_type:\s*(\d+)", line).group(1)
-            local_dev["vendor_id"]       = re.search(r"vendor_id:\s*([0-9]+)", line).group(1)
-            local_dev["display_name"]    = re.search(r"display_name:\s*(.*?)\s+power_status:", line).group(1)
-            local_dev["physical_address"] = re.search(r"physical_address:\s*(0x[0-9A-Fa-f]+)", line).group(1)
-            local_dev["mac_address"]     = "Not available"
-    return local_dev
-
-
-def parse_connected_devices(dumpsys_output):
+#─── Remote Engine ────────────────────────────────────────────────────────────
+class RemoteControl:
     """
-    Parses the "CEC:" lines in the dumpsys output.
-    Returns list of devices with logical_address, display_name, device_type, vendor_id, physical_address, port_id, mac_address, manufacturer.
+    Per-device remote: a worker thread drains a command queue over the
+    device's persistent adb shell. Consecutive key presses waiting in the
+    queue (e.g. a held volume button) are coalesced into one batched
+    `input keyevent K K K ...` so a burst costs a single round-trip.
     """
-    devices = []
-    lines = re.findall(r"CEC:\s+(.*?port_id:\s*-?\d+)", dumpsys_output)
-    for line in lines:
-        dev = {
-            "logical_address": re.search(r"logical_address:\s*(0x[0-9A-Fa-f]+)", line).group(1),
-            "display_name":    re.search(r"display_name:\s*(.*?)\s+power_status:", line).group(1),
-            "device_type":     re.search(r"device_type:\s*(\d+)", line).group(1),
-            "vendor_id":       re.search(r"vendor_id:\s*([0-9]+)", line).group(1),
-            "physical_address": re.search(r"physical_address:\s*(0x[0-9A-Fa-f]+)", line).group(1),
-            "port_id":         int(re.search(r"port_id:\s*(-?\d+)", line).group(1)),
-            "mac_address":     "Not available"
-        }
-        vid = dev["vendor_id"]
-        dev["manufacturer"] = vendor_lookup.get(vid, "Unknown")
-        devices.append(dev)
-    return devices
-
-
-def determine_functions(device_type):
-    """Return functions string based on CEC device type."""
-    return {
-        "0": "Power On/Off, Volume, Change Channels",
-        "4": "Power On/Off, Volume"
-    }.get(device_type, "Unknown functions")
-
-
-def generate_summary(local_device, ports, connected_devices):
-    """Build human-readable summary of HDMI layout."""
-    summary = []
-    name = local_device.get("display_name", "This device")
-    summary.append(f"{name} has {len(ports)} HDMI ports detected.")
-    arc = [str(p["port_id"]) for p in ports if p.get("arc")]
-    if arc:
-        summary.append(f"ARC enabled on ports: {', '.join(arc)}.")
-    for p in ports:
-        dev = next((d for d in connected_devices if d["port_id"] == p["port_id"]), None)
-        if dev:
-            funcs = determine_functions(dev["device_type"])
-            summary.append(
-                f"HDMI{p['port_id']} = {dev['display_name']} | Functions: {funcs} | "
-                f"ID: {dev['logical_address']} | Phys Addr: {dev['physical_address']}"
-            )
-        else:
-            summary.append(f"HDMI{p['port_id']} = No device detected.")
-    unassigned = [d for d in connected_devices if d['port_id'] == -1]
-    if unassigned:
-        summary.append("Other detected devices:")
-        for d in unassigned:
-            funcs = determine_functions(d['device_type'])
-            summary.append(
-                f"{d['display_name']} | Functions: {funcs} | "
-                f"ID: {d['logical_address']} | Phys Addr: {d['physical_address']}"
-            )
-    return "\n".join(summary)
-
-
-def scan_cec_layout(device):
-    """Scan HDMI-CEC layout for given ADB device and return summary and JSON."""
-    dumpsys = run_command(f"adb -s {device} shell dumpsys hdmi_control")
-    ports = parse_port_info(dumpsys)
-    local = parse_local_device(dumpsys)
-    devices = parse_connected_devices(dumpsys)
-    props_raw = run_command(f"adb -s {device} shell getprop | grep -i hdmi")
-    sys_props = {k:v for line in props_raw.splitlines() if ":" in line
-                 for k,v in [line.replace(']','').split('[:',1)]}
-    summary = generate_summary(local, ports, devices)
-    data = {
-        "local_device": local,
-        "ports": ports,
-        "connected_devices": devices,
-        "system_properties": sys_props,
-        "summary": summary
-    }
-    with open("hdmi_layout.json", "w") as f:
-        json.dump(data, f, indent=2)
-    return data
 
+    def __init__(self, serial):
+        self.serial = serial
+        self.shell = get_shell(serial)
+        self.latencies = []
+        self._input_cmd = None
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"remote-{serial}", daemon=True)
+        self._worker.start()
+
+    # ── public API: every call returns a Future resolving to a result dict ──
+    def press(self, key):
+        return self._submit("key", resolve_key(key))
+
+    def keys(self, sequence):
+        return [self.press(k) for k in sequence]
+
+    def long_press(self, key):
+        return self._submit("longpress", resolve_key(key))
+
+    def text(self, text):
+        return self._submit("text", text)
+
+    def latency_report(self):
+        samples = sorted(self.latencies)
+        if not samples:
+            return {"serial": self.serial, "count": 0}
+        return {
+            "serial": self.serial,
+            "count": len(samples),
+            "min_ms": round(samples[0], 1),
+            "avg_ms": round(sum(samples) / len(samples), 1),
+            "p95_ms": round(samples[int(0.95 * (len(samples) - 1))], 1),
+            "max_ms": round(samples[-1], 1),
+        }
 
+    # ── internals ──
+    def _submit(self, kind, arg):
+        fut = Future()
+        self._queue.put((kind, arg, fut, time.monotonic()))
+        return fut
+
+    def _input(self):
+        """`cmd input` talks to the input service directly (Android 12+); plain
+        `input` starts a JVM per call, so only fall back to it when needed.
+        Probed via its usage text so no key event reaches the TV."""
+        if self._input_cmd is None:
+            rc, out, _ = self.shell.run("cmd input 2>&1 | head -n 3")
+            self._input_cmd = "cmd input" if rc == 0 and "usage" in out.lower() else "input"
+            logging.info("%s: using '%s' for key injection", self.serial, self._input_cmd)
+        return self._input_cmd
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            if batch[0][0] == "key":
+                while len(batch) < BATCH_MAX:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt[0] != "key":
+                        self._execute(batch)
+                        batch = [nxt]
+                        break
+                    batch.append(nxt)
+            self._execute(batch)
+
+    def _execute(self, batch):
+        kind = batch[0][0]
+        try:
+            if kind == "key":
+                command = f"{self._input()} keyevent " + " ".join(item[1] for item in batch)
+            elif kind == "longpress":
+                command = f"{self._input()} keyevent --longpress {batch[0][1]}"
+            else:
+                command = f"{self._input()} text {escape_text(batch[0][1])}"
+            rc, out, exec_ms = self.shell.run(command)
+        except Exception as e:
+            for _, _, fut, _ in batch:
+                fut.set_exception(e)
+            return
+        done = time.monotonic()
+        for _, arg, fut, queued in batch:
+            latency = (done - queued) * 1000
+            self.latencies.append(latency)
+            fut.set_result({
+                "serial": self.serial,
+                "command": kind,
+                "arg": arg,
+                "ok": rc == 0,
+                "output": out,
+                "batched": len(batch),
+                "exec_ms": round(exec_ms, 1),
+                "latency_ms": round(latency, 1),
+            })
+        del self.latencies[:-LATENCY_WINDOW]
+
+
+_remotes = {}
+_remotes_lock = threading.Lock()
+
+
+def get_remote(serial):
+    """Return the shared RemoteControl for serial."""
+    with _remotes_lock:
+        if serial not in _remotes:
+            _remotes[serial] = RemoteControl(serial)
+        return _remotes[serial]
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="HDMI-CEC layout probe CLI")
+    # --json is accepted before or after the subcommand.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", default=argparse.SUPPRESS,
+                        help="Output per-command results as JSON")
+    parser = argparse.ArgumentParser(description="Low-latency ADB remote control", parents=[common])
     parser.add_argument("device", help="ADB target (e.g. 192.168.1.42:5555)")
-    parser.add_argument("--json", action="store_true", help="Output full JSON data")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    key_p = sub.add_parser("key", help="Press one or more keys (sent as one batch)", parents=[common])
+    key_p.add_argument("keys", nargs="+", help="e.g. home, up, vol_up, KEYCODE_TV_INPUT_HDMI_2, 24")
+    rep_p = sub.add_parser("repeat", help="Press a key N times (e.g. volume hold)", parents=[common])
+    rep_p.add_argument("key")
+    rep_p.add_argument("count", type=int)
+    long_p = sub.add_parser("longpress", help="Long-press a key", parents=[common])
+    long_p.add_argument("key")
+    text_p = sub.add_parser("text", help="Type text into the focused field", parents=[common])
+    text_p.add_argument("text")
     args = parser.parse_args()
-    result = scan_cec_layout(args.device)
+    args.json = getattr(args, "json", False)
+
+    remote = get_remote(args.device)
+    try:
+        if args.cmd == "key":
+            futures = remote.keys(args.keys)
+        elif args.cmd == "repeat":
+            futures = remote.keys([args.key] * args.count)
+        elif args.cmd == "longpress":
+            futures = [remote.long_press(args.key)]
+        else:
+            futures = [remote.text(args.text)]
+        results = [f.result() for f in futures]
+    except (ValueError, TimeoutError, ConnectionError) as e:
+        logging.error("%s failed: %s", args.cmd, e)
+        sys.exit(1)
+
     if args.json:
-        print(json.dumps(result, indent=2))
+        print(json.dumps({"results": results, "latency": remote.latency_report()}, indent=2))
     else:
-        print(result['summary'])
+        for r in results:
+            print(f"{r['command']}\t{r['arg']}\t{'ok' if r['ok'] else 'FAILED'}\t{r['latency_ms']} ms")
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
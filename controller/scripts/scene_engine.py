@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, TimeoutError as FutureTimeout
+
+import castv2
+import cec_adapter
+from adb_session import get_shell
+from app_controls import launch_app, stop_app
+from remote_control import get_remote
+
+#─── Constants ────────────────────────────────────────────────────────────────
+SCENES_DIR      = "/data/scenes"
+DEFAULT_TIMEOUT = 15        # seconds per attempt
+DEFAULT_RETRIES = 1
+RETRY_DELAY     = 1.0
+MAX_WORKERS     = 32        # step attempts in flight across all targets
+
+
+class SceneError(Exception):
+    pass
+
+#─── Device Handles ───────────────────────────────────────────────────────────
+class Devices:
+    """
+    Shared per-run handles: CEC controllers per adapter node and one Cast v2
+    pool on a background event loop, so every cast step multiplexes over
+    the same loop instead of a thread per receiver.
+    """
+
+    def __init__(self, simulate_cec=False):
+        self.simulate_cec = simulate_cec
+        self._cec = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pool = None
+
+    def cec(self, device):
+        with self._lock:
+            if device not in self._cec:
+                self._cec[device] = cec_adapter.open_controller(device or cec_adapter.DEFAULT_DEVICE,
+                                                                simulate=self.simulate_cec)
+            return self._cec[device]
+
+    def cast(self, name, method, *args, timeout=None):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="scene-cast", daemon=True).start()
+                self._pool = castv2.CastPool()
+        target = castv2.resolve(name)
+        if target is None:
+            raise SceneError(f"unknown Cast receiver {name!r}")
+
+        async def call():
+            conn = await self._pool.get(target[0], target[1], name)
+            return await getattr(conn, method)(*args)
+        fut = asyncio.run_coroutine_threadsafe(call(), self._loop)
+        try:
+            return fut.result(timeout)
+        except FutureTimeout:
+            fut.cancel()
+            raise
+
+    def close(self):
+        for ctl in self._cec.values():
+            ctl.scheduler.close()
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._pool.close(), self._loop).result(5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+#─── Actions ──────────────────────────────────────────────────────────────────
+# name → (address kind the target must provide, function(devices, address, args, timeout))
+def _key(devices, serial, args, timeout):
+    keys = args["keys"] if "keys" in args else [args["key"]]
+    results = [f.result(timeout) for f in get_remote(serial).keys(keys)]
+    if not all(r["ok"] for r in results):
+        raise SceneError(f"key injection failed: {results[-1]['output']}")
+    return {"keys": len(results), "latency_ms": results[-1]["latency_ms"]}
+
+
+def _text(devices, serial, args, timeout):
+    result = get_remote(serial).text(args["text"]).result(timeout)
+    if not result["ok"]:
+        raise SceneError(f"text input failed: {result['output']}")
+    return {"latency_ms": result["latency_ms"]}
+
+
+def _shell(devices, serial, args, timeout):
+    rc, out, ms = get_shell(serial).run(args["command"], timeout=timeout)
+    if rc != 0 and not args.get("ignore_errors"):
+        raise SceneError(f"exit {rc}: {out.strip()[-200:]}")
+    return {"rc": rc, "output": out[-500:], "exec_ms": round(ms, 1)}
+
+
+def _cec_input(ctl, args):
+    port = args.get("port")
+    return ctl.set_input(f"0x{int(port):X}000" if port is not None else args["physical_address"])
+
+
+def _cast(method, *arg_names):
+    def run(devices, name, args, timeout):
+        return devices.cast(name, method, *(args[a] for a in arg_names), timeout=timeout)
+    return run
+
+
+def _cast_load(devices, name, args, timeout):
+    return devices.cast(name, "load", args["url"], args.get("type", "video/mp4"), timeout=timeout)
+
+
+ACTIONS = {
+    "key":          ("adb",  _key),
+    "text":         ("adb",  _text),
+    "shell":        ("adb",  _shell),
+    "app.launch":   ("adb",  lambda d, s, a, t: launch_app(s, a["package"])),
+    "app.stop":     ("adb",  lambda d, s, a, t: stop_app(s, a["package"])),
+    "cec.on":       ("cec",  lambda d, c, a, t: d.cec(c).power_on(a.get("dest", cec_adapter.LA_TV))),
+    "cec.standby":  ("cec",  lambda d, c, a, t: d.cec(c).standby(a.get("dest", cec_adapter.LA_BROADCAST))),
+    "cec.active":   ("cec",  lambda d, c, a, t: d.cec(c).active_source()),
+    "cec.input":    ("cec",  lambda d, c, a, t: _cec_input(d.cec(c), a)),
+    "cast.load":    ("cast", _cast_load),
+    "cast.play":    ("cast", _cast("play")),
+    "cast.pause":   ("cast", _cast("pause")),
+    "cast.stop":    ("cast", _cast("stop")),
+    "cast.seek":    ("cast", _cast("seek", "seconds")),
+    "cast.volume":  ("cast", _cast("set_volume", "level")),
+    "cast.mute":    ("cast", lambda d, n, a, t: d.cast(n, "set_muted", a.get("muted", True), timeout=t)),
+    "wait":         (None,   lambda d, _, a, t: time.sleep(a.get("seconds", 1))),
+}
+
+#─── Scene Model ──────────────────────────────────────────────────────────────
+class Node:
+    """One step applied to one target."""
+
+    def __init__(self, step, target):
+        self.step = step
+        self.target = target
+        self.id = f"{step['id']}@{target}" if target else step["id"]
+        self.deps = set()
+        self.dependents = set()
+        self.status = "pending"
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.ready_at = self.started = self.ended = None
+        self.settled = None     # when the last attempt really finished (may be after `ended`)
+
+    def report(self, t0):
+        rel = lambda t: round((t - t0) * 1000, 1) if t is not None else None
+        return {
+            "node": self.id,
+            "step": self.step["id"],
+            "target": self.target,
+            "status": self.status,
+            "attempts": self.attempts,
+            "ready_ms": rel(self.ready_at),
+            "start_ms": rel(self.started),
+            "end_ms": rel(self.ended),
+            "settled_ms": rel(self.settled),
+            "duration_ms": round((self.ended - self.started) * 1000, 1) if self.started and self.ended else None,
+            "error": self.error,
+        }
+
+
+def load_scene(ref):
+    """Load a scene from a path or by name from /data/scenes."""
+    path = ref if os.path.exists(ref) else os.path.join(SCENES_DIR, f"{ref}.json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise SceneError(f"cannot load scene {ref!r}: {e}")
+
+
+def _address(scene, target, kind):
+    entry = scene.get("targets", {}).get(target, target)
+    if isinstance(entry, dict):
+        if kind not in entry:
+            raise SceneError(f"target {target!r} has no {kind} address")
+        return entry[kind]
+    return entry
+
+
+def build_graph(scene):
+    """
+    Expand steps × targets into nodes and wire dependencies. A step that
+    depends on another step with the same target waits only for that
+    target's node, so each room/device proceeds independently.
+    """
+    steps = scene.get("steps", [])
+    by_id = {}
+    for step in steps:
+        if "id" not in step or "action" not in step:
+            raise SceneError(f"step needs an id and an action: {step}")
+        if step["id"] in by_id:
+            raise SceneError(f"duplicate step id {step['id']!r}")
+        if step["action"] not in ACTIONS:
+            raise SceneError(f"unknown action {step['action']!r} in step {step['id']!r}")
+        by_id[step["id"]] = step
+    nodes, per_step = {}, {}
+    for step in steps:
+        kind = ACTIONS[step["action"]][0]
+        targets = step.get("targets") or (scene.get("default_targets", []) if kind else [None])
+        if kind and not targets:
+            raise SceneError(f"step {step['id']!r} has no targets")
+        for target in targets:
+            if kind:
+                _address(scene, target, kind)
+            node = Node(step, target)
+            nodes[node.id] = node
+            per_step.setdefault(step["id"], []).append(node)
+    for node in nodes.values():
+        for dep in node.step.get("after", []):
+            if dep not in by_id:
+                raise SceneError(f"step {node.step['id']!r} depends on unknown step {dep!r}")
+            same = [n for n in per_step[dep] if n.target == node.target and node.target is not None]
+            for d in same or per_step[dep]:
+                node.deps.add(d.id)
+                d.dependents.add(node.id)
+    # Kahn's algorithm: anything left over sits on a cycle.
+    indeg = {n: len(node.deps) for n, node in nodes.items()}
+    ready = [n for n, d in indeg.items() if d == 0]
+    seen = 0
+    while ready:
+        n = ready.pop()
+        seen += 1
+        for m in nodes[n].dependents:
+            indeg[m] -= 1
+            if indeg[m] == 0:
+                ready.append(m)
+    if seen != len(nodes):
+        raise SceneError("dependency cycle among: " + ", ".join(sorted(n for n, d in indeg.items() if d)))
+    return nodes
+
+#─── Execution ────────────────────────────────────────────────────────────────
+class SceneRunner:
+    """Runs a scene's DAG: every node starts as soon as its own prerequisites succeed."""
+
+    def __init__(self, scene, devices=None, workers=MAX_WORKERS, dry_run=False):
+        self.scene = scene
+        self.nodes = build_graph(scene)
+        self.devices = devices or Devices()
+        self.workers = workers
+        self.dry_run = dry_run
+        defaults = scene.get("defaults", {})
+        self.timeout = defaults.get("timeout", DEFAULT_TIMEOUT)
+        self.retries = defaults.get("retries", DEFAULT_RETRIES)
+        self.retry_delay = defaults.get("retry_delay", RETRY_DELAY)
+
+    def _execute(self, node, executor):
+        step = node.step
+        kind, func = ACTIONS[step["action"]]
+        address = _address(self.scene, node.target, kind) if kind else None
+        timeout = step.get("timeout", self.timeout)
+        retries = step.get("retries", self.retries)
+        args = step.get("args", {})
+        node.started = time.monotonic()
+        fut = None
+        for attempt in range(1, retries + 2):
+            node.attempts = attempt
+            if self.dry_run:
+                node.result = {"dry_run": True, "address": address}
+                break
+            # The attempt runs on its own worker so the node can fail at the
+            # deadline; the attempt itself keeps running until it returns.
+            fut = executor.submit(func, self.devices, address, args, timeout)
+            try:
+                node.result = fut.result(timeout)
+                node.error = None
+                break
+            except FutureTimeout:
+                node.error = f"timed out after {timeout}s"
+            except Exception as e:
+                node.error = str(e) or type(e).__name__
+            logging.warning("%s attempt %d failed: %s", node.id, attempt, node.error)
+            if attempt <= retries:
+                delay = step.get("retry_delay", self.retry_delay)
+                waited = time.monotonic()
+                wait([fut], timeout=delay)
+                if not fut.done():
+                    # Retrying now would overlap the stuck attempt on the same
+                    # device and could repeat a key press or CEC command.
+                    node.error += "; previous attempt still running, not retried"
+                    break
+                time.sleep(max(0.0, delay - (time.monotonic() - waited)))
+        node.ended = time.monotonic()
+        node.status = "ok" if node.error is None else "failed"
+        if fut is None:
+            node.settled = node.ended
+        else:
+            fut.add_done_callback(lambda _: setattr(node, "settled", time.monotonic()))
+        return node
+
+    def run(self):
+        t0 = time.monotonic()
+        remaining = {n: len(node.deps) for n, node in self.nodes.items()}
+        # Two pools: one schedules nodes (waiting on deadlines), one runs attempts.
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scene-node") as node_pool, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scene-step") as step_pool:
+            running = set()
+
+            def launch(node):
+                node.ready_at = time.monotonic()
+                node.status = "running"
+                running.add(node_pool.submit(self._execute, node, step_pool))
+
+            for n, count in remaining.items():
+                if count == 0:
+                    launch(self.nodes[n])
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    node = fut.result()
+                    logging.info("%s %s in %.0f ms", node.id, node.status, (node.ended - node.started) * 1000)
+                    for m in node.dependents:
+                        dependent = self.nodes[m]
+                        if node.status != "ok":
+                            self._skip(dependent, node.id)
+                            continue
+                        remaining[m] -= 1
+                        if remaining[m] == 0 and dependent.status == "pending":
+                            launch(dependent)
+        return self.report(t0)
+
+    def _skip(self, node, cause):
+        if node.status != "pending":
+            return
+        node.status, node.error = "skipped", f"prerequisite {cause} did not succeed"
+        for m in node.dependents:
+            self._skip(self.nodes[m], node.id)
+
+    def report(self, t0):
+        nodes = [n.report(t0) for n in sorted(self.nodes.values(), key=lambda n: (n.started or 1e18, n.id))]
+        steps = {}
+        for n in self.nodes.values():
+            s = steps.setdefault(n.step["id"], {"nodes": 0, "ok": 0, "max_ms": 0.0})
+            s["nodes"] += 1
+            s["ok"] += n.status == "ok"
+            if n.started and n.ended:
+                s["max_ms"] = max(s["max_ms"], round((n.ended - n.started) * 1000, 1))
+        # Abandoned attempts hold the scene open too (the step pool waits for
+        # them), so the wall time runs to the last one that settled.
+        end = max((max(n.ended, n.settled or n.ended) for n in self.nodes.values() if n.ended), default=t0)
+        return {
+            "scene": self.scene.get("name"),
+            "ok": all(n.status == "ok" for n in self.nodes.values()),
+            "wall_ms": round((end - t0) * 1000, 1),
+            "serial_ms": round(sum((n.ended - n.started) * 1000 for n in self.nodes.values()
+                                   if n.started and n.ended), 1),
+            "steps": steps,
+            "nodes": nodes,
+        }
+
+
+def run_scene(ref, dry_run=False, simulate_cec=False):
+    scene = load_scene(ref) if isinstance(ref, str) else ref
+    devices = Devices(simulate_cec)
+    try:
+        return SceneRunner(scene, devices, dry_run=dry_run).run()
+    finally:
+        devices.close()
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    parser = argparse.ArgumentParser(description="Run declarative multi-device scenes as a dependency graph")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run_p = sub.add_parser("run", help="Execute a scene")
+    run_p.add_argument("scene", help="Scene JSON file or name under /data/scenes")
+    run_p.add_argument("--dry-run", action="store_true", help="Walk the graph without touching devices")
+    run_p.add_argument("--simulate-cec", action="store_true", help="Use the simulated CEC bus")
+    plan_p = sub.add_parser("plan", help="Validate a scene and print its nodes and prerequisites")
+    plan_p.add_argument("scene")
+    sub.add_parser("actions", help="List available actions")
+    args = parser.parse_args()
+
+    try:
+        if args.cmd == "actions":
+            result = {name: kind for name, (kind, _) in sorted(ACTIONS.items())}
+        elif args.cmd == "plan":
+            nodes = build_graph(load_scene(args.scene))
+            result = {n: sorted(node.deps) for n, node in nodes.items()}
+        else:
+            result = run_scene(args.scene, args.dry_run, args.simulate_cec)
+    except SceneError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    print(json.dumps(result, indent=2, default=str))
+    sys.exit(0 if args.cmd != "run" or result["ok"] else 1)
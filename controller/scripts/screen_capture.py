@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from adb_session import adb_exec_out, safe_serial, AdbError
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+#─── Constants ────────────────────────────────────────────────────────────────
+SCREENS_DIR      = "/data/screens"
+RING_SIZE        = 30       # thumbnails kept per device
+THUMB_WIDTH      = 320
+HASH_THRESHOLD   = 6        # dHash bits that must differ to count as a new frame
+MAX_CONCURRENT   = 4        # captures in flight across all devices
+CAPTURE_INTERVAL = 10       # seconds between captures of the same device
+CAPTURE_TIMEOUT  = 15
+
+# android.graphics.PixelFormat values screencap may emit
+PIXEL_RGBA_8888 = 1
+PIXEL_RGBX_8888 = 2
+PIXEL_RGB_888   = 3
+PIXEL_RGB_565   = 4
+BYTES_PER_PIXEL = {PIXEL_RGBA_8888: 4, PIXEL_RGBX_8888: 4, PIXEL_RGB_888: 3, PIXEL_RGB_565: 2}
+
+#─── Frame Decoding ───────────────────────────────────────────────────────────
+def decode_raw_frame(data):
+    """
+    Decode `screencap` raw output (12-byte header, or 16 bytes with the
+    colour space on Android 9+) into an HxWx3 uint8 RGB array view.
+    """
+    if len(data) < 12:
+        raise ValueError(f"screencap returned {len(data)} bytes")
+    width, height, fmt = struct.unpack_from("<III", data, 0)
+    bpp = BYTES_PER_PIXEL.get(fmt)
+    if bpp is None:
+        raise ValueError(f"unsupported pixel format {fmt}")
+    header = len(data) - width * height * bpp
+    if header not in (12, 16):
+        raise ValueError(f"unexpected screencap size for {width}x{height} fmt {fmt}")
+    pixels = np.frombuffer(data, dtype=np.uint8, offset=header)
+    if bpp == 2:
+        v = pixels.view("<u2").reshape(height, width)
+        rgb = np.empty((height, width, 3), dtype=np.uint8)
+        rgb[..., 0] = (v >> 11).astype(np.uint8) << 3
+        rgb[..., 1] = ((v >> 5) & 0x3F).astype(np.uint8) << 2
+        rgb[..., 2] = (v & 0x1F).astype(np.uint8) << 3
+        return rgb
+    return pixels.reshape(height, width, bpp)[..., :3]
+
+
+def downscale(rgb, width=THUMB_WIDTH):
+    """Box-filter downscale to `width` pixels wide (integer factor, no copies of the full frame)."""
+    h, w, _ = rgb.shape
+    factor = max(1, w // width)
+    h2, w2 = h // factor, w // factor
+    blocks = rgb[:h2 * factor, :w2 * factor].reshape(h2, factor, w2, factor, 3)
+    return blocks.mean(axis=(1, 3), dtype=np.float32).astype(np.uint8)
+
+
+def dhash(rgb, size=8):
+    """64-bit difference hash of an RGB image."""
+    gray = rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    h, w = gray.shape
+    ys = (np.arange(size) * h // size)
+    xs = (np.arange(size + 1) * w // (size + 1))
+    small = gray[np.ix_(ys, xs)]
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def encode_png(rgb):
+    """Minimal PNG encoder for small RGB thumbnails."""
+    h, w, _ = rgb.shape
+    raw = b"".join(b"\x00" + rgb[y].tobytes() for y in range(h))
+
+    def chunk(tag, body):
+        return struct.pack(">I", len(body)) + tag + body + struct.pack(">I", zlib.crc32(tag + body) & 0xFFFFFFFF)
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b""))
+
+#─── Thumbnail Ring ───────────────────────────────────────────────────────────
+class ThumbnailRing:
+    """Fixed number of thumbnail slots per device, with an index of what's in them."""
+
+    def __init__(self, serial, size=RING_SIZE, root=None):
+        self.dir = os.path.join(root or SCREENS_DIR, safe_serial(serial))
+        self.size = size
+        self.index_path = os.path.join(self.dir, "index.json")
+        os.makedirs(self.dir, exist_ok=True)
+        try:
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {"next": 0, "entries": []}
+
+    @property
+    def last_hash(self):
+        return int(self.index["entries"][-1]["hash"], 16) if self.index["entries"] else None
+
+    def add(self, png, frame_hash, ts):
+        slot = self.index["next"] % self.size
+        name = f"{slot:03d}.png"
+        tmp = os.path.join(self.dir, f".{name}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(png)
+        os.replace(tmp, os.path.join(self.dir, name))
+        entries = [e for e in self.index["entries"] if e["file"] != name]
+        entries.append({"file": name, "ts": ts, "hash": f"{frame_hash:016x}"})
+        self.index = {"next": slot + 1, "entries": entries[-self.size:]}
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+        return os.path.join(self.dir, name)
+
+#─── Capture Pipeline ─────────────────────────────────────────────────────────
+def grab_frame(serial, compress=False, timeout=CAPTURE_TIMEOUT):
+    """
+    Pull one raw frame through the adb server's existing transport.
+    compress=True gzips on the device, trading TV CPU for ~10x less LAN traffic.
+    """
+    if compress:
+        data = adb_exec_out(serial, "screencap | gzip -1", timeout)
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    return adb_exec_out(serial, "screencap", timeout)
+
+
+class ScreenMonitor:
+    """
+    Captures many devices on an interval with a global concurrency cap.
+    Frames within HASH_THRESHOLD bits of the previous stored frame are skipped.
+    """
+
+    def __init__(self, serials, max_concurrent=MAX_CONCURRENT, threshold=HASH_THRESHOLD,
+                 compress=False, ring_size=RING_SIZE):
+        self.serials = list(serials)
+        self.threshold = threshold
+        self.compress = compress
+        self.rings = {s: ThumbnailRing(s, ring_size) for s in self.serials}
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent)
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def capture(self, serial):
+        """Capture one device now; returns a result dict."""
+        start = time.monotonic()
+        try:
+            data = grab_frame(serial, self.compress)
+            pulled = time.monotonic()
+            thumb = downscale(decode_raw_frame(data))
+        except (OSError, AdbError, ValueError, zlib.error) as e:
+            return {"serial": serial, "error": str(e)}
+        frame_hash = dhash(thumb)
+        ring = self.rings[serial]
+        prev = ring.last_hash
+        distance = hamming(prev, frame_hash) if prev is not None else None
+        result = {
+            "serial": serial,
+            "hash": f"{frame_hash:016x}",
+            "distance": distance,
+            "bytes": len(data),
+            "pull_ms": round((pulled - start) * 1000, 1),
+            "total_ms": None,
+            "stored": None,
+        }
+        if distance is None or distance > self.threshold:
+            result["stored"] = ring.add(encode_png(thumb), frame_hash, time.time())
+        result["total_ms"] = round((time.monotonic() - start) * 1000, 1)
+        return result
+
+    def capture_all(self):
+        """Capture every device once (bounded by the concurrency cap)."""
+        return list(self._executor.map(self.capture, self.serials))
+
+    def _capture_guarded(self, serial, on_result):
+        try:
+            result = self.capture(serial)
+            if on_result:
+                on_result(result)
+        finally:
+            with self._lock:
+                self._busy.discard(serial)
+
+    def run(self, interval=CAPTURE_INTERVAL, on_result=None):
+        """Capture every device each `interval`, never overlapping captures of one device."""
+        while True:
+            tick = time.monotonic()
+            for serial in self.serials:
+                with self._lock:
+                    if serial in self._busy:
+                        continue
+                    self._busy.add(serial)
+                self._executor.submit(self._capture_guarded, serial, on_result)
+            time.sleep(max(0.0, interval - (time.monotonic() - tick)))
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Screen-capture monitor for ADB displays")
+    parser.add_argument("devices", nargs="+", help="ADB targets (e.g. 192.168.1.42:5555)")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="Capture every N seconds (0 = capture once and exit)")
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT)
+    parser.add_argument("--threshold", type=int, default=HASH_THRESHOLD,
+                        help="Minimum dHash distance to store a new thumbnail")
+    parser.add_argument("--compress", action="store_true", help="gzip frames on the device")
+    args = parser.parse_args()
+
+    monitor = ScreenMonitor(args.devices, args.max_concurrent, args.threshold, args.compress)
+    if not args.interval:
+        results = monitor.capture_all()
+        print(json.dumps(results, indent=2))
+        sys.exit(1 if any("error" in r for r in results) else 0)
+    try:
+        monitor.run(args.interval, on_result=lambda r: print(json.dumps(r), flush=True))
+    except KeyboardInterrupt:
+        sys.exit(0)
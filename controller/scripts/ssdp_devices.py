@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import http.client
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse, urljoin
+from concurrent.futures import ThreadPoolExecutor
+
+from net_timeouts import get_controller
+from json_state import save_json
+
+#─── Constants ────────────────────────────────────────────────────────────────
+SSDP_CACHE       = "/data/ssdp_cache.json"
+SSDP_ADDR        = ("239.255.255.250", 1900)
+CACHE_MAX_AGE    = 24 * 3600    # re-fetch UPnP 1.0 devices (no BOOTID/CONFIGID) after this
+HOST_BUDGET      = 3.0          # seconds of fetching allowed per host per scan
+HOST_MAX_FETCHES = 4            # descriptors fetched per host per scan
+MAX_DESC_BYTES   = 256 * 1024
+FETCH_WORKERS    = 16
+READ_CHUNK       = 4096
+
+DEVICE_FIELDS = ("deviceType", "friendlyName", "manufacturer", "modelName", "modelNumber",
+                 "modelDescription", "serialNumber", "UDN", "presentationURL")
+
+#─── SSDP Responses ───────────────────────────────────────────────────────────
+def msearch_request(st="ssdp:all", mx=1, host="239.255.255.250:1900"):
+    return (f"M-SEARCH * HTTP/1.1\r\nHOST: {host}\r\nMAN: \"ssdp:discover\"\r\n"
+            f"MX: {mx}\r\nST: {st}\r\n\r\n").encode()
+
+
+def parse_response(data):
+    """Parse an SSDP reply/NOTIFY into a dict of lower-cased headers, or None."""
+    try:
+        text = data.decode("utf-8", "replace")
+    except AttributeError:
+        text = data
+    lines = text.split("\r\n") if "\r\n" in text else text.split("\n")
+    if not lines or not (lines[0].startswith("HTTP/1.1 200") or lines[0].startswith("NOTIFY")):
+        return None
+    headers = {}
+    for line in lines[1:]:
+        key, sep, value = line.partition(":")
+        if sep:
+            headers[key.strip().lower()] = value.strip()
+    return headers if "location" in headers else None
+
+
+def usn_root(usn):
+    """'uuid:abc::urn:…:MediaRenderer:1' → 'uuid:abc'."""
+    return (usn or "").split("::", 1)[0]
+
+
+def unicast_search(ip, timeout, linger=0.15):
+    """
+    Send one unicast M-SEARCH and collect every reply that arrives within
+    `linger` of the previous one. Returns a list of header dicts (empty if
+    the host answered without LOCATION), or None on timeout. Only the first
+    reply's latency feeds the RTT estimate.
+    """
+    replies, answered = [], False
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.settimeout(timeout)
+        try:
+            start = time.monotonic()
+            s.sendto(msearch_request(host=f"{ip}:1900"), (ip, 1900))
+            data = s.recv(4096)
+            get_controller().record_elapsed(ip, "ssdp", time.monotonic() - start)
+            answered = True
+            s.settimeout(linger)
+            while True:
+                headers = parse_response(data)
+                if headers:
+                    replies.append(headers)
+                data = s.recv(4096)
+        except socket.timeout:
+            pass
+        except OSError:
+            return replies
+    return replies if answered else None
+
+
+def multicast_search(timeout=3.0, st="ssdp:all", mx=2):
+    """Multicast M-SEARCH; returns {ip: [header dicts]} for everything that answered."""
+    found = {}
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as s:
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        s.settimeout(0.5)
+        s.sendto(msearch_request(st, mx), SSDP_ADDR)
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            try:
+                data, (ip, _) = s.recvfrom(4096)
+            except socket.timeout:
+                continue
+            headers = parse_response(data)
+            if headers:
+                found.setdefault(ip, []).append(headers)
+    return found
+
+#─── Descriptor Parsing ───────────────────────────────────────────────────────
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+class DescriptionParser:
+    """
+    Incremental UPnP device-description parser (XMLPullParser): feed() chunks
+    as they arrive, then result(). Collects the root device's identity and
+    the service types of the root and all embedded devices.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack = []
+        self.device = {}
+        self.services = []
+        self.device_types = []
+        self.url_base = None
+        self._depth_devices = 0
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+        for event, elem in self._parser.read_events():
+            name = _local(elem.tag)
+            if event == "start":
+                self._stack.append(name)
+                if name == "device":
+                    self._depth_devices += 1
+                continue
+            self._stack.pop()
+            text = (elem.text or "").strip()
+            parent = self._stack[-1] if self._stack else None
+            if name == "device":
+                self._depth_devices -= 1
+            elif name == "URLBase":
+                self.url_base = text
+            elif parent == "device" and name in DEVICE_FIELDS:
+                if name == "deviceType" and text:
+                    self.device_types.append(text)
+                if self._depth_devices == 1:
+                    self.device.setdefault(name, text)
+            elif name == "serviceType" and text:
+                self.services.append(text)
+            if name in ("service", "icon"):
+                elem.clear()
+
+    def result(self):
+        self._parser.close()
+        return {
+            "device": self.device,
+            "device_types": self.device_types,
+            "services": sorted(set(self.services)),
+            "url_base": self.url_base,
+        }
+
+#─── Pooled Fetching ──────────────────────────────────────────────────────────
+class HostFetcher:
+    """
+    Fetches descriptors from one host over a single keep-alive connection per
+    port, within a time and request budget.
+    """
+
+    def __init__(self, host, budget=HOST_BUDGET, max_fetches=HOST_MAX_FETCHES):
+        self.host = host
+        self.deadline = time.monotonic() + budget
+        self.remaining = max_fetches
+        self.conns = {}
+
+    def _conn(self, port, timeout):
+        conn = self.conns.get(port)
+        if conn is None:
+            conn = self.conns[port] = http.client.HTTPConnection(self.host, port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def fetch(self, url):
+        """Return (description dict, response headers) or raise OSError / budget errors."""
+        if self.remaining <= 0:
+            raise TimeoutError("per-host fetch budget exhausted")
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError("per-host time budget exhausted")
+        self.remaining -= 1
+        u = urlparse(url)
+        timeout = min(left, get_controller().timeout(self.host, "http"))
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        for attempt in (1, 2):
+            conn = self._conn(u.port or 80, timeout)
+            start = time.monotonic()
+            try:
+                conn.request("GET", path, headers={"Connection": "keep-alive", "User-Agent": "suitestream-scan"})
+                resp = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # Stale keep-alive connection; reconnect once.
+                conn.close()
+                if attempt == 2:
+                    raise
+        if resp.status != 200:
+            resp.read()
+            raise OSError(f"HTTP {resp.status} for {url}")
+        parser = DescriptionParser()
+        size = 0
+        while True:
+            chunk = resp.read(READ_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_DESC_BYTES:
+                conn.close()
+                raise OSError(f"descriptor at {url} exceeds {MAX_DESC_BYTES} bytes")
+            parser.feed(chunk)
+        get_controller().record_elapsed(self.host, "http", time.monotonic() - start)
+        try:
+            desc = parser.result()
+        except ET.ParseError as e:
+            raise OSError(f"bad XML at {url}: {e}")
+        return desc, {k.lower(): v for k, v in resp.getheaders()}
+
+    def close(self):
+        for conn in self.conns.values():
+            conn.close()
+
+#─── USN-Keyed Cache ──────────────────────────────────────────────────────────
+class DescriptionCache:
+    """
+    /data/ssdp_cache.json, keyed by USN root (uuid:…). An entry is reused
+    while LOCATION, BOOTID.UPNP.ORG and CONFIGID.UPNP.ORG are unchanged; devices
+    that send neither ID are re-fetched after CACHE_MAX_AGE.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or SSDP_CACHE
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, reply):
+        entry = self.entries.get(usn_root(reply.get("usn")) or None)
+        if not entry or entry.get("location") != reply.get("location"):
+            return None
+        bootid, configid = reply.get("bootid.upnp.org"), reply.get("configid.upnp.org")
+        if bootid or configid:
+            if entry.get("bootid") == bootid and entry.get("configid") == configid:
+                return entry
+            return None
+        return entry if time.time() - entry.get("fetched", 0) < CACHE_MAX_AGE else None
+
+    def put(self, reply, identity):
+        entry = dict(identity, location=reply.get("location"), bootid=reply.get("bootid.upnp.org"),
+                     configid=reply.get("configid.upnp.org"), fetched=time.time())
+        key = usn_root(reply.get("usn"))
+        if key:
+            with self._lock:
+                self.entries[key] = entry
+                self._dirty = True
+        return entry
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self.entries, indent=2)
+            self._dirty = False
+        try:
+            save_json(self.path, data)
+        except OSError as e:
+            logging.warning("Could not save SSDP cache: %s", e)
+
+#─── Identity ─────────────────────────────────────────────────────────────────
+def _identity(desc, headers, reply):
+    d = desc["device"]
+    return {
+        "usn": usn_root(reply.get("usn")),
+        "server": reply.get("server"),
+        "friendly_name": d.get("friendlyName"),
+        "manufacturer": d.get("manufacturer"),
+        "model": d.get("modelName"),
+        "model_number": d.get("modelNumber"),
+        "serial": d.get("serialNumber"),
+        "device_type": d.get("deviceType"),
+        "device_types": desc["device_types"],
+        "services": desc["services"],
+        # DIAL advertises its REST endpoint in the descriptor's response headers.
+        "dial_url": headers.get("application-url"),
+        "presentation_url": urljoin(reply["location"], d["presentationURL"]) if d.get("presentationURL") else None,
+    }
+
+
+def _pick_locations(replies):
+    """One reply per device (USN root, or LOCATION if no USN), root devices first."""
+    seen, out = set(), []
+    for r in sorted(replies, key=lambda r: "rootdevice" not in r.get("st", r.get("nt", ""))):
+        key = usn_root(r.get("usn")) or r["location"]
+        if key not in seen:
+            seen.add(key)
+            out.append(r)
+    return out
+
+
+def describe_host(ip, replies, cache):
+    """Identity for one host from its SSDP replies (cached where possible)."""
+    devices, fetcher = [], None
+    try:
+        for reply in _pick_locations(replies):
+            cached = cache.get(reply)
+            if cached:
+                devices.append(dict(cached, cached=True))
+                continue
+            if fetcher is None:
+                fetcher = HostFetcher(ip)
+            try:
+                desc, headers = fetcher.fetch(reply["location"])
+            except (OSError, http.client.HTTPException, TimeoutError) as e:
+                logging.debug("Descriptor fetch %s failed: %s", reply["location"], e)
+                if isinstance(e, TimeoutError) and "budget" in str(e):
+                    break
+                continue
+            devices.append(dict(cache.put(reply, _identity(desc, headers, reply)), cached=False))
+    finally:
+        if fetcher:
+            fetcher.close()
+    return devices
+
+
+def describe_all(replies_by_ip, cache=None, workers=FETCH_WORKERS):
+    """Describe many hosts concurrently; returns {ip: [device identities]}."""
+    cache = cache or DescriptionCache()
+    if not replies_by_ip:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(replies_by_ip))) as executor:
+        results = dict(zip(replies_by_ip, executor.map(
+            lambda ip: describe_host(ip, replies_by_ip[ip], cache), replies_by_ip)))
+    cache.save()
+    return results
+
+
+def summarize(devices):
+    """Collapse a host's device list into the root device's headline identity."""
+    for d in devices:
+        if d.get("friendly_name") or d.get("model"):
+            return {k: d.get(k) for k in ("friendly_name", "manufacturer", "model", "device_type", "dial_url", "usn")}
+    return None
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    parser = argparse.ArgumentParser(description="SSDP discovery with cached UPnP device descriptions")
+    parser.add_argument("hosts", nargs="*", help="Unicast-probe these IPs (default: multicast M-SEARCH)")
+    parser.add_argument("--timeout", type=float, default=3.0, help="Multicast listen time")
+    parser.add_argument("--cache", default=SSDP_CACHE)
+    args = parser.parse_args()
+
+    if args.hosts:
+        replies = {}
+        for ip in args.hosts:
+            for deadline in get_controller().deadlines(ip, "ssdp"):
+                r = unicast_search(ip, deadline)
+                if r is not None:
+                    break
+            if r:
+                replies[ip] = r
+    else:
+        replies = multicast_search(args.timeout)
+    start = time.monotonic()
+    result = describe_all(replies, DescriptionCache(args.cache))
+    logging.info("Described %d hosts in %.2fs", len(result), time.monotonic() - start)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result else 1)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from cdp_client import connect_page, DEFAULT_HOST
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+#─── Constants ────────────────────────────────────────────────────────────────
+CAST_PORT        = 8009
+PRELOAD_TIMEOUT  = 30       # seconds for every target to buffer paused at the start
+LATENCY_SAMPLES  = 7
+START_MARGIN     = 1.0      # seconds between the last command going out and the start
+DRIFT_THRESHOLD  = 0.040    # one frame at 25 fps
+DRIFT_INTERVAL   = 2.0
+NUDGE_COOLDOWN   = 2        # monitor rounds to leave a target alone after nudging it
+RATE_WINDOW      = 0.5      # kiosks slew with playbackRate below this drift, seek above
+RATE_DELTA       = 0.05
+
+# Injected into kiosk pages. Uses the page's own <video> when there is one,
+# otherwise overlays a full-screen one.
+KIOSK_JS = r"""
+(() => {
+  const S = window.__ssSync = window.__ssSync || {};
+  S.video = () => {
+    let v = document.querySelector(%(selector)s);
+    if (!v) {
+      v = document.createElement('video');
+      v.id = '__ssSyncVideo';
+      v.style.cssText = 'position:fixed;inset:0;width:100vw;height:100vh;background:#000;z-index:2147483647;object-fit:contain';
+      v.playsInline = true;
+      document.body.appendChild(v);
+    }
+    return v;
+  };
+  S.preload = (url, offset, timeoutMs) => new Promise((resolve, reject) => {
+    const v = S.video();
+    clearTimeout(S.timer);
+    v.autoplay = false;
+    v.preload = 'auto';
+    v.playbackRate = 1;
+    const done = () => { v.pause(); resolve(v.readyState); };
+    const t = setTimeout(() => reject(new Error('preload timed out')), timeoutMs);
+    v.addEventListener('canplaythrough', () => { clearTimeout(t); done(); }, {once: true});
+    v.addEventListener('error', () => { clearTimeout(t); reject(new Error('media error')); }, {once: true});
+    if (v.src !== url) { v.src = url; v.load(); }
+    v.pause();
+    v.currentTime = offset;
+    if (v.readyState >= 4) { clearTimeout(t); done(); }
+  });
+  S.startAt = (at, offset) => {
+    const v = S.video();
+    clearTimeout(S.timer);
+    const fire = () => {
+      const late = (Date.now() - at) / 1000;
+      if (late > 0.02) v.currentTime = offset + late;
+      v.play();
+    };
+    S.timer = setTimeout(fire, Math.max(0, at - Date.now()));
+    return at - Date.now();
+  };
+  S.position = () => { const v = S.video(); return {pos: v.currentTime, now: Date.now(), paused: v.paused}; };
+  S.slew = (rate, ms) => {
+    const v = S.video();
+    v.playbackRate = rate;
+    clearTimeout(S.slewTimer);
+    S.slewTimer = setTimeout(() => { v.playbackRate = 1; }, ms);
+  };
+  S.seek = (pos) => { S.video().currentTime = pos; };
+  return true;
+})()
+"""
+
+
+def sleep_until(wall):
+    """Sleep until time.time() reaches wall, spinning for the last few ms."""
+    while True:
+        remaining = wall - time.time()
+        if remaining <= 0:
+            return
+        if remaining > 0.005:
+            time.sleep(remaining - 0.003)
+
+#─── Targets ──────────────────────────────────────────────────────────────────
+class CastTarget:
+    """Chromecast driven through the default media receiver."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = f"cast:{spec}"
+        self.cc = None
+        self.latency = None      # one-way command latency (s)
+        self.seek_lag = 0.0      # learned extra delay between a seek and playback resuming
+
+    def connect(self, info):
+        from cast import connect_to
+        if info is None:
+            raise ConnectionError("not found by discovery")
+        try:
+            self.cc = connect_to(info)
+        except SystemExit:
+            raise ConnectionError("connect timed out")
+        self.mc = self.cc.media_controller
+
+    def _roundtrip(self):
+        done = threading.Event()
+        start = time.monotonic()
+        self.mc.update_status(lambda *a: done.set())
+        if not done.wait(5):
+            raise TimeoutError(f"{self.name} did not answer GET_STATUS")
+        return time.monotonic() - start
+
+    def preload(self, url, content_type, offset):
+        # A PAUSED status left over from the previous session must not count:
+        # wait for the media session the LOAD creates.
+        previous = self.mc.status.media_session_id
+        self.mc.play_media(url, content_type, autoplay=False, current_time=offset)
+        deadline = time.monotonic() + PRELOAD_TIMEOUT
+        while time.monotonic() < deadline:
+            status = self.mc.status
+            if status.media_session_id not in (None, previous) and status.player_state == "PAUSED":
+                return
+            time.sleep(0.1)
+        raise TimeoutError(f"{self.name} did not buffer within {PRELOAD_TIMEOUT}s")
+
+    def measure(self, samples=LATENCY_SAMPLES):
+        rtts = [self._roundtrip() for _ in range(samples)]
+        self.latency = statistics.median(rtts) / 2
+        return {"rtt_ms": round(statistics.median(rtts) * 1000, 1), "jitter_ms": round(statistics.pstdev(rtts) * 1000, 1)}
+
+    def start_at(self, wall, offset):
+        # Nothing on the receiver can wait for a timestamp, so PLAY is sent
+        # one one-way latency early.
+        sleep_until(wall - self.latency)
+        self.mc.play()
+
+    def position(self):
+        self._roundtrip()
+        status = self.mc.status
+        now = time.time()
+        pos = status.current_time + (self.latency if status.player_state == "PLAYING" else 0)
+        return pos, now, status.player_state != "PLAYING"
+
+    def nudge(self, drift, expected):
+        self.mc.seek(expected + self.latency + self.seek_lag)
+        return "seek"
+
+    def close(self):
+        if self.cc:
+            self.cc.disconnect()
+
+
+class KioskTarget:
+    """Chromium kiosk controlled over the DevTools protocol; starts on its own clock."""
+
+    def __init__(self, port, host=DEFAULT_HOST, selector="video"):
+        self.name = f"kiosk:{port}"
+        self.port = port
+        self.host = host
+        self.selector = selector
+        self.client = None
+        self.latency = None
+        self.offset = 0.0        # page Date.now() minus our time.time(), seconds
+        self.seek_lag = 0.0
+
+    def connect(self, info=None):
+        self.client = connect_page(self.port, self.host)
+        self.client.evaluate(KIOSK_JS % {"selector": json.dumps(self.selector)})
+
+    def preload(self, url, content_type, offset):
+        self.client.evaluate(f"__ssSync.preload({json.dumps(url)}, {offset}, {PRELOAD_TIMEOUT * 1000})",
+                             await_promise=True, timeout=PRELOAD_TIMEOUT + 5)
+
+    def measure(self, samples=LATENCY_SAMPLES):
+        best = None
+        rtts = []
+        for _ in range(samples):
+            t0 = time.time()
+            remote = self.client.evaluate("Date.now()") / 1000
+            t1 = time.time()
+            rtts.append(t1 - t0)
+            if best is None or t1 - t0 < best[0]:
+                best = (t1 - t0, remote - (t0 + t1) / 2)
+        self.latency = statistics.median(rtts) / 2
+        self.offset = best[1]
+        return {"rtt_ms": round(statistics.median(rtts) * 1000, 1), "jitter_ms": round(statistics.pstdev(rtts) * 1000, 1),
+                "clock_offset_ms": round(self.offset * 1000, 1)}
+
+    def start_at(self, wall, offset):
+        at_ms = (wall + self.offset) * 1000
+        self.client.evaluate(f"__ssSync.startAt({at_ms:.1f}, {offset})")
+
+    def position(self):
+        p = self.client.evaluate("__ssSync.position()")
+        return p["pos"], p["now"] / 1000 - self.offset, p["paused"]
+
+    def nudge(self, drift, expected):
+        if abs(drift) < RATE_WINDOW:
+            rate = 1 - RATE_DELTA if drift > 0 else 1 + RATE_DELTA
+            self.client.evaluate(f"__ssSync.slew({rate}, {abs(drift) / RATE_DELTA * 1000:.0f})")
+            return "slew"
+        self.client.evaluate(f"__ssSync.seek({expected + self.latency + self.seek_lag})")
+        return "seek"
+
+    def close(self):
+        if self.client:
+            self.client.close()
+
+#─── Synchronized Start ───────────────────────────────────────────────────────
+def _resolve_casts(targets):
+    """Map each cast target to a ChromecastInfo-like object (IPs skip discovery)."""
+    infos = {}
+    names = [t.spec for t in targets if not re.match(r"^\d+\.\d+\.\d+\.\d+(:\d+)?$", t.spec)]
+    if names:
+        from cast import discover_devices
+        devices, browser = discover_devices(friendly_names=names)
+        browser.stop_discovery()
+        infos.update({d.friendly_name: d for d in devices})
+    for t in targets:
+        if t.spec not in infos and re.match(r"^\d+\.\d+\.\d+\.\d+(:\d+)?$", t.spec):
+            host, _, port = t.spec.partition(":")
+            infos[t.spec] = SimpleNamespace(host=host, port=int(port or CAST_PORT), friendly_name=t.spec)
+    return infos
+
+
+class SyncSession:
+    """
+    Pre-loads every target paused, measures each one's command latency, and
+    starts them at one shared wall-clock instant; monitor() then keeps them on
+    that timeline.
+    """
+
+    def __init__(self, targets, offset=0.0):
+        self.targets = list(targets)
+        self.offset = offset
+        self.start_wall = None
+        self.report = {t.name: {} for t in self.targets}
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.targets)))
+
+    def _each(self, fn, label):
+        """Run fn(target) on every target concurrently; failing targets are dropped."""
+        futures = {t: self._pool.submit(fn, t) for t in self.targets}
+        alive, results = [], {}
+        for t, fut in futures.items():
+            try:
+                results[t] = fut.result()
+                alive.append(t)
+            except Exception as e:
+                logging.error("%s: %s failed: %s", t.name, label, e)
+                self.report[t.name]["error"] = f"{label}: {e}"
+        self.targets = alive
+        return results
+
+    def prepare(self, url, content_type):
+        casts = [t for t in self.targets if isinstance(t, CastTarget)]
+        infos = _resolve_casts(casts) if casts else {}
+        self._each(lambda t: t.connect(infos.get(getattr(t, "spec", None))), "connect")
+        start = time.monotonic()
+        self._each(lambda t: t.preload(url, content_type, self.offset), "preload")
+        logging.info("Preloaded %d targets in %.1fs", len(self.targets), time.monotonic() - start)
+        for t, stats in self._each(lambda t: t.measure(), "latency").items():
+            self.report[t.name].update(stats)
+        return self.targets
+
+    def start(self, margin=START_MARGIN):
+        if not self.targets:
+            raise RuntimeError("no targets ready")
+        lead = max(t.latency for t in self.targets) + margin
+        self.start_wall = time.time() + lead
+        logging.info("Starting %d targets at +%.3fs", len(self.targets), lead)
+        self._each(lambda t: t.start_at(self.start_wall, self.offset), "start")
+        return self.start_wall
+
+    def expected(self, wall):
+        return self.offset + max(0.0, wall - self.start_wall)
+
+    def sample(self):
+        """Return {target: drift seconds} (positive = ahead of the shared timeline)."""
+        drifts = {}
+        for t, (pos, wall, paused) in self._each(lambda t: t.position(), "position").items():
+            drifts[t] = None if paused else pos - self.expected(wall)
+        return drifts
+
+    def measure_start(self):
+        """Sample once, without nudging, and record each target's start error."""
+        for t, drift in self.sample().items():
+            if drift is not None:
+                self.report[t.name]["start_error_ms"] = round(drift * 1000, 1)
+        return self.report
+
+    def monitor(self, duration, interval=DRIFT_INTERVAL, threshold=DRIFT_THRESHOLD):
+        """Watch drift for `duration` seconds, nudging targets past `threshold`."""
+        history = {t.name: [] for t in self.targets}
+        cooldown = {t: 0 for t in self.targets}
+        last_nudge = {}
+        end = time.monotonic() + duration
+        first = True
+        while time.monotonic() < end:
+            for t, drift in self.sample().items():
+                if drift is None:
+                    continue
+                history[t.name].append(drift)
+                if first:
+                    self.report[t.name]["start_error_ms"] = round(drift * 1000, 1)
+                if t in last_nudge:
+                    # Whatever drift is left after a seek is lag the next seek should cover.
+                    if last_nudge.pop(t) == "seek":
+                        t.seek_lag = max(0.0, t.seek_lag - drift)
+                if cooldown[t] > 0:
+                    cooldown[t] -= 1
+                    continue
+                if abs(drift) > threshold:
+                    how = t.nudge(drift, self.expected(time.time()))
+                    last_nudge[t] = how
+                    cooldown[t] = NUDGE_COOLDOWN
+                    self.report[t.name]["nudges"] = self.report[t.name].get("nudges", 0) + 1
+                    logging.info("%s drift %+.0f ms → %s", t.name, drift * 1000, how)
+            first = False
+            time.sleep(interval)
+        for name, drifts in history.items():
+            if drifts:
+                self.report[name]["drift_ms"] = {
+                    "mean_abs": round(statistics.mean(abs(d) for d in drifts) * 1000, 1),
+                    "max_abs": round(max(abs(d) for d in drifts) * 1000, 1),
+                    "last": round(drifts[-1] * 1000, 1),
+                }
+        return self.report
+
+    def close(self):
+        for t in self.targets:
+            try:
+                t.close()
+            except Exception:
+                pass
+        self._pool.shutdown(wait=False)
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Start media on Chromecasts and kiosks at the same instant")
+    parser.add_argument("url", help="Media URL every target plays")
+    parser.add_argument("--cast", action="append", default=[], help="Chromecast friendly name or IP (repeatable)")
+    parser.add_argument("--kiosk", action="append", type=int, default=[],
+                        help="Kiosk DevTools port, e.g. 9222 (repeatable)")
+    parser.add_argument("--kiosk-host", default=DEFAULT_HOST)
+    parser.add_argument("--selector", default="video", help="CSS selector of the kiosk page's video element")
+    parser.add_argument("--type", default="video/mp4", help="Content type")
+    parser.add_argument("--offset", type=float, default=0.0, help="Start position in seconds")
+    parser.add_argument("--margin", type=float, default=START_MARGIN,
+                        help="Seconds of slack before the shared start time")
+    parser.add_argument("--monitor", type=float, default=0, help="Watch and correct drift for N seconds")
+    parser.add_argument("--interval", type=float, default=DRIFT_INTERVAL)
+    parser.add_argument("--threshold", type=float, default=DRIFT_THRESHOLD, help="Drift (s) that triggers a nudge")
+    args = parser.parse_args()
+
+    targets = [CastTarget(c) for c in args.cast] + [KioskTarget(p, args.kiosk_host, args.selector) for p in args.kiosk]
+    if not targets:
+        parser.error("give at least one --cast or --kiosk target")
+
+    session = SyncSession(targets, args.offset)
+    try:
+        session.prepare(args.url, args.type)
+        session.start(args.margin)
+        # Let every target pass the start instant before sampling.
+        sleep_until(session.start_wall + 0.5)
+        if args.monitor > 0:
+            session.monitor(args.monitor, args.interval, args.threshold)
+        else:
+            session.measure_start()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        logging.error("%s", e)
+    finally:
+        session.close()
+    print(json.dumps(session.report, indent=2))
+    sys.exit(1 if any("error" in r for r in session.report.values()) else 0)
@@ -0,0 +1,41 @@
+import os
+import sys
+import stat
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adb_session
+
+
+class AdbShellTest(unittest.TestCase):
+    def setUp(self):
+        # Stand-in for `adb -s SERIAL shell`: a plain local sh reading stdin.
+        fd, self.adb = tempfile.mkstemp(suffix="-adb")
+        with os.fdopen(fd, "w") as f:
+            f.write("#!/bin/sh\nexec sh\n")
+        os.chmod(self.adb, stat.S_IRWXU)
+        self.shell = adb_session.AdbShell("test-serial", adb=self.adb)
+
+    def tearDown(self):
+        self.shell.close()
+        os.unlink(self.adb)
+
+    def test_returns_output_and_exit_code(self):
+        rc, out, _ = self.shell.run("echo one; echo two; exit_code() { return 3; }; exit_code", timeout=2)
+        self.assertEqual((rc, out), (3, "one\ntwo"))
+
+    def test_output_without_trailing_newline(self):
+        rc, out, _ = self.shell.run("printf abc", timeout=2)
+        self.assertEqual((rc, out), (0, "abc"))
+        self.assertEqual(self.shell.run("echo next", timeout=2)[:2], (0, "next"))
+
+    def test_timeout_restarts_session(self):
+        with self.assertRaises(TimeoutError):
+            self.shell.run("sleep 5", timeout=0.2)
+        self.assertEqual(self.shell.run("echo back", timeout=2)[:2], (0, "back"))
+
+
+if __name__ == "__main__":
+    unittest.main()
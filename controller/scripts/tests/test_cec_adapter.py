@@ -0,0 +1,140 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cec_adapter as cec
+
+
+def _fill(buf, data):
+    buf[:] = data
+    return 0
+
+
+class LinuxCecTransportTest(unittest.TestCase):
+    def _transport(self):
+        t = cec.LinuxCecTransport.__new__(cec.LinuxCecTransport)
+        t.fd = -1
+        return t
+
+    def test_transmit_returns_tx_status(self):
+        reply = cec.CEC_MSG_STRUCT.pack(0, 0, 2, 1000, 1, 0, b"\x40\x04".ljust(16, b"\0"),
+                                        0, 0x00, cec.CEC_TX_STATUS_OK, 0, 0, 0, 0)
+        with mock.patch.object(cec.fcntl, "ioctl", side_effect=lambda fd, req, buf: _fill(buf, reply)):
+            self.assertEqual(self._transport().transmit(b"\x40\x04", 1.0), cec.CEC_TX_STATUS_OK)
+
+    def test_transmit_reports_nack(self):
+        reply = cec.CEC_MSG_STRUCT.pack(0, 0, 2, 1000, 1, 0, b"\x40\x04".ljust(16, b"\0"),
+                                        0, cec.CEC_TX_STATUS_OK, cec.CEC_TX_STATUS_NACK, 0, 1, 0, 0)
+        with mock.patch.object(cec.fcntl, "ioctl", side_effect=lambda fd, req, buf: _fill(buf, reply)):
+            self.assertEqual(self._transport().transmit(b"\x40\x04", 1.0), cec.CEC_TX_STATUS_NACK)
+
+    def test_claim_requests_playback_address_type(self):
+        requests = []
+
+        def ioctl(fd, req, buf):
+            if req == cec.CEC_ADAP_S_LOG_ADDRS:
+                requests.append(cec.CEC_LOG_ADDRS_STRUCT.unpack(bytes(buf)))
+                buf[0] = 0x4
+            return 0
+
+        with mock.patch.object(cec.fcntl, "ioctl", side_effect=ioctl):
+            self.assertEqual(self._transport()._claim("Test"), 0x4)
+        primary_type, la_type = requests[0][7][0], requests[0][8][0]
+        self.assertEqual(primary_type, cec.CEC_OP_PRIM_DEVTYPE_PLAYBACK)
+        self.assertEqual(la_type, 3)
+
+
+class CecTransportTest(unittest.TestCase):
+    def test_incomplete_transport_fails_at_creation(self):
+        class TransmitOnly(cec.CecTransport):
+            def transmit(self, frame, timeout):
+                return cec.CEC_TX_STATUS_OK
+
+        with self.assertRaises(TypeError):
+            TransmitOnly()
+
+
+class SimulatedBusTest(unittest.TestCase):
+    def setUp(self):
+        self.ctl = cec.open_controller(simulate=True)
+        self.bus = self.ctl.scheduler.transport.bus
+        self.tv = self.bus.nodes[cec.LA_TV].device
+
+    def tearDown(self):
+        self.ctl.scheduler.close()
+
+    def test_power_on_and_status(self):
+        self.assertEqual(self.ctl.power_status(), cec.POWER_STANDBY)
+        self.ctl.power_on()
+        self.assertEqual(self.ctl.power_status(), cec.POWER_ON)
+
+    def test_set_input_reaches_tv(self):
+        self.ctl.set_input("0x2000")
+        for _ in range(50):
+            if self.tv.active_source == 0x2000:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(self.tv.active_source, 0x2000)
+
+    def test_absent_destination_is_nacked(self):
+        with self.assertRaises(cec.CecError):
+            self.ctl.power_on(0x8)
+        self.assertEqual(self.bus.log[-1][4], cec.CEC_TX_STATUS_NACK)
+
+
+class CecSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = cec.SimulatedBus()
+        self.bus.attach(cec.LA_TV, 0x0000)
+        self.scheduler = cec.CecScheduler(self.bus.attach(0x4, 0x1000), retry_delay=0)
+
+    def tearDown(self):
+        self.scheduler.close()
+
+    def test_transient_failures_are_retried(self):
+        self.bus.fail_next(2, cec.CEC_TX_STATUS_ARB_LOST)
+        result = self.scheduler.send(cec.LA_TV, cec.OP_IMAGE_VIEW_ON).result(timeout=2)
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["attempts"], 3)
+
+    def test_gives_up_after_retries(self):
+        self.bus.fail_next(3, cec.CEC_TX_STATUS_NACK)
+        result = self.scheduler.send(cec.LA_TV, cec.OP_IMAGE_VIEW_ON).result(timeout=2)
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["attempts"], cec.TRANSMIT_RETRIES + 1)
+
+    def test_non_retryable_status_fails_immediately(self):
+        self.bus.fail_next(1, cec.CEC_TX_STATUS_ABORTED)
+        result = self.scheduler.send(cec.LA_TV, cec.OP_IMAGE_VIEW_ON).result(timeout=2)
+        self.assertEqual((result["ok"], result["attempts"]), (False, 1))
+
+    def test_higher_priority_frames_go_first(self):
+        transport = self.scheduler.transport
+        release = threading.Event()
+        started = threading.Event()
+        transmit = transport.transmit
+
+        def blocking_transmit(frame, timeout):
+            if not started.is_set():
+                started.set()
+                release.wait(2)
+            return transmit(frame, timeout)
+
+        transport.transmit = blocking_transmit
+        first = self.scheduler.send(cec.LA_TV, cec.OP_GIVE_PHYSICAL_ADDR, priority=10)
+        started.wait(2)
+        low = self.scheduler.send(cec.LA_TV, cec.OP_USER_CONTROL_RELEASED, priority=10)
+        high = self.scheduler.send(cec.LA_TV, cec.OP_STANDBY, priority=0)
+        release.set()
+        for fut in (first, low, high):
+            fut.result(timeout=2)
+        opcodes = [entry[2] for entry in self.bus.log]
+        self.assertEqual(opcodes, [cec.OP_GIVE_PHYSICAL_ADDR, cec.OP_STANDBY, cec.OP_USER_CONTROL_RELEASED])
+
+
+if __name__ == "__main__":
+    unittest.main()
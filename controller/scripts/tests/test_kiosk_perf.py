@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import base64
+import socket
+import struct
+import hashlib
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kiosk_perf
+from cdp_client import WS_GUID
+
+
+class FakeDevTools:
+    """
+    One-page DevTools endpoint: /json/list over HTTP plus a WebSocket that
+    answers Performance.getMetrics and the collector's Runtime.evaluate calls.
+    """
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.methods = []
+        self.heap = 10e6
+        self.task_seconds = 0.0
+        self.longtasks = [3, 210.0]
+        self.navigated = False
+        self.conns = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+        for c in self.conns:
+            c.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.conns.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        buf = b""
+        while b"\r\n\r\n" not in buf:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return
+            buf += chunk
+        head = buf.split(b"\r\n\r\n")[0].decode("latin-1")
+        if head.startswith("GET /json/list"):
+            body = json.dumps([{"type": "page", "url": "https://kiosk/",
+                                "webSocketDebuggerUrl": f"ws://127.0.0.1:{self.port}/devtools/page/1"}]).encode()
+            conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                         % (len(body), body))
+            conn.close()
+            return
+        key = next(l.split(":", 1)[1].strip() for l in head.split("\r\n") if l.lower().startswith("sec-websocket-key"))
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        f = conn.makefile("rb")
+        try:
+            while True:
+                b0, b1 = f.read(2)
+                n = b1 & 0x7F
+                if n == 126:
+                    n = struct.unpack(">H", f.read(2))[0]
+                mask = f.read(4)
+                payload = bytes(c ^ mask[i % 4] for i, c in enumerate(f.read(n)))
+                if b0 & 0x0F == 0x8:
+                    return
+                msg = json.loads(payload)
+                reply = json.dumps({"id": msg["id"], "result": self._handle(msg["method"], msg["params"])}).encode()
+                header = bytes([0x81]) + (bytes([len(reply)]) if len(reply) < 126
+                                          else bytes([126]) + struct.pack(">H", len(reply)))
+                conn.sendall(header + reply)
+        except (OSError, ValueError):
+            return
+
+    def _handle(self, method, params):
+        self.methods.append(method)
+        if method == "Performance.getMetrics":
+            self.heap += 1e6
+            self.task_seconds += 0.5
+            return {"metrics": [{"name": "JSHeapUsedSize", "value": self.heap},
+                                {"name": "JSHeapTotalSize", "value": 64e6},
+                                {"name": "Nodes", "value": 1200},
+                                {"name": "JSEventListeners", "value": 80},
+                                {"name": "TaskDuration", "value": self.task_seconds}]}
+        if method == "Runtime.evaluate":
+            expr = params["expression"]
+            if expr.startswith("__ssPerf.frames"):
+                value = {"frames": 60, "long": 3, "maxMs": 84.0, "meanMs": 16.9, "hidden": False}
+            elif "__ssPerf.drain()" in expr:
+                if self.navigated:
+                    self.navigated = False
+                    value = None
+                else:
+                    value = {"longtasks": self.longtasks[0], "longtaskMs": self.longtasks[1]}
+                    self.longtasks = [0, 0]
+            else:
+                value = True
+            return {"result": {"type": "object", "value": value}}
+        return {}
+
+
+class KioskCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.devtools = FakeDevTools()
+        self.out = tempfile.mkdtemp()
+        self.collector = kiosk_perf.KioskCollector("kiosk-test", self.devtools.port, "127.0.0.1",
+                                                   out_dir=self.out, frame_window_ms=10)
+
+    def tearDown(self):
+        self.collector._disconnect()
+        self.devtools.close()
+
+    def test_sample_reads_metrics_frames_and_longtasks(self):
+        sample = self.collector.sample()
+        self.assertNotIn("error", sample)
+        self.assertEqual(sample["heap_used_mb"], 11.0)
+        self.assertEqual(sample["nodes"], 1200)
+        self.assertEqual((sample["frames"], sample["long_frames"], sample["max_frame_ms"]), (60, 3, 84.0))
+        self.assertEqual((sample["longtasks"], sample["longtask_ms"]), (3, 210.0))
+        self.assertIn("Performance.enable", self.devtools.methods)
+        self.assertIn("Page.addScriptToEvaluateOnNewDocument", self.devtools.methods)
+        with open(os.path.join(self.out, "kiosk-test.json")) as f:
+            self.assertEqual(json.load(f)["window_samples"], 1)
+
+    def test_longtasks_are_drained_between_samples(self):
+        self.collector.sample()
+        second = self.collector.sample()
+        self.assertEqual(second["longtasks"], 0)
+        self.assertIn("main_thread_busy", second)
+
+    def test_reinjects_after_navigation(self):
+        self.collector.sample()
+        self.devtools.navigated = True
+        evaluations = self.devtools.methods.count("Runtime.evaluate")
+        sample = self.collector.sample()
+        self.assertEqual(sample["longtasks"], 0)
+        # frames + drain + re-injected PERF_JS
+        self.assertEqual(self.devtools.methods.count("Runtime.evaluate") - evaluations, 3)
+
+    def test_unreachable_kiosk_records_error(self):
+        self.devtools.close()
+        sample = self.collector.sample()
+        self.assertIn("error", sample)
+        self.assertEqual(self.collector.summary()["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
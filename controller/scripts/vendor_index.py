@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import os
+import re
+import csv
+import sys
+import mmap
+import struct
+import logging
+import argparse
+import threading
+import urllib.request
+
+#─── Index Format ─────────────────────────────────────────────────────────────
+# Header:  magic "SSVI", u32 version, u32 record count
+# Records: count × (u32 vendor id, u32 name offset), sorted by vendor id
+# Strings: NUL-terminated UTF-8 names, offsets relative to the string table
+INDEX_PATH    = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vendor_index.bin")
+INDEX_MAGIC   = b"SSVI"
+INDEX_VERSION = 1
+HEADER        = struct.Struct("<4sII")
+RECORD        = struct.Struct("<II")
+
+IEEE_OUI_URL = "https://standards-oui.ieee.org/oui/oui.txt"
+
+# CEC vendor IDs as reported by real devices. These win over IEEE names,
+# which are long legal entity names, and cover IDs that are not IEEE OUIs.
+CEC_VENDOR_OVERRIDES = {
+    0x000039: "Toshiba",
+    0x0000F0: "Samsung",
+    0x0005CD: "Denon",
+    0x000678: "Marantz",
+    0x000982: "Loewe",
+    0x0009B0: "Onkyo",
+    0x000CB8: "Medion",
+    0x000CE7: "Toshiba",
+    0x0010FA: "Apple",
+    0x001582: "Pulse-Eight",
+    0x001950: "Harman Kardon",
+    0x001A11: "Chromecast",
+    0x0020C7: "Akai",
+    0x002467: "AOC",
+    0x008045: "Panasonic",
+    0x00903E: "Philips",
+    0x009053: "Daewoo",
+    0x00A0DE: "Yamaha",
+    0x00D0D5: "Grundig",
+    0x00E036: "Pioneer",
+    0x00E091: "LG",
+    0x08001F: "Sharp",
+    0x080046: "Sony",
+    0x18C086: "Broadcom",
+    0x534850: "Sharp",
+    0x6B746D: "Vizio",
+    0x6D746B: "Panasonic",
+    0x8065E9: "BenQ",
+    0x9C645E: "Harman Kardon",
+}
+
+_index = None
+_index_lock = threading.Lock()
+
+#─── Lookup ───────────────────────────────────────────────────────────────────
+class VendorIndex:
+    """Memory-mapped, binary-searched view of a vendor_index.bin file."""
+
+    def __init__(self, path=INDEX_PATH):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{path} is not a vendor index (v{INDEX_VERSION})")
+        self._strings = HEADER.size + self.count * RECORD.size
+
+    def get(self, vendor_id, default=None):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key, offset = RECORD.unpack_from(self._map, HEADER.size + mid * RECORD.size)
+            if key < vendor_id:
+                lo = mid + 1
+            elif key > vendor_id:
+                hi = mid
+            else:
+                start = self._strings + offset
+                return self._map[start:self._map.find(b"\0", start)].decode("utf-8")
+        return default
+
+
+def _parse_vendor_id(vendor_id):
+    """Accept 6673, "6673" (dumpsys decimal), "0x001A11" or "00-1A-11"."""
+    if isinstance(vendor_id, int):
+        return vendor_id
+    text = str(vendor_id).strip()
+    if re.fullmatch(r"[0-9A-Fa-f]{2}([-:])[0-9A-Fa-f]{2}\1[0-9A-Fa-f]{2}", text):
+        return int(re.sub(r"[-:]", "", text), 16)
+    return int(text, 0)
+
+
+def lookup_vendor(vendor_id, default="Unknown"):
+    """Return the manufacturer name for a CEC vendor ID / OUI."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = VendorIndex()
+                except (OSError, ValueError) as e:
+                    logging.warning("Vendor index unavailable (%s); using built-in overrides", e)
+                    _index = CEC_VENDOR_OVERRIDES
+    try:
+        vid = _parse_vendor_id(vendor_id)
+    except ValueError:
+        return default
+    return _index.get(vid, default)
+
+#─── Index Builder ────────────────────────────────────────────────────────────
+def parse_ieee_registry(path):
+    """
+    Yield (oui, organisation) from an IEEE MA-L registry file, either the
+    oui.txt text format or the oui.csv export.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        head = f.readline()
+        f.seek(0)
+        if head.startswith("Registry,"):
+            for row in csv.DictReader(f):
+                try:
+                    yield int(row["Assignment"], 16), row["Organization Name"].strip()
+                except (KeyError, ValueError):
+                    continue
+        else:
+            for line in f:
+                m = re.match(r"^\s*([0-9A-Fa-f]{2}-[0-9A-Fa-f]{2}-[0-9A-Fa-f]{2})\s+\(hex\)\s+(.*\S)", line)
+                if m:
+                    yield int(m.group(1).replace("-", ""), 16), m.group(2)
+
+
+def build_index(entries, out_path=INDEX_PATH):
+    """Write a sorted, fixed-width vendor index; returns the record count."""
+    names = dict(entries)
+    names.update(CEC_VENDOR_OVERRIDES)
+    strings = bytearray()
+    offsets = {}
+    records = []
+    for vid in sorted(names):
+        name = names[vid].encode("utf-8")
+        if name not in offsets:
+            offsets[name] = len(strings)
+            strings += name + b"\0"
+        records.append(RECORD.pack(vid, offsets[name]))
+    tmp = f"{out_path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(records)))
+        f.write(b"".join(records))
+        f.write(strings)
+    os.replace(tmp, out_path)
+    return len(records)
+
+#─── Main CLI ─────────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="CEC vendor-ID index: lookup and rebuild")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    look_p = sub.add_parser("lookup", help="Look up vendor IDs (decimal, 0x hex or 00-1A-11)")
+    look_p.add_argument("ids", nargs="+")
+    build_p = sub.add_parser("build", help="Regenerate the index from an IEEE registry file")
+    build_p.add_argument("registry", nargs="?", help="oui.txt or oui.csv (omit with --fetch)")
+    build_p.add_argument("--fetch", action="store_true", help=f"Download {IEEE_OUI_URL} first")
+    build_p.add_argument("--out", default=INDEX_PATH, help="Index file to write")
+    args = parser.parse_args()
+
+    if args.cmd == "lookup":
+        for vid in args.ids:
+            print(f"{vid}\t{lookup_vendor(vid)}")
+        sys.exit(0)
+
+    registry = args.registry
+    if args.fetch:
+        registry = registry or "oui.txt"
+        print(f"Downloading {IEEE_OUI_URL} → {registry}")
+        urllib.request.urlretrieve(IEEE_OUI_URL, registry)
+    entries = parse_ieee_registry(registry) if registry else []
+    count = build_index(entries, args.out)
+    print(f"Wrote {count} vendors to {args.out} ({os.path.getsize(args.out)} bytes)")